@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SoftDesk.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importé une fois Django configuré : les flux Server-Sent Events des
+# projets sont servis à côté de Django (voir api.sse).
+from api.sse import EventStreamRouter  # noqa: E402
+
+application = EventStreamRouter(django_application)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -45,10 +46,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.profiling.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.routing.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,13 +80,104 @@ WSGI_APPLICATION = 'SoftDesk.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# Profil SQLite de production (api.backends.sqlite3) : journal WAL (les
+# lectures ne bloquent plus l'écriture), synchronous=NORMAL, attente des
+# verrous plutôt qu'une erreur "database is locked", transactions IMMEDIATE
+# et connexions persistantes vérifiées avant réutilisation. Chaque réglage
+# peut être modifié par une variable d'environnement SOFTDESK_DB_*.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': 'api.backends.sqlite3',
+        'NAME': os.environ.get('SOFTDESK_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('SOFTDESK_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': os.environ.get(
+                'SOFTDESK_DB_TRANSACTION_MODE', 'IMMEDIATE'),
+            'pragmas': {
+                'journal_mode': os.environ.get('SOFTDESK_DB_JOURNAL_MODE',
+                                               'WAL'),
+                'synchronous': os.environ.get('SOFTDESK_DB_SYNCHRONOUS',
+                                              'NORMAL'),
+                # Millisecondes
+                'busy_timeout': int(os.environ.get(
+                    'SOFTDESK_DB_BUSY_TIMEOUT', 5000)),
+                # Octets
+                'mmap_size': int(os.environ.get(
+                    'SOFTDESK_DB_MMAP_SIZE', 128 * 1024 * 1024)),
+                # Négatif : en Kio (64 Mio par connexion)
+                'cache_size': int(os.environ.get(
+                    'SOFTDESK_DB_CACHE_SIZE', -64 * 1024)),
+                'temp_store': 'MEMORY',
+            },
+        },
     }
 }
 
+# Réplicas de lecture (api.routing) : SOFTDESK_DB_REPLICAS liste, séparés par
+# des virgules, les fichiers SQLite tenus à jour depuis la base principale
+# (Litestream, LiteFS...). Les lectures des projets, problèmes et
+# commentaires y sont envoyées ; un utilisateur qui vient d'écrire lit la base
+# principale pendant REPLICA_STICKINESS_TIMEOUT secondes. Ce marqueur est
+# conservé dans le cache 'api', qui doit alors être partagé entre processus
+# (SOFTDESK_API_CACHE_BACKEND) ; la vérification api.W001 le rappelle.
+# Les réplicas sont ouverts en lecture seule : transactions DEFERRED, qui ne
+# prennent pas le verrou d'écriture, sans les PRAGMA qui modifient le
+# fichier (journal_mode, synchronous), et query_only refuse toute écriture.
+REPLICA_OPTIONS = {
+    'transaction_mode': 'DEFERRED',
+    'pragmas': {
+        **{name: value for name, value
+           in DATABASES['default']['OPTIONS']['pragmas'].items()
+           if name not in ('journal_mode', 'synchronous')},
+        'query_only': 'ON',
+    },
+}
+DATABASE_REPLICAS = []
+for index, path in enumerate(filter(None, os.environ.get(
+        'SOFTDESK_DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        **DATABASES['default'],
+        'NAME': path.strip(),
+        'OPTIONS': REPLICA_OPTIONS,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['api.routing.ReplicaRouter']
+REPLICA_STICKINESS_TIMEOUT = int(os.environ.get(
+    'SOFTDESK_DB_REPLICA_STICKINESS', 10))
+REPLICA_STICKY_CACHE = 'api'
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Le cache 'api' conserve les réponses des vues de lecture (api.caching). Il
+# peut être déplacé vers un backend fichier, partagé entre processus, avec
+# SOFTDESK_API_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# et SOFTDESK_API_CACHE_LOCATION=/chemin/du/cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': os.environ.get(
+            'SOFTDESK_API_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SOFTDESK_API_CACHE_LOCATION',
+                                   'softdesk-api'),
+        'TIMEOUT': int(os.environ.get('SOFTDESK_API_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get(
+                'SOFTDESK_API_CACHE_MAX_ENTRIES', 5000)),
+            'CULL_FREQUENCY': 3,
+        },
+    },
+}
+
+API_RESPONSE_CACHE = 'api'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -133,16 +227,91 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-            'rest_framework.authentication.BasicAuthentication',
+            'api.authentication.CachedBasicAuthentication',
             'rest_framework.authentication.SessionAuthentication',
             'rest_framework.authentication.TokenAuthentication',
-            'rest_framework_simplejwt.authentication.JWTAuthentication',
+            'api.authentication.StatelessJWTAuthentication',
         ],
 }
 
+# Profilage SQL par requête (api.profiling) : en-têtes X-Query-* et journal
+# /api/debug/queries/. Toujours actif avec DEBUG.
+QUERY_PROFILING = os.environ.get('SOFTDESK_QUERY_PROFILING') == '1'
+QUERY_PROFILING_LOG_SIZE = 200
+
+# Cache des rôles des contributeurs utilisé par les permissions
+# (api.membership). Il doit être partagé par tous les processus pour qu'un
+# contributeur retiré perde ses droits partout (SOFTDESK_API_CACHE_BACKEND).
+MEMBERSHIP_CACHE = 'api'
+MEMBERSHIP_CACHE_TIMEOUT = 60
+
+# Caches de l'authentification (api.authentication) : identifiants Basic
+# déjà vérifiés, propres au processus, et empreintes servant à révoquer
+# jetons et identifiants. Les empreintes doivent être partagées par tous les
+# processus pour qu'une révocation vaille partout (SOFTDESK_API_CACHE_BACKEND).
+AUTH_CREDENTIALS_CACHE_MAX_ENTRIES = 10000
+AUTH_CREDENTIALS_CACHE_TIMEOUT = 60
+AUTH_STAMP_CACHE = 'api'
+AUTH_STAMP_CACHE_TIMEOUT = 30
+
+# Hachage des mots de passe à l'inscription (api.hashing) : threads dédiés et
+# file d'attente bornée, au-delà de laquelle l'inscription répond 429.
+PASSWORD_HASHING_WORKERS = int(os.environ.get(
+    'SOFTDESK_PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_QUEUE_SIZE = int(os.environ.get(
+    'SOFTDESK_PASSWORD_HASHING_QUEUE_SIZE', 16))
+
+# Suppression différée des projets et problèmes (api.deletion) : lignes
+# supprimées par transaction, pause entre deux lots (secondes), et délai sans
+# nouveau lot au-delà duquel une tâche en cours est reprise par un autre
+# processus (secondes).
+DELETION_BATCH_SIZE = int(os.environ.get('SOFTDESK_DELETION_BATCH_SIZE',
+                                         1000))
+DELETION_BATCH_PAUSE = float(os.environ.get('SOFTDESK_DELETION_BATCH_PAUSE',
+                                            0.05))
+DELETION_LEASE = int(os.environ.get('SOFTDESK_DELETION_LEASE', 60))
+# Nouvelles tentatives d'une suppression en échec : délai avant la première
+# (secondes, doublé à chaque échec) et nombre d'échecs avant abandon.
+DELETION_RETRY_DELAY = int(os.environ.get('SOFTDESK_DELETION_RETRY_DELAY',
+                                          60))
+DELETION_ATTEMPTS = int(os.environ.get('SOFTDESK_DELETION_ATTEMPTS', 5))
+
+# Recherche plein texte (api.search) : au-delà de ce nombre de projets,
+# ceux de l'utilisateur sont filtrés après MATCH au lieu d'y être ajoutés.
+SEARCH_SCOPE_PROJECTS = int(os.environ.get('SOFTDESK_SEARCH_SCOPE_PROJECTS',
+                                           100))
+
+# Commentaires intégrés au détail d'un problème (?include=comments), la
+# suite étant paginée par curseur.
+INCLUDE_COMMENTS_LIMIT = int(os.environ.get('SOFTDESK_INCLUDE_COMMENTS_LIMIT',
+                                            20))
+
+# Synchronisation incrémentale (api.sync) : entrées du journal par réponse,
+# et durée de validité d'un jeton, au-delà de laquelle prune_changes purge
+# le journal (secondes).
+SYNC_PAGE_SIZE = int(os.environ.get('SOFTDESK_SYNC_PAGE_SIZE', 500))
+SYNC_TOKEN_MAX_AGE = int(os.environ.get('SOFTDESK_SYNC_TOKEN_MAX_AGE',
+                                        30 * 24 * 3600))
+
+# Flux d'événements des projets (api.events, api.sse) : transport entre
+# les écritures et les flux, événements en attente par flux, événements
+# rattrapés à la reconnexion, battement (secondes) et délai de reconnexion
+# conseillé au client (millisecondes).
+EVENTS_BACKEND = os.environ.get('SOFTDESK_EVENTS_BACKEND',
+                                'api.events.LocalBackend')
+EVENTS_QUEUE_SIZE = int(os.environ.get('SOFTDESK_EVENTS_QUEUE_SIZE', 100))
+EVENTS_REPLAY_LIMIT = int(os.environ.get('SOFTDESK_EVENTS_REPLAY_LIMIT',
+                                         1000))
+EVENTS_KEEPALIVE = float(os.environ.get('SOFTDESK_EVENTS_KEEPALIVE', 15))
+EVENTS_RETRY = int(os.environ.get('SOFTDESK_EVENTS_RETRY', 3000))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_OBTAIN_SERIALIZER':
+        'api.authentication.StampedTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER':
+        'api.authentication.StampedTokenRefreshSerializer',
 }
 
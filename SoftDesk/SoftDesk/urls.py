@@ -22,6 +22,19 @@ from api.views import (
     ContributorsViewSet,
     IssuesViewSet,
     CommentsViewSet,
+    ResponseCacheStatsView,
+    QueryProfileView,
+    SearchView,
+    DeletionJobView,
+    )
+from api.async_views import (
+    AsyncProjectsList,
+    AsyncProjectDetail,
+    AsyncIssuesList,
+    AsyncIssueDetail,
+    AsyncCommentsList,
+    AsyncCommentDetail,
+    AsyncUserCreate,
     )
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -41,6 +54,24 @@ router.register(r'projects/(?P<project_id>[^/.]+)/'
                 CommentsViewSet,
                 basename='issue-comments')
 
+# Vues asynchrones (ASGI), mêmes réponses que les routes synchrones
+async_urlpatterns = [
+    path('signup/', AsyncUserCreate.as_view(), name='async-signup'),
+    path('projects/', AsyncProjectsList.as_view(),
+         name='async-projects-list'),
+    path('projects/<int:pk>/', AsyncProjectDetail.as_view(),
+         name='async-projects-detail'),
+    path('projects/<int:project_id>/issues/', AsyncIssuesList.as_view(),
+         name='async-project-issues-list'),
+    path('projects/<int:project_id>/issues/<int:pk>/',
+         AsyncIssueDetail.as_view(), name='async-project-issues-detail'),
+    path('projects/<int:project_id>/issues/<int:issue_id>/comments/',
+         AsyncCommentsList.as_view(), name='async-issue-comments-list'),
+    path('projects/<int:project_id>/issues/<int:issue_id>/comments/'
+         '<int:pk>/', AsyncCommentDetail.as_view(),
+         name='async-issue-comments-detail'),
+]
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
@@ -49,5 +80,13 @@ urlpatterns = [
          name='token_obtain_pair'),
     path('api/login/refresh/', TokenRefreshView.as_view(),
          name='token_refresh'),
+    path('api/cache/stats/', ResponseCacheStatsView.as_view(),
+         name='response-cache-stats'),
+    path('api/debug/queries/', QueryProfileView.as_view(),
+         name='query-profile'),
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/deletions/<int:pk>/', DeletionJobView.as_view(),
+         name='deletion-job'),
+    path('api/async/', include(async_urlpatterns)),
     path('api/', include(router.urls)),
 ]
@@ -1,8 +1,41 @@
 from django.contrib import admin
-from .models import Contributor, Project, Issue, Comment
 
-# Register your models here.
-admin.site.register(Contributor)
-admin.site.register(Project)
-admin.site.register(Issue)
-admin.site.register(Comment)
+from . import deletion
+from .models import Contributor, Project, Issue, Comment, DeletionJob
+
+
+# Les listes de l'administration affichent __str__ : les relations qu'il
+# parcourt sont chargées par jointure.
+@admin.register(Contributor)
+class ContributorAdmin(admin.ModelAdmin):
+    list_select_related = ['user_id']
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    pass
+
+
+@admin.register(Issue)
+class IssueAdmin(admin.ModelAdmin):
+    pass
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_select_related = ['issue_id']
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'target', 'object_id', 'status', 'deleted',
+                    'attempts', 'retry_time', 'created_time', 'finished_time']
+    list_filter = ['status', 'target']
+    actions = ['retry']
+
+    @admin.action(description='Relancer les suppressions en échec')
+    def retry(self, request, queryset):
+        count = deletion.retry_failed(queryset)
+        if count:
+            deletion.schedule()
+        self.message_user(request, f'{count} suppression(s) relancée(s)')
@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.core import checks
+        from django.core.handlers.asgi import ASGIHandler
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.signals import request_started
+        from django.db.models.signals import post_delete, post_save
+
+        from api import authentication, deletion, events, routing
+        from api.models import changes_recorded
+
+        # L'empreinte d'authentification en cache doit suivre les
+        # modifications du compte (mot de passe, désactivation).
+        post_save.connect(authentication.user_changed, sender=User)
+        post_delete.connect(authentication.user_changed, sender=User)
+        # Diffusion des modifications aux flux d'événements
+        changes_recorded.connect(events.changes_recorded)
+        checks.register(routing.check_sticky_cache, checks.Tags.caches)
+        # Worker de suppression lancé à la première requête de chaque
+        # processus serveur (le client de test a ses propres gestionnaires)
+        for handler in (WSGIHandler, ASGIHandler):
+            request_started.connect(deletion.resume_pending, sender=handler)
@@ -0,0 +1,232 @@
+"""
+Variantes asynchrones des lectures de l'API (projets, problèmes,
+commentaires), servies sous ASGI avec l'ORM asynchrone (acount, aget,
+async for, aaggregate). L'authentification et le contrôle d'accès au projet
+ne demandent aucun thread (jeton JWT, rôle en cache).
+
+Les querysets et les serializers sont construits par le ViewSet
+correspondant, sans exécuter sa vue : mêmes filtres, champs partiels
+(?fields=), facettes, pagination (limit/offset ou curseur) et ressources
+intégrées (?include=, dont les préchargements passent par un thread). Le
+cache de réponses et les ETag restent propres aux routes synchrones.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.authentication import get_authorization_header
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from api import hashing, membership
+from api.authentication import CachedBasicAuthentication, \
+    StatelessJWTAuthentication
+from api.filters import FacetsMixin
+from api.includes import IncludeMixin
+from api.serializers import UserSerializer
+from api.views import CommentsViewSet, IssuesViewSet, ProjectsViewSet
+
+
+async def authenticate(request):
+    """
+    Équivalent asynchrone de DEFAULT_AUTHENTICATION_CLASSES : JWT (Bearer),
+    Basic puis session. Un jeton JWT récent ne demande aucune requête (voir
+    api.authentication) ; Basic vérifie le mot de passe dans un thread.
+    """
+    header = get_authorization_header(request).split()
+    keyword = header[0].lower() if header else b''
+    if keyword == b'bearer':
+        backend = StatelessJWTAuthentication()
+        try:
+            token = backend.get_validated_token(
+                backend.get_raw_token(get_authorization_header(request)))
+        except (InvalidToken, TokenError):
+            raise exceptions.AuthenticationFailed(
+                'Given token not valid for any token type')
+        return await backend.aget_user(token)
+    if keyword == b'basic':
+        user, _ = await sync_to_async(
+            CachedBasicAuthentication().authenticate)(request)
+        return user
+    if hasattr(request, 'session'):
+        return await sync_to_async(get_user)(request)
+    return AnonymousUser()
+
+
+class AsyncAPIView(View):
+    # Rendu JSON et gestion des exceptions de DRF pour les vues asynchrones.
+    # Comme pour APIView, l'authentification ne repose pas sur les cookies :
+    # la vérification CSRF de Django ne s'applique pas.
+    renderer = JSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data),
+                            content_type='application/json',
+                            status=status_code)
+
+    def handle_exception(self, exc):
+        # Même format que rest_framework.views.exception_handler
+        if isinstance(exc.detail, (list, dict)):
+            data = exc.detail
+        else:
+            data = {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated,
+                            exceptions.AuthenticationFailed)):
+            response['WWW-Authenticate'] = 'Basic realm="api"'
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = str(exc.wait)
+        return response
+
+
+class AsyncReadView(AsyncAPIView):
+    """
+    Vue de lecture asynchrone de l'action `action` de `viewset_class`. Les
+    sous-classes implémentent read(viewset), qui renvoie les données à
+    rendre ; l'authentification et la permission d'accès au projet
+    (IsProjectContributor) sont vérifiées avant.
+    Seules les méthodes sûres sont servies : IsOwnerOrReadOnly les autorise
+    toujours, les écritures restent sur les vues synchrones.
+    """
+    http_method_names = ['get', 'head', 'options']
+    check_project_membership = True
+    viewset_class = None
+    action = None
+
+    async def get(self, request, **kwargs):
+        try:
+            user = await authenticate(request)
+            if not user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            request.user = user
+            if self.check_project_membership and \
+                    await membership.aget_role(
+                        request, kwargs.get('project_id')) is None:
+                raise exceptions.PermissionDenied()
+            data = await self.read(self.get_viewset(request, user, kwargs))
+            return self.render(data)
+        except exceptions.APIException as exc:
+            return self.handle_exception(exc)
+
+    def get_viewset(self, request, user, kwargs):
+        # ViewSet initialisé comme par sa vue, sans dispatch : il ne fait
+        # que construire querysets, paginateur et serializers.
+        drf_request = Request(request)
+        drf_request.user = user
+        return self.viewset_class(request=drf_request, args=(),
+                                  kwargs=kwargs, action=self.action,
+                                  format_kwarg=None)
+
+    async def read(self, viewset):
+        raise NotImplementedError
+
+
+class AsyncListView(AsyncReadView):
+    action = 'list'
+
+    async def read(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        paginator = viewset.paginator
+        if isinstance(paginator, LimitOffsetPagination):
+            paginator.request = viewset.request
+            paginator.limit = paginator.get_limit(viewset.request)
+            paginator.offset = paginator.get_offset(viewset.request)
+            paginator.count = await queryset.acount()
+            page = queryset[paginator.offset:
+                            paginator.offset + paginator.limit]
+            rows = [row async for row in page]
+        else:
+            page = paginator.page_queryset(queryset, viewset.request)
+            rows = paginator.set_page([row async for row in page])
+        data = paginator.get_paginated_response(
+            viewset.get_serializer(rows, many=True).data).data
+        if isinstance(viewset, FacetsMixin) and \
+                viewset.wants_facets(viewset.request):
+            queryset, aggregates = viewset.get_facets_query(viewset.request)
+            data['facets'] = viewset.format_facets(
+                await queryset.aaggregate(**aggregates))
+        return data
+
+
+class AsyncDetailView(AsyncReadView):
+    action = 'retrieve'
+
+    async def read(self, viewset):
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup = viewset.kwargs[viewset.lookup_url_kwarg or
+                                viewset.lookup_field]
+        try:
+            instance = await queryset.aget(**{viewset.lookup_field: lookup})
+        except (queryset.model.DoesNotExist, ValueError):
+            raise exceptions.NotFound()
+        data = viewset.get_serializer(instance).data
+        if isinstance(viewset, IncludeMixin) and viewset.get_includes():
+            await sync_to_async(viewset.add_includes)(instance, data)
+        return data
+
+
+class AsyncProjectsList(AsyncListView):
+    check_project_membership = False
+    viewset_class = ProjectsViewSet
+
+
+class AsyncProjectDetail(AsyncDetailView):
+    # Comme ProjectsViewSet, un projet auquel l'utilisateur ne contribue pas
+    # est introuvable (404) plutôt qu'interdit : son queryset ne contient
+    # que les projets de l'utilisateur.
+    check_project_membership = False
+    viewset_class = ProjectsViewSet
+
+
+class AsyncIssuesList(AsyncListView):
+    viewset_class = IssuesViewSet
+
+
+class AsyncIssueDetail(AsyncDetailView):
+    viewset_class = IssuesViewSet
+
+
+class AsyncCommentsList(AsyncListView):
+    viewset_class = CommentsViewSet
+
+
+class AsyncCommentDetail(AsyncDetailView):
+    viewset_class = CommentsViewSet
+
+
+class AsyncUserCreate(AsyncAPIView):
+    # Inscription sous ASGI : le mot de passe est haché par api.hashing sans
+    # bloquer la boucle d'événements. Même contrat que UserCreate.
+    http_method_names = ['post', 'options']
+    parser_classes = [JSONParser, FormParser, MultiPartParser]
+
+    async def post(self, request):
+        data = Request(request, parsers=[
+            parser() for parser in self.parser_classes]).data
+        serializer = UserSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return self.render(serializer.errors,
+                               status.HTTP_400_BAD_REQUEST)
+        try:
+            password_hash = await hashing.amake_password(
+                serializer.validated_data['password'])
+        except hashing.PoolFull as exc:
+            return self.handle_exception(exceptions.Throttled(
+                wait=exc.retry_after, detail=hashing.POOL_FULL_MESSAGE))
+        try:
+            user = await sync_to_async(serializer.save)(
+                password_hash=password_hash)
+        except exceptions.ValidationError as exc:
+            return self.handle_exception(exc)
+        return self.render({'user_id': user.id}, status.HTTP_201_CREATED)
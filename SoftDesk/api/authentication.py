@@ -0,0 +1,222 @@
+"""
+Authentification à coût réduit.
+
+- CachedBasicAuthentication mémorise pendant une courte durée les
+  identifiants Basic déjà vérifiés, sous la forme d'un HMAC (jamais le mot de
+  passe en clair) : le hachage PBKDF2 n'est exécuté qu'au premier appel.
+- StatelessJWTAuthentication construit l'utilisateur à partir des
+  revendications du jeton, sans lire la table auth_user.
+
+Dans les deux cas, la révocation repose sur une empreinte d'authentification
+(auth stamp) dérivée du hachage du mot de passe et des drapeaux is_active,
+is_staff et is_superuser : changer de mot de passe ou désactiver le compte
+invalide les jetons, y compris de rafraîchissement, et les identifiants en
+cache. L'empreinte est elle-même gardée dans le cache AUTH_STAMP_CACHE,
+partagé par tous les processus, et effacée à chaque enregistrement de
+l'utilisateur : la révocation vaut aussitôt pour tous.
+
+Les utilisateurs ainsi construits ne portent pas de mot de passe et ne
+doivent pas être enregistrés.
+"""
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, \
+    TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from api.utils import BoundedCache
+
+USER_CLAIM = 'user'
+STAMP_CLAIM = 'auth_stamp'
+USER_FIELDS = ('username', 'first_name', 'last_name', 'is_staff',
+               'is_superuser')
+STAMP_FIELDS = ('password', 'is_active', 'is_staff', 'is_superuser')
+STAMP_KEY = 'api:auth-stamp:{}'
+# Empreinte d'un utilisateur qui n'existe plus
+NO_USER = ''
+
+_credentials = BoundedCache(
+    max_entries=getattr(settings, 'AUTH_CREDENTIALS_CACHE_MAX_ENTRIES',
+                        10000),
+    timeout=getattr(settings, 'AUTH_CREDENTIALS_CACHE_TIMEOUT', 60))
+
+
+def get_stamp_cache():
+    return caches[getattr(settings, 'AUTH_STAMP_CACHE', 'default')]
+
+
+def _stamp_timeout():
+    return getattr(settings, 'AUTH_STAMP_CACHE_TIMEOUT', 30)
+
+
+def _digest(*parts):
+    message = '\0'.join(str(part) for part in parts).encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message,
+                    hashlib.sha256).hexdigest()
+
+
+def make_stamp(password, is_active, is_staff, is_superuser):
+    return _digest('stamp', password, is_active, is_staff,
+                   is_superuser)[:16]
+
+
+def user_stamp(user):
+    return make_stamp(*(getattr(user, field) for field in STAMP_FIELDS))
+
+
+def _stamp_query(user_id):
+    # Base principale : un réplica en retard rendrait l'empreinte d'avant
+    # la révocation.
+    return User.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id).values_list(*STAMP_FIELDS)
+
+
+def get_stamp(user_id):
+    """
+    Empreinte d'authentification courante de l'utilisateur, ou None s'il
+    n'existe plus.
+    """
+    key = STAMP_KEY.format(user_id)
+    stamp = get_stamp_cache().get(key)
+    if stamp is None:
+        row = _stamp_query(user_id).first()
+        stamp = make_stamp(*row) if row else NO_USER
+        get_stamp_cache().set(key, stamp, _stamp_timeout())
+    return stamp or None
+
+
+async def aget_stamp(user_id):
+    key = STAMP_KEY.format(user_id)
+    stamp = await get_stamp_cache().aget(key)
+    if stamp is None:
+        row = await _stamp_query(user_id).afirst()
+        stamp = make_stamp(*row) if row else NO_USER
+        await get_stamp_cache().aset(key, stamp, _stamp_timeout())
+    return stamp or None
+
+
+def remember(user):
+    # L'utilisateur vient d'être lu en base : son empreinte est à jour.
+    stamp = user_stamp(user)
+    get_stamp_cache().set(STAMP_KEY.format(user.pk), stamp, _stamp_timeout())
+    return stamp
+
+
+def invalidate(user_id):
+    get_stamp_cache().delete(STAMP_KEY.format(user_id))
+
+
+def clear():
+    # Tests et mesures : vide aussi tout le cache AUTH_STAMP_CACHE
+    _credentials.clear()
+    get_stamp_cache().clear()
+
+
+def user_changed(sender, instance, **kwargs):
+    # Receveur des signaux post_save / post_delete de User (ApiConfig.ready)
+    invalidate(instance.pk)
+
+
+def check_stamp(current, stamp):
+    if current != stamp:
+        raise exceptions.AuthenticationFailed('Token has been revoked',
+                                              code='token_revoked')
+
+
+def user_claims(user):
+    return {field: getattr(user, field) for field in USER_FIELDS}
+
+
+def build_user(user_id, claims):
+    # Instance de User considérée comme déjà enregistrée, utilisable comme
+    # clé étrangère et par les permissions.
+    user = User(id=user_id, is_active=True, **claims)
+    user._state.adding = False
+    user._state.db = DEFAULT_DB_ALIAS
+    return user
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = _digest('basic', userid, password)
+        cached = _credentials.get(key)
+        if cached is not None:
+            user_id, stamp, claims = cached
+            if get_stamp(user_id) == stamp:
+                return build_user(user_id, claims), None
+            _credentials.delete(key)
+
+        user, auth = super().authenticate_credentials(userid, password,
+                                                      request)
+        _credentials.set(key, (user.pk, remember(user), user_claims(user)))
+        return user, auth
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+
+    def get_claims(self, validated_token):
+        # Renvoie (identifiant, empreinte, revendications) ou None pour les
+        # jetons émis avant l'ajout des revendications.
+        claims = validated_token.get(USER_CLAIM)
+        stamp = validated_token.get(STAMP_CLAIM)
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if claims is None or stamp is None or user_id is None:
+            return None
+        return user_id, stamp, claims
+
+    def get_user(self, validated_token):
+        claims = self.get_claims(validated_token)
+        if claims is None:
+            return super().get_user(validated_token)
+        user_id, stamp, claims = claims
+        check_stamp(get_stamp(user_id), stamp)
+        return build_user(user_id, claims)
+
+    async def aget_user(self, validated_token):
+        claims = self.get_claims(validated_token)
+        if claims is None:
+            try:
+                user = await User.objects.aget(**{
+                    jwt_settings.USER_ID_FIELD:
+                        validated_token[jwt_settings.USER_ID_CLAIM]})
+            except (KeyError, User.DoesNotExist):
+                raise exceptions.AuthenticationFailed('User not found')
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed('User is inactive')
+            return user
+        user_id, stamp, claims = claims
+        check_stamp(await aget_stamp(user_id), stamp)
+        return build_user(user_id, claims)
+
+
+class StampedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    # Les revendications sont copiées dans les jetons d'accès issus du
+    # jeton de rafraîchissement.
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[USER_CLAIM] = user_claims(user)
+        token[STAMP_CLAIM] = remember(user)
+        return token
+
+
+class StampedTokenRefreshSerializer(TokenRefreshSerializer):
+    # Un jeton de rafraîchissement émis avant un changement de mot de passe
+    # ou la désactivation du compte ne produit plus de jetons.
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        stamp = refresh.get(STAMP_CLAIM)
+        if stamp is not None:
+            check_stamp(get_stamp(refresh[jwt_settings.USER_ID_CLAIM]), stamp)
+        return super().validate(attrs)
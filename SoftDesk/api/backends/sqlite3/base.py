@@ -0,0 +1,71 @@
+"""
+Backend SQLite de SoftDesk : celui de Django, plus deux options.
+
+- OPTIONS['pragmas'] : PRAGMA exécutés à l'ouverture de chaque connexion
+  (journal_mode, synchronous, busy_timeout, mmap_size, cache_size...).
+- OPTIONS['transaction_mode'] : DEFERRED, IMMEDIATE ou EXCLUSIVE. En mode
+  IMMEDIATE, atomic() prend le verrou d'écriture dès BEGIN : une transaction
+  qui lit puis écrit attend son tour (busy_timeout) au lieu d'échouer avec
+  "database is locked" quand un autre écrivain est passé entre-temps.
+
+Une transaction qui ne fait que lire n'a pas à prendre ce verrou :
+read_transaction() ouvre atomic() avec BEGIN DEFERRED quel que soit le
+mode. En WAL, elle lit un instantané sans bloquer les écrivains.
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    # Mode imposé au prochain BEGIN par read_transaction()
+    _begin_mode = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # Options propres à ce backend, inconnues de sqlite3.connect()
+        kwargs.pop('pragmas', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    @property
+    def pragmas(self):
+        return self.settings_dict['OPTIONS'].get('pragmas') or {}
+
+    @property
+    def transaction_mode(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if mode is None:
+            return None
+        mode = mode.upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode doit valoir {', '.join(TRANSACTION_MODES)}"
+                f" ou None, pas {mode!r}.")
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    @contextmanager
+    def read_transaction(self):
+        # Dans une transaction déjà ouverte, atomic() ne fait qu'un
+        # savepoint et le mode est sans effet.
+        self._begin_mode = 'DEFERRED'
+        try:
+            with transaction.atomic(using=self.alias):
+                self._begin_mode = None
+                yield
+        finally:
+            self._begin_mode = None
+
+    def _start_transaction_under_autocommit(self):
+        mode = self._begin_mode or self.transaction_mode
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
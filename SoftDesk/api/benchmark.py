@@ -0,0 +1,410 @@
+"""
+Banc d'essai des routes de l'API : données générées par insertions groupées
+(seed) puis mesure de chaque route du DefaultRouter via le client de test
+(run). Utilisé par la commande `benchmark`.
+
+concurrency() mesure le débit d'une charge mixte lectures / écritures
+concurrentes sur une base SQLite fichier, selon un profil de connexion
+(SQLITE_PROFILES). Utilisé par la commande `bench_sqlite`.
+"""
+import copy
+import random
+import statistics
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import caching, membership
+from api.models import Project, Contributor, Issue, Comment, \
+    ProjectStatistics
+
+BATCH_SIZE = 5000
+
+# Corps des créations mesurées (POST sur les routes de liste)
+CREATE_PAYLOADS = {
+    Project: lambda index, user: {'title': f'Bench {index}',
+                                  'description': 'Description',
+                                  'type': Project.BACK_END},
+    Issue: lambda index, user: {'title': f'Bench {index}',
+                                'description': 'Description',
+                                'tag': Issue.BUG, 'priority': Issue.FAIBLE,
+                                'status': Issue.A_FAIRE,
+                                'assigned': user.pk},
+    Comment: lambda index, user: {'description': f'Bench {index}'},
+}
+
+
+def _batches(objects, size=BATCH_SIZE):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(users=1000, projects=1000, contributors=3, issues=10, comments=10,
+         stdout=None):
+    """
+    Crée les volumes demandés par insertions groupées : `contributors`,
+    `issues` et `comments` s'entendent par projet, par projet et par
+    problème. Le premier utilisateur contribue à tous les projets ; c'est
+    lui qui exécute les requêtes mesurées. Renvoie cet utilisateur.
+    """
+    def report(message):
+        if stdout is not None:
+            stdout.write(message)
+
+    rng = random.Random(0)
+    now = timezone.now()
+    # Un seul hachage PBKDF2 pour tous les comptes
+    password = make_password('password')
+    for batch in _batches(
+            User(username=f'bench{index}@softdesk.test',
+                 email=f'bench{index}@softdesk.test', password=password,
+                 first_name='Bench', last_name=str(index))
+            for index in range(users)):
+        User.objects.bulk_create(batch)
+    user_ids = list(User.objects.filter(
+        username__startswith='bench').order_by('id').values_list(
+        'id', flat=True))
+    report(f'{len(user_ids)} utilisateurs')
+
+    first_project = Project.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    for batch in _batches(
+            Project(title=f'Projet {index}', description='Description',
+                    type=Project.TYPES[index % len(Project.TYPES)][0],
+                    author_user_id_id=user_ids[index % len(user_ids)])
+            for index in range(projects)):
+        Project.objects.bulk_create(batch)
+    project_ids = list(Project.objects.filter(
+        id__gt=first_project).order_by('id').values_list('id', flat=True))
+    report(f'{len(project_ids)} projets')
+
+    def project_contributors():
+        for index, project_id in enumerate(project_ids):
+            members = {user_ids[0], user_ids[index % len(user_ids)]}
+            members.update(rng.sample(user_ids, min(contributors,
+                                                    len(user_ids))))
+            for user_id in members:
+                yield Contributor(
+                    project_id_id=project_id, user_id_id=user_id,
+                    role=Contributor.CREATOR
+                    if user_id == user_ids[index % len(user_ids)]
+                    else Contributor.CONTRIBUTOR)
+    for batch in _batches(project_contributors()):
+        Contributor.objects.bulk_create(batch)
+    report(f'{Contributor.objects.count()} contributeurs')
+
+    first_issue = Issue.objects.order_by('-id').values_list(
+        'id', flat=True).first() or 0
+    tags = [code for code, _ in Issue.TAGS]
+    priorities = [code for code, _ in Issue.PRIORITIES]
+    states = [code for code, _ in Issue.STATUS]
+    for batch in _batches(
+            Issue(title=f'Probléme {index}', description='Description',
+                  tag=rng.choice(tags), priority=rng.choice(priorities),
+                  status=rng.choice(states), project_id_id=project_id,
+                  author_user_id_id=rng.choice(user_ids),
+                  assigned_id=rng.choice(user_ids),
+                  created_time=now - timedelta(minutes=index))
+            for project_id in project_ids for index in range(issues)):
+        Issue.objects.bulk_create(batch)
+    issue_ids = list(Issue.objects.filter(id__gt=first_issue).values_list(
+        'id', flat=True))
+    report(f'{len(issue_ids)} problèmes')
+
+    for batch in _batches(
+            Comment(description=f'Commentaire {index}',
+                    author_user_id_id=rng.choice(user_ids),
+                    issue_id_id=issue_id,
+                    created_time=now - timedelta(seconds=index))
+            for issue_id in issue_ids for index in range(comments)):
+        Comment.objects.bulk_create(batch)
+    report(f'{len(issue_ids) * comments} commentaires')
+
+    # Les insertions groupées ne passent pas par save() : compteurs
+    # recalculés projet par projet.
+    for project_id in project_ids:
+        ProjectStatistics.rebuild(project_id)
+    return User.objects.get(pk=user_ids[0])
+
+
+def seed_once(stdout=None, **volumes):
+    # Une base conservée (--database-file) n'est générée qu'une fois.
+    user = User.objects.filter(username='bench0@softdesk.test').first()
+    if user is not None:
+        if stdout is not None:
+            stdout.write('Données existantes réutilisées')
+        return user
+    return seed(stdout=stdout, **volumes)
+
+
+def get_routes(router):
+    """
+    Routes mesurables du router : (nom, motif, classe de vue, méthodes),
+    sans les variantes à suffixe de format ni la racine.
+    """
+    routes = []
+    for pattern in router.urls:
+        actions = getattr(pattern.callback, 'actions', None)
+        if not actions or 'format' in pattern.pattern.regex.groupindex:
+            continue
+        routes.append((pattern.name, pattern.pattern.regex.groupindex,
+                       pattern.callback.cls, sorted(actions)))
+    return routes
+
+
+def sample_kwargs(user):
+    # Identifiants des objets visés : le projet de l'utilisateur qui a le
+    # plus de problèmes, son premier problème et son premier commentaire.
+    project_ids = Contributor.objects.filter(user_id=user).values('project_id')
+    project = Project.objects.filter(id__in=project_ids).order_by(
+        '-statistics__issues', 'id').first()
+    issue = Issue.objects.filter(project_id=project).order_by('id').first()
+    comment = Comment.objects.filter(issue_id=issue).order_by('id').first()
+    contributor = Contributor.objects.filter(project_id=project).order_by(
+        'id').first()
+    return {
+        'project_id': project.pk,
+        'issue_id': issue.pk if issue else None,
+        Project: project.pk,
+        Issue: issue.pk if issue else None,
+        Comment: comment.pk if comment else None,
+        Contributor: contributor.pk if contributor else None,
+    }
+
+
+def _percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100)[percent - 1]
+
+
+def measure(client, method, url, data, requests, keep_cache):
+    # `data(index)` fournit le corps de la requête numéro index
+    latencies, queries, status = [], 0, None
+    for index in range(requests):
+        if not keep_cache:
+            caching.get_cache().clear()
+        body = data(index) if data else None
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, body, format='json')
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            latencies.append(time.perf_counter() - start)
+        queries += len(captured.captured_queries)
+        status = response.status_code
+    total = sum(latencies)
+    return {
+        'url': url,
+        'status': status,
+        'requests': requests,
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(_percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(total / requests * 1000, 3),
+        'queries_per_request': round(queries / requests, 2),
+        'throughput_rps': round(requests / total, 1) if total else None,
+    }
+
+
+def run(router, user, requests=50, keep_cache=False, writes=True,
+        stdout=None):
+    """
+    Mesure chaque route du router avec le client de test : GET sur toutes
+    les routes, et POST sur les routes de liste des projets, problèmes et
+    commentaires si `writes`. Renvoie {"GET projects-list": {...}, ...}.
+    """
+    client = APIClient()
+    client.force_authenticate(user)
+    kwargs = sample_kwargs(user)
+    results = {}
+    for name, groups, view, methods in get_routes(router):
+        model = view.serializer_class.Meta.model
+        url_kwargs = {group: kwargs[model] if group == 'pk' else kwargs[group]
+                      for group in groups}
+        if None in url_kwargs.values():
+            continue
+        url = reverse(name, kwargs=url_kwargs)
+        plans = []
+        if 'get' in methods:
+            plans.append(('get', None))
+        if writes and 'post' in methods and name.endswith('-list') and \
+                model in CREATE_PAYLOADS:
+            payload = CREATE_PAYLOADS[model]
+            plans.append(('post', lambda index, payload=payload:
+                          payload(index, user)))
+        for method, data in plans:
+            membership.clear()
+            # Une requête d'échauffement, hors mesure
+            getattr(client, method)(url, data(-1) if data else None,
+                                    format='json')
+            key = f'{method.upper()} {name}'
+            results[key] = measure(client, method, url, data, requests,
+                                   keep_cache)
+            if stdout is not None:
+                result = results[key]
+                stdout.write(
+                    f"{key:32} p50 {result['p50_ms']:8.2f} ms  "
+                    f"p99 {result['p99_ms']:8.2f} ms  "
+                    f"{result['queries_per_request']:5.1f} requêtes  "
+                    f"{result['throughput_rps']} req/s")
+    return results
+
+
+def compare(previous, current):
+    # Variation relative du p50 et des requêtes par route, entre deux runs
+    changes = {}
+    for key, result in current.items():
+        before = previous.get(key)
+        if not before:
+            continue
+        changes[key] = {
+            'p50_change': round(result['p50_ms'] / before['p50_ms'] - 1, 3)
+            if before['p50_ms'] else None,
+            'queries_change': round(result['queries_per_request'] -
+                                    before['queries_per_request'], 2),
+        }
+    return changes
+
+
+# Réglages de connexion comparés par concurrency() : 'legacy' reproduit la
+# configuration d'origine (nouvelle connexion par requête, journal rollback,
+# BEGIN différé) ; 'production' reprend DATABASES['default'].
+SQLITE_PROFILES = {
+    'legacy': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+        'OPTIONS': {},
+    },
+    'production': None,
+}
+
+
+def sqlite_profile(name):
+    profile = copy.deepcopy(connections.settings['default'])
+    overrides = SQLITE_PROFILES[name]
+    if overrides is not None:
+        profile.update(copy.deepcopy(overrides))
+    return profile
+
+
+def _concurrency_workload(alias, issue_ids, write_ratio, deadline, seed,
+                          counts):
+    rng = random.Random(seed)
+    db = connections[alias]
+    reads = writes = errors = 0
+    try:
+        while time.perf_counter() < deadline:
+            # Cycle d'une requête HTTP : request_started / request_finished
+            db.close_if_unusable_or_obsolete()
+            try:
+                if rng.random() < write_ratio:
+                    # Lecture puis écriture dans la même transaction, comme
+                    # Issue.save() et ses compteurs.
+                    issue_id = rng.choice(issue_ids)
+                    with transaction.atomic(using=alias):
+                        issues = Issue.objects.using(alias)
+                        status = issues.filter(pk=issue_id).values_list(
+                            'status', flat=True).first()
+                        issues.filter(pk=issue_id).update(
+                            status=Issue.TERMINE if status == Issue.A_FAIRE
+                            else Issue.A_FAIRE)
+                    writes += 1
+                else:
+                    list(Issue.objects.using(alias).select_related(
+                        'author_user_id', 'assigned').order_by('-id')[:20])
+                    reads += 1
+            except OperationalError:
+                # "database is locked"
+                errors += 1
+            db.close_if_unusable_or_obsolete()
+    finally:
+        db.close()
+        counts.append((reads, writes, errors))
+
+
+def concurrency(path, profile='production', threads=8, duration=5.0,
+                write_ratio=0.2, issues=200):
+    """
+    Lance `threads` clients qui enchaînent pendant `duration` secondes des
+    lectures (liste de problèmes) et, dans une proportion `write_ratio`, des
+    écritures (lecture puis mise à jour d'un problème) sur la base SQLite
+    `path`, migrée au besoin. Renvoie le nombre d'opérations réussies, le
+    débit et le nombre d'erreurs de verrouillage.
+    """
+    alias = f'concurrency_{profile}'
+    settings_dict = sqlite_profile(profile)
+    settings_dict['NAME'] = str(path)
+    connections.settings[alias] = settings_dict
+    try:
+        db = connections[alias]
+        with db.cursor() as cursor:
+            # Le mode WAL est conservé dans le fichier : une base passée en
+            # WAL par un autre profil revient au journal rollback.
+            if 'pragmas' not in settings_dict['OPTIONS']:
+                cursor.execute('PRAGMA journal_mode = DELETE')
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        call_command('migrate', database=alias, verbosity=0)
+        issue_ids = list(Issue.objects.using(alias).values_list(
+            'id', flat=True))
+        if not issue_ids:
+            user = User.objects.db_manager(alias).create_user(
+                username='concurrency@softdesk.test', password=None)
+            project = Project(title='Concurrence', description='Description',
+                              type=Project.BACK_END, author_user_id=user)
+            Project.objects.using(alias).bulk_create([project])
+            project = Project.objects.using(alias).get()
+            Issue.objects.using(alias).bulk_create(
+                Issue(title=f'Probléme {index}', description='Description',
+                      tag=Issue.BUG, priority=Issue.FAIBLE,
+                      status=Issue.A_FAIRE, project_id=project,
+                      author_user_id=user, assigned=user)
+                for index in range(issues))
+            issue_ids = list(Issue.objects.using(alias).values_list(
+                'id', flat=True))
+        db.close()
+
+        counts = []
+        deadline = time.perf_counter() + duration
+        workers = [threading.Thread(
+            target=_concurrency_workload,
+            args=(alias, issue_ids, write_ratio, deadline, index, counts))
+            for index in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+    reads, writes, errors = (sum(values) for values in zip(*counts))
+    return {
+        'profile': profile,
+        'journal_mode': journal_mode,
+        'threads': threads,
+        'reads': reads,
+        'writes': writes,
+        'errors': errors,
+        'throughput_ops': round((reads + writes) / duration, 1),
+        'write_throughput_ops': round(writes / duration, 1),
+    }
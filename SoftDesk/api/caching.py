@@ -0,0 +1,80 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from api.conditional import VersionMarkerMixin
+
+HITS_KEY = 'api:response-cache:hits'
+MISSES_KEY = 'api:response-cache:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_RESPONSE_CACHE', 'default')]
+
+
+def _increment(key):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Compteur évincé entre add et incr
+        cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None}
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+class ResponseCacheMixin(VersionMarkerMixin):
+    """
+    Met en cache les données sérialisées des vues list et retrieve.
+
+    La clé comprend l'utilisateur, la vue, l'URL complète (paramètres de
+    requête inclus), le format de rendu et la version du projet : toute
+    écriture incrémente Project.version, ce qui rend les anciennes entrées
+    inaccessibles sans avoir à les rechercher. Elles disparaissent ensuite
+    par expiration ou par l'éviction du backend (MAX_ENTRIES).
+    """
+
+    def get_cache_key(self, request, marker):
+        source = ':'.join(str(part) for part in (
+            self.__class__.__name__, self.action, request.user.pk,
+            marker[0], marker[1], request.build_absolute_uri(),
+            request.accepted_renderer.format))
+        return 'api:response:' + hashlib.md5(source.encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        marker = self.version_marker()
+        if marker is None:
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = self.get_cache_key(request, marker)
+        data = cache.get(key)
+        if data is not None:
+            _increment(HITS_KEY)
+            return Response(data)
+
+        _increment(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request,
+                                    *args, **kwargs)
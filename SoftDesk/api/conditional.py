@@ -0,0 +1,78 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from api.models import Project
+
+
+class VersionMarkerMixin:
+    """
+    Fournit le marqueur de version (Project.version) des ressources servies
+    par la vue, lu une seule fois par requête.
+    """
+
+    def get_version_marker(self):
+        # Renvoie (version, date de dernière modification) ou None lorsque
+        # le projet n'existe pas. Une seule requête sur la clé primaire.
+        return Project.objects.filter(
+            pk=self.kwargs.get('project_id')).values_list(
+            'version', 'updated_time').first()
+
+    def version_marker(self):
+        if not hasattr(self, '_version_marker'):
+            self._version_marker = self.get_version_marker()
+        return self._version_marker
+
+
+class ConditionalGetMixin(VersionMarkerMixin):
+    """
+    Ajoute les en-têtes ETag et Last-Modified aux vues list et retrieve, à
+    partir du marqueur de version du projet (Project.version). Lorsque le
+    client possède déjà la version courante (If-None-Match), une réponse 304
+    est renvoyée sans exécuter les requêtes de la vue ni la sérialisation.
+    Last-Modified est informatif : If-Modified-Since est ignoré.
+    """
+
+    def get_etag(self, request, marker):
+        # La représentation dépend de l'utilisateur, de l'URL complète
+        # (pagination, filtres) et du format de rendu. La date de
+        # modification distingue un projet recréé avec un identifiant réutilisé.
+        version, updated_time = marker
+        source = f"{request.user.pk}:{version}:{updated_time}:" \
+                 f"{request.get_full_path()}:{request.accepted_renderer.format}"
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        marker = self.version_marker()
+        if marker is None:
+            return handler(request, *args, **kwargs)
+        updated_time = marker[1]
+        etag = self.get_etag(request, marker)
+        last_modified = int(updated_time.timestamp()) if updated_time \
+            else None
+
+        # Décision sur l'ETag seul : Last-Modified n'est précis qu'à la
+        # seconde, et If-Modified-Since validerait une représentation
+        # modifiée dans la seconde qui a suivi son envoi.
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Le client doit revalider à chaque fois : la réponse 304 coûte une
+        # seule requête SQL.
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization', 'Cookie'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
@@ -0,0 +1,305 @@
+"""
+Suppression différée des projets et des problèmes.
+
+Supprimer un projet avec Model.delete() charge tous ses problèmes,
+commentaires et contributeurs pour les cascades, et garde le verrou
+d'écriture de SQLite pendant toute l'opération. À la place :
+
+1. delete_project() / delete_issue() masquent la cible (deleted_time),
+   ajustent les compteurs et créent une DeletionJob, dans une seule courte
+   transaction ;
+2. le worker du processus supprime ensuite les lignes filles par lots de
+   DELETION_BATCH_SIZE, une transaction par lot, avec une pause de
+   DELETION_BATCH_PAUSE secondes entre deux lots pour laisser passer les
+   autres écritures.
+
+Un processus ne purge une tâche qu'après l'avoir réservée (claim()) par
+une mise à jour conditionnelle : deux workers ne traitent jamais la même
+tâche en même temps. La réservation est renouvelée à chaque lot ; une
+tâche RUNNING dont la réservation date de plus de DELETION_LEASE secondes
+est celle d'un processus arrêté, et peut être reprise.
+
+Chaque lot supprime ce qui reste : une tâche interrompue est reprise sans
+erreur. Une tâche en échec est retentée après DELETION_RETRY_DELAY
+secondes, délai doublé à chaque échec, jusqu'à DELETION_ATTEMPTS échecs ;
+elle reste ensuite en échec, visible dans l'admin, jusqu'à une relance
+manuelle (retry_failed()).
+
+Chaque processus serveur lance son worker à la première requête qu'il
+reçoit (resume_pending(), reçoit request_started des gestionnaires WSGI et
+ASGI, pas du client de test) ; il l'est aussi à chaque suppression ou
+consultation d'une tâche inachevée. La commande resume_deletions traite
+les tâches en attente hors serveur.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from api import membership
+from api.models import ChangeLog, Comment, Contributor, DeletionJob, \
+    Issue, Project, ProjectStatistics
+
+logger = logging.getLogger('api.deletion')
+
+UNFINISHED = (DeletionJob.PENDING, DeletionJob.RUNNING)
+
+
+def delete_project(project, user):
+    now = timezone.now()
+    with transaction.atomic():
+        Project.objects.filter(pk=project.pk).update(
+            deleted_time=now, version=models.F('version') + 1,
+            updated_time=now)
+        job = DeletionJob.objects.create(
+            target=DeletionJob.PROJECT, object_id=project.pk,
+            requested_by=user)
+    membership.invalidate_project(project.pk)
+    schedule()
+    return job
+
+
+def delete_issue(issue, user):
+    with transaction.atomic():
+        # Le problème sort des compteurs dès qu'il est masqué, avec ses
+        # valeurs en base (l'instance a pu être chargée avant une écriture)
+        deltas = ProjectStatistics.issue_deltas(
+            Issue.stored_counted_values([issue.pk]).get(issue.pk), None)
+        comments = issue.issue_comments.count()
+        if comments:
+            deltas['comments'] = -comments
+        Issue.objects.filter(pk=issue.pk).update(
+            deleted_time=timezone.now())
+        ProjectStatistics.apply(issue.project_id_id, deltas)
+        # Les commentaires du problème disparaissent avec lui pour les
+        # clients synchronisés
+        ChangeLog.record(issue.project_id_id, ChangeLog.ISSUE,
+                         ChangeLog.DELETED, [issue.pk])
+        Project.bump_version(pk=issue.project_id_id)
+        job = DeletionJob.objects.create(
+            target=DeletionJob.ISSUE, object_id=issue.pk, requested_by=user)
+    schedule()
+    return job
+
+
+def purge_steps(job):
+    # QuerySets vidés dans l'ordre, des feuilles vers la cible : au moment
+    # de supprimer une ligne, plus rien ne s'y rattache.
+    if job.target == DeletionJob.PROJECT:
+        return [
+            Comment.objects.filter(issue_id__project_id=job.object_id),
+            Issue.objects.filter(project_id=job.object_id),
+            Contributor.objects.filter(project_id=job.object_id),
+            ChangeLog.objects.filter(project_id=job.object_id),
+            Project.objects.filter(pk=job.object_id),
+        ]
+    return [
+        Comment.objects.filter(issue_id=job.object_id),
+        Issue.objects.filter(pk=job.object_id),
+    ]
+
+
+def get_lease():
+    return getattr(settings, 'DELETION_LEASE', 60)
+
+
+def claimable():
+    # Tâches en attente, en cours dans un processus qui ne donne plus signe
+    # de vie (réservation expirée ou antérieure à heartbeat_time), ou en
+    # échec dont le délai avant nouvelle tentative est écoulé
+    now = timezone.now()
+    expired = now - timedelta(seconds=get_lease())
+    return DeletionJob.objects.filter(
+        models.Q(status=DeletionJob.PENDING) |
+        models.Q(status=DeletionJob.RUNNING) & (
+            models.Q(heartbeat_time__lt=expired) |
+            models.Q(heartbeat_time__isnull=True)) |
+        models.Q(status=DeletionJob.FAILED, retry_time__lte=now))
+
+
+def claim(job):
+    """
+    Réserve la tâche pour ce processus. Un seul UPDATE conditionnel : si
+    un autre processus l'a réservée entre-temps, aucune ligne n'est
+    modifiée et la tâche ne doit pas être exécutée.
+    """
+    now = timezone.now()
+    return claimable().filter(pk=job.pk).update(
+        status=DeletionJob.RUNNING, heartbeat_time=now, retry_time=None,
+        started_time=Coalesce('started_time', now)) == 1
+
+
+def purge(job):
+    """
+    Exécute jusqu'au bout, lot par lot, une tâche réservée par claim().
+    Renvoie le nombre de lignes supprimées par cet appel.
+    """
+    size = getattr(settings, 'DELETION_BATCH_SIZE', 1000)
+    pause = getattr(settings, 'DELETION_BATCH_PAUSE', 0.05)
+    total = 0
+    for queryset in purge_steps(job):
+        while True:
+            with transaction.atomic():
+                ids = list(queryset.values_list('pk', flat=True)[:size])
+                if not ids:
+                    break
+                deleted, _ = queryset.model.objects.filter(
+                    pk__in=ids).delete()
+                DeletionJob.objects.filter(pk=job.pk).update(
+                    deleted=models.F('deleted') + deleted,
+                    heartbeat_time=timezone.now())
+            total += deleted
+            if pause:
+                time.sleep(pause)
+    DeletionJob.objects.filter(pk=job.pk).update(
+        status=DeletionJob.DONE, error='', finished_time=timezone.now())
+    return total
+
+
+def fail(job, exc):
+    # Nouvelle tentative après un délai doublé à chaque échec ; au-delà de
+    # DELETION_ATTEMPTS échecs, la tâche attend une relance manuelle.
+    attempts = job.attempts + 1
+    retry_time = None
+    if attempts < getattr(settings, 'DELETION_ATTEMPTS', 5):
+        delay = getattr(settings, 'DELETION_RETRY_DELAY', 60)
+        retry_time = timezone.now() + timedelta(
+            seconds=delay * 2 ** (attempts - 1))
+    else:
+        logger.error('Suppression %s abandonnée après %d échecs', job.pk,
+                     attempts)
+    DeletionJob.objects.filter(pk=job.pk).update(
+        status=DeletionJob.FAILED, error=str(exc), attempts=attempts,
+        retry_time=retry_time, finished_time=timezone.now())
+
+
+def retry_failed(jobs):
+    # Relance manuelle des tâches en échec ; renvoie leur nombre
+    return jobs.filter(status=DeletionJob.FAILED).update(
+        status=DeletionJob.PENDING, error='', attempts=0, retry_time=None)
+
+
+def run(job):
+    # False : la tâche est déjà exécutée par un autre processus
+    if not claim(job):
+        return False
+    try:
+        purge(job)
+    except Exception as exc:
+        logger.exception('Échec de la suppression %s', job)
+        fail(job, exc)
+    return True
+
+
+def run_pending():
+    # Traite les tâches en attente ou interrompues, de la plus ancienne à
+    # la plus récente ; celles qu'exécute un autre processus sont laissées.
+    # Renvoie le nombre de tâches traitées.
+    count = 0
+    while True:
+        job = claimable().order_by('id').first()
+        if job is None:
+            return count
+        count += run(job)
+
+
+def next_run():
+    # Secondes avant que des tâches redeviennent exécutables sans nouvelle
+    # notification, None s'il n'y en a pas
+    delays = []
+    if DeletionJob.objects.filter(status=DeletionJob.RUNNING).exists():
+        # Tâche réservée ailleurs : si ce processus s'est arrêté, elle sera
+        # reprise à l'expiration du bail.
+        delays.append(get_lease())
+    retry_time = DeletionJob.objects.filter(
+        status=DeletionJob.FAILED, retry_time__isnull=False).aggregate(
+        models.Min('retry_time'))['retry_time__min']
+    if retry_time is not None:
+        delays.append(max((retry_time - timezone.now()).total_seconds(), 0))
+    return min(delays, default=None)
+
+
+class DeletionWorker:
+    """
+    Thread du processus qui exécute les tâches de suppression. Il démarre
+    à la première notification et s'arrête quand il n'a plus rien à faire.
+
+    L'état est rattaché au processus qui l'a créé : un processus issu d'un
+    fork (serveur pre-fork) n'hérite ni du thread de son parent, qui n'y
+    existe pas, ni de son verrou, copié dans l'état où il était.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._started = False
+
+    def start(self):
+        # Une seule fois par processus
+        if self._pid != os.getpid():
+            self._reset()
+        if not self._started:
+            self._started = True
+            self.notify()
+
+    def notify(self):
+        if self._pid != os.getpid():
+            self._reset()
+        with self._lock:
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='deletion-worker', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._wake.is_set():
+                        self._thread = None
+                        return
+                    self._wake.clear()
+                try:
+                    run_pending()
+                    delay = next_run()
+                    if delay is not None:
+                        # Une notification interrompt l'attente
+                        self._wake.wait(delay)
+                        self._wake.set()
+                except Exception:
+                    logger.exception('Erreur du worker de suppression')
+        finally:
+            connection.close()
+
+
+worker = DeletionWorker()
+
+
+def schedule():
+    # Le worker ne doit voir la tâche qu'une fois la transaction validée
+    transaction.on_commit(worker.notify)
+
+
+def resume_pending(**kwargs):
+    # Première requête servie par le processus : reprend les tâches
+    # laissées par un arrêt ou à retenter
+    worker.start()
+
+
+def resume(job):
+    # Consultation d'une tâche inachevée : relance le worker si le
+    # processus qui l'exécutait s'est arrêté.
+    if job.status in UNFINISHED:
+        worker.notify()
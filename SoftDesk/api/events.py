@@ -0,0 +1,209 @@
+"""
+Diffusion en temps réel des modifications de problèmes et de commentaires.
+
+Chaque ajout au journal ChangeLog (signal changes_recorded) est transformé,
+une fois la transaction validée, en événements issue.created,
+issue.updated, issue.deleted, comment.created... Le contenu des objets est
+relu en une requête par type, quel que soit le nombre d'abonnés ; le Broker
+du processus remet ensuite les mêmes événements à tous les flux abonnés au
+projet (api.sse). Rien n'est relu tant que personne n'écoute le projet.
+
+L'identifiant d'un événement est celui de l'entrée du journal : un client
+qui se reconnecte avec Last-Event-ID reçoit les événements manqués, relus
+depuis le journal (replay).
+
+Le transport entre les écritures et le Broker est choisi par EVENTS_BACKEND.
+LocalBackend remet les événements au Broker du même processus ; un backend
+partagé entre processus (pub/sub) expose les mêmes méthodes et appelle
+Broker.dispatch à la réception.
+"""
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from api import sync
+from api.models import ChangeLog
+
+logger = logging.getLogger('api.events')
+
+Event = namedtuple('Event', ['id', 'project_id', 'name', 'data'])
+
+# Préfixe de l'événement et champ identifiant de chaque type d'objet diffusé
+NAMES = {
+    ChangeLog.ISSUE: ('issue', 'issue_id'),
+    ChangeLog.COMMENT: ('comment', 'comment_id'),
+}
+
+ACTIONS = {
+    ChangeLog.CREATED: 'created',
+    ChangeLog.UPDATED: 'updated',
+    ChangeLog.DELETED: 'deleted',
+}
+
+_renderer = JSONRenderer()
+
+
+def encode(event):
+    # Format text/event-stream ; le JSON rendu tient sur une ligne
+    data = _renderer.render(event.data).decode()
+    return f'id: {event.id}\nevent: {event.name}\ndata: {data}\n\n'.encode()
+
+
+def build_events(project_id, entries):
+    """
+    Événements des entrées (id, model, action, object_id) du journal. Les
+    objets encore présents sont relus en une requête par type ; une entrée
+    dont l'objet a disparu depuis est ignorée, sa suppression suit.
+    """
+    rows = {}
+    for model in NAMES:
+        object_ids = list(dict.fromkeys(
+            object_id for _, kind, action, object_id in entries
+            if kind == model and action != ChangeLog.DELETED))
+        rows[model] = sync.fetch(project_id, model, object_ids) \
+            if object_ids else {}
+    events = []
+    for pk, model, action, object_id in entries:
+        if model not in NAMES:
+            continue
+        prefix, id_field = NAMES[model]
+        if action == ChangeLog.DELETED:
+            data = {id_field: object_id}
+        elif object_id in rows[model]:
+            data = rows[model][object_id]
+        else:
+            continue
+        events.append(Event(pk, project_id, f'{prefix}.{ACTIONS[action]}',
+                            data))
+    return events
+
+
+def replay(project_id, last_id):
+    """
+    Événements postérieurs à `last_id`, au plus EVENTS_REPLAY_LIMIT. Renvoie
+    (événements, complet) ; au-delà de la limite le client doit recharger.
+    """
+    limit = getattr(settings, 'EVENTS_REPLAY_LIMIT', 1000)
+    entries = list(ChangeLog.objects.filter(
+        project_id=project_id, id__gt=last_id,
+        model__in=list(NAMES)).order_by('id').values_list(
+        'id', 'model', 'action', 'object_id')[:limit + 1])
+    return build_events(project_id, entries[:limit]), len(entries) <= limit
+
+
+def last_event_id(project_id):
+    return ChangeLog.objects.filter(project_id=project_id).aggregate(
+        last=Max('id'))['last'] or 0
+
+
+class Subscription:
+    """
+    Abonnement d'un flux aux événements d'un projet. La file est bornée : un
+    client trop lent est marqué `overflow` et son flux est fermé, il reprend
+    à sa reconnexion avec Last-Event-ID.
+    """
+
+    def __init__(self, project_id, loop, size):
+        self.project_id = project_id
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+        self.overflow = False
+
+    def put(self, event):
+        # Appelée dans la boucle d'événements du flux
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflow = True
+
+
+class Broker:
+    """
+    Abonnements des flux du processus, par projet. dispatch() peut être
+    appelée depuis n'importe quel thread : chaque événement est confié à la
+    boucle d'événements de l'abonné.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, project_id):
+        subscription = Subscription(
+            project_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(project_id, set()).add(
+                subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.project_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.project_id]
+
+    def has_subscribers(self, project_id):
+        return project_id in self._subscriptions
+
+    def dispatch(self, events):
+        for event in events:
+            with self._lock:
+                subscriptions = list(
+                    self._subscriptions.get(event.project_id, ()))
+            for subscription in subscriptions:
+                try:
+                    subscription.loop.call_soon_threadsafe(
+                        subscription.put, event)
+                except RuntimeError:
+                    # Boucle fermée : le flux n'existe plus
+                    self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    # Écritures et flux servis par le même processus
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def has_subscribers(self, project_id):
+        return self.broker.has_subscribers(project_id)
+
+    def publish(self, events):
+        self.broker.dispatch(events)
+
+
+broker = Broker(queue_size=getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+backend = import_string(getattr(
+    settings, 'EVENTS_BACKEND', 'api.events.LocalBackend'))(broker)
+
+
+def publish(project_id, entries):
+    # Après validation : un échec de diffusion ne doit pas faire échouer
+    # l'écriture, les clients rattrapent par le journal.
+    try:
+        if backend.has_subscribers(project_id):
+            backend.publish(build_events(project_id, entries))
+    except Exception:
+        logger.exception('Échec de la diffusion des événements du projet %s',
+                         project_id)
+
+
+def changes_recorded(sender, project_id, entries, **kwargs):
+    # Récepteur du signal api.models.changes_recorded
+    entries = [(entry.pk, entry.model, entry.action, entry.object_id)
+               for entry in entries if entry.model in NAMES]
+    if entries:
+        # Les abonnés sont comptés après validation : un flux ouvert entre
+        # temps a pu relire le journal avant l'écriture.
+        project_id = int(project_id)
+        transaction.on_commit(lambda: publish(project_id, entries))
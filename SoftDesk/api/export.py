@@ -0,0 +1,147 @@
+import csv
+import json
+import tempfile
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.models import Issue, Comment
+
+ISSUE_COLUMNS = ('id', 'title', 'description', 'tag', 'priority', 'status',
+                 'author_user_id', 'assigned', 'created_time')
+COMMENT_COLUMNS = ('id', 'issue_id', 'description', 'author_user_id',
+                   'created_time')
+CSV_HEADER = ('record', 'issue_id', 'comment_id', 'title', 'description',
+              'tag', 'priority', 'status', 'author_user_id', 'assigned',
+              'created_time')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+# Taille au-delà de laquelle spool_project() écrit sur disque
+SPOOL_SIZE = 1024 * 1024
+
+
+def iter_issues(project_id, with_comments=False, using=None):
+    """
+    Parcourt les problèmes du projet par blocs de CHUNK_SIZE lignes, dans
+    l'ordre (created_time, id). Avec with_comments, chaque problème est
+    accompagné de ses commentaires : les deux curseurs sont lus en parallèle
+    dans le même ordre, si bien que seuls les commentaires du problème
+    courant sont en mémoire.
+    """
+    issues = Issue.objects.using(using).filter(
+        project_id=project_id, deleted_time__isnull=True).order_by(
+        'created_time', 'id').values_list(*ISSUE_COLUMNS).iterator(
+        chunk_size=CHUNK_SIZE)
+    if not with_comments:
+        for issue in issues:
+            yield issue, None
+        return
+
+    comments = Comment.objects.using(using).filter(
+        issue_id__project_id=project_id,
+        issue_id__deleted_time__isnull=True).order_by(
+        'issue_id__created_time', 'issue_id', 'created_time',
+        'id').values_list(*COMMENT_COLUMNS).iterator(chunk_size=CHUNK_SIZE)
+    pending = next(comments, None)
+    for issue in issues:
+        nested = []
+        while pending is not None and pending[1] == issue[0]:
+            nested.append(pending)
+            pending = next(comments, None)
+        yield issue, nested
+
+
+def issue_record(issue):
+    record = dict(zip(('issue_id',) + ISSUE_COLUMNS[1:], issue))
+    record['created_time'] = record['created_time'].isoformat()
+    return record
+
+
+def comment_record(comment):
+    return {'comment_id': comment[0], 'description': comment[2],
+            'author_user_id': comment[3],
+            'created_time': comment[4].isoformat()}
+
+
+def ndjson_lines(rows):
+    for issue, comments in rows:
+        record = issue_record(issue)
+        if comments is not None:
+            record['comments'] = [comment_record(comment)
+                                  for comment in comments]
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    # Pseudo-fichier : csv.writer renvoie directement la ligne écrite.
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for issue, comments in rows:
+        record = issue_record(issue)
+        yield writer.writerow((
+            'issue', record['issue_id'], '', record['title'],
+            record['description'], record['tag'], record['priority'],
+            record['status'], record['author_user_id'], record['assigned'],
+            record['created_time']))
+        for comment in comments or ():
+            yield writer.writerow((
+                'comment', issue[0], comment[0], '', comment[2], '', '', '',
+                comment[3], '', comment[4].isoformat()))
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    # Regroupe les lignes en blocs d'environ `size` octets pour limiter le
+    # nombre d'écritures sur la socket.
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer).encode()
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def export_project(project_id, output='ndjson', with_comments=False,
+                   using=None):
+    """
+    Générateur d'octets de l'export d'un projet. Les lectures ont lieu dans
+    une même transaction de la base `using` (par défaut, la base principale)
+    pour obtenir un instantané cohérent, et commencent seulement lorsque le
+    premier bloc est demandé. Cette transaction reste ouverte pendant tout
+    l'envoi : c'est une transaction de lecture (BEGIN DEFERRED, voir
+    api.backends.sqlite3), qui ne retient pas le verrou d'écriture.
+    """
+    formatter = csv_lines if output == 'csv' else ndjson_lines
+    using = using or DEFAULT_DB_ALIAS
+    with connections[using].read_transaction():
+        yield from buffered(formatter(iter_issues(project_id,
+                                                  with_comments, using)))
+
+
+def spool_project(project_id, output='ndjson', with_comments=False,
+                  using=None):
+    """
+    Export complet dans un fichier temporaire (en mémoire jusqu'à
+    SPOOL_SIZE octets), lu entièrement dans le thread appelant.
+
+    Pour ASGI : Django 4.1 parcourt le flux d'une StreamingHttpResponse
+    dans la boucle d'événements, où export_project() lirait la base hors
+    du thread qui possède la connexion et sa transaction.
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    for chunk in export_project(project_id, output, with_comments, using):
+        file.write(chunk)
+    file.seek(0)
+    return file
@@ -0,0 +1,66 @@
+from rest_framework import serializers
+
+from api.serializers import ProjectionSerializer
+
+
+class SparseFieldsetMixin:
+    """
+    Champs partiels sur les vues list et retrieve : ?fields=a,b limite la
+    sortie aux champs demandés.
+
+    Les champs non demandés ne sont pas calculés (context['fields']) et la
+    requête est réduite en conséquence : only() sur les colonnes utiles et
+    jointures limitées aux utilisateurs dont un nom est demandé. Les listes
+    projetées (ProjectionListMixin) ne lisent que ces colonnes dans values().
+    """
+    fields_query_param = 'fields'
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        # None : représentation complète
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            value = self.request.query_params.get(self.fields_query_param, '')
+            names = list(dict.fromkeys(
+                name.strip() for name in value.split(',') if name.strip()))
+            if names and self.action in self.sparse_actions:
+                options = self.get_serializer_class().sparse_field_names()
+                unknown = [name for name in names if name not in options]
+                if unknown:
+                    raise serializers.ValidationError(
+                        {self.fields_query_param: [
+                            f'Valeur non valide : {", ".join(unknown)}. '
+                            f'Choisissez parmi les options suivantes : '
+                            f'{", ".join(options)}']})
+                self._sparse_fields = names
+        return self._sparse_fields
+
+    def get_loaded_relations(self):
+        # Relations chargées en entier par la vue, à conserver (IncludeMixin)
+        return ()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            context['fields'] = fields
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = self.get_sparse_fields()
+        serializer_class = self.get_serializer_class()
+        if fields is None or issubclass(serializer_class,
+                                        ProjectionSerializer):
+            return queryset
+        loaded = list(self.get_loaded_relations())
+        columns = [column for column in serializer_class.get_columns(fields)
+                   if column.split('__')[0] not in loaded]
+        joined = [column.split('__')[0] for column in columns
+                  if '__' in column]
+        # select_related() sans argument suivrait toutes les relations
+        queryset = queryset.select_related(None)
+        if joined or loaded:
+            queryset = queryset.select_related(
+                *dict.fromkeys(joined + loaded))
+        return queryset.only('id', *dict.fromkeys(columns + loaded))
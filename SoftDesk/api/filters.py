@@ -0,0 +1,123 @@
+from datetime import datetime, time
+
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from api.models import Issue
+
+
+class IssueFilterBackend(BaseFilterBackend):
+    """
+    Filtres de la liste des problèmes, chacun servi par un index composite
+    (project_id, <champ>, created_time, id) :
+      ?status=AF,EC  ?priority=EL  ?tag=BG  ?assigned=3
+      ?created_after=2023-04-01  ?created_before=2023-04-30T18:00
+    Les valeurs multiples sont séparées par des virgules.
+    """
+    choice_fields = {'status': Issue.STATUS,
+                     'priority': Issue.PRIORITIES,
+                     'tag': Issue.TAGS}
+
+    def filter_queryset(self, request, queryset, view):
+        if getattr(view, 'action', None) != 'list':
+            return queryset
+        params = request.query_params
+        errors = {}
+
+        for field, choices in self.choice_fields.items():
+            if field not in params:
+                continue
+            values = params[field].split(',')
+            if not set(values) <= set(dict(choices)):
+                errors[field] = [
+                    'Valeur non valide. Choisissez parmi les options '
+                    'suivantes : ' + str(dict(choices))]
+                continue
+            queryset = queryset.filter(**{f'{field}__in': values})
+
+        if 'assigned' in params:
+            try:
+                queryset = queryset.filter(assigned__in=[
+                    int(value) for value in params['assigned'].split(',')])
+            except ValueError:
+                errors['assigned'] = ['Identifiant utilisateur non valide.']
+
+        for param, lookup, end_of_day in (
+                ('created_after', 'created_time__gte', False),
+                ('created_before', 'created_time__lte', True)):
+            if param not in params:
+                continue
+            value = self.parse_time(params[param], end_of_day)
+            if value is None:
+                errors[param] = ['Date non valide. Utilisez le format '
+                                 'AAAA-MM-JJ ou AAAA-MM-JJTHH:MM.']
+                continue
+            queryset = queryset.filter(**{lookup: value})
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return queryset
+
+    @staticmethod
+    def parse_time(value, end_of_day):
+        # Une date seule couvre toute la journée (heure locale).
+        try:
+            day = parse_date(value)
+            if day is not None:
+                moment = datetime.combine(day, time.max if end_of_day
+                                          else time.min)
+            else:
+                moment = parse_datetime(value)
+        except ValueError:
+            return None
+        if moment is None:
+            return None
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
+
+
+class FacetsMixin:
+    """
+    Avec ?facets=true, ajoute à la liste un bloc `facets` donnant le nombre
+    de problèmes par statut, priorité et balise pour les filtres courants.
+    Tous les compteurs sont calculés par une seule requête d'agrégation.
+    """
+    facet_fields = IssueFilterBackend.choice_fields
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if self.wants_facets(request) and response.status_code == 200:
+            response.data['facets'] = self.get_facets(request)
+        return response
+
+    def wants_facets(self, request):
+        return request.query_params.get('facets') in ('true', '1', 'yes')
+
+    def get_facets(self, request):
+        queryset, aggregates = self.get_facets_query(request)
+        return self.format_facets(queryset.aggregate(**aggregates))
+
+    def get_facets_query(self, request):
+        # (QuerySet, agrégats) : la requête est exécutée par l'appelant,
+        # éventuellement avec aaggregate() (api.async_views)
+        queryset = self.get_queryset()
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self)
+        aggregates = {
+            f'{field}__{code}': Count('id', filter=Q(**{field: code}))
+            for field, choices in self.facet_fields.items()
+            for code, _ in choices
+        }
+        return queryset.order_by(), aggregates
+
+    def format_facets(self, counts):
+        return {
+            field: [{'value': code, 'label': label,
+                     'count': counts[f'{field}__{code}']}
+                    for code, label in choices]
+            for field, choices in self.facet_fields.items()
+        }
@@ -0,0 +1,86 @@
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+POOL_FULL_MESSAGE = "Trop d'inscriptions en cours, réessayez plus tard."
+
+
+class PoolFull(Exception):
+    # Plus de place dans la file : `retry_after` estime en secondes le délai
+    # avant qu'une place se libère.
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class HashingPool:
+    """
+    Exécute le hachage des mots de passe (PBKDF2, plusieurs centaines de
+    millisecondes) dans un nombre borné de threads, avec une file d'attente
+    bornée elle aussi. Le hachage libère le GIL : les autres requêtes du
+    processus continuent d'être servies pendant ce temps. Au-delà de
+    workers + queue_size hachages en cours, submit() lève PoolFull au lieu
+    d'attendre.
+    """
+
+    def __init__(self, workers=2, queue_size=16):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Moyenne glissante de la durée d'un hachage, pour Retry-After
+        self._duration = 0.3
+
+    def submit(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PoolFull(self.retry_after())
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(self._timed, function, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _timed(self, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self._duration = 0.8 * self._duration + 0.2 * duration
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def retry_after(self):
+        # Temps nécessaire pour écouler la file actuelle
+        with self._lock:
+            pending, duration = self._pending, self._duration
+        return max(1, math.ceil(pending / self.workers * duration))
+
+
+pool = HashingPool(
+    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2),
+    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 16))
+
+
+def make_password(password):
+    # Vues synchrones (WSGI) : le thread de la requête attend le résultat,
+    # mais le nombre de hachages simultanés reste borné.
+    return pool.submit(hashers.make_password, password).result()
+
+
+async def amake_password(password):
+    # Vues asynchrones (ASGI) : la boucle d'événements reste libre.
+    return await asyncio.wrap_future(
+        pool.submit(hashers.make_password, password))
@@ -0,0 +1,72 @@
+from django.db.models import prefetch_related_objects
+from rest_framework import serializers
+from rest_framework.response import Response
+
+
+class IncludeMixin:
+    """
+    Ressources liées intégrées à la vue de détail : ?include=a,b ajoute à
+    l'objet les données renvoyées par les méthodes include_<nom> de la vue,
+    en évitant les allers-retours vers les vues de liste.
+
+    Les jointures (include_select_related) sont ajoutées à la requête de
+    l'objet et les préchargements (include_prefetch_related) exécutés en une
+    requête par relation : le nombre de requêtes ne dépend pas du nombre
+    d'objets liés.
+    """
+    include_query_param = 'include'
+    include_options = ()
+    include_select_related = {}
+    include_prefetch_related = {}
+
+    def get_includes(self):
+        if not hasattr(self, '_includes'):
+            value = self.request.query_params.get(self.include_query_param,
+                                                  '')
+            names = list(dict.fromkeys(
+                name.strip() for name in value.split(',') if name.strip()))
+            unknown = [name for name in names
+                       if name not in self.include_options]
+            if unknown:
+                raise serializers.ValidationError(
+                    {self.include_query_param: [
+                        f'Valeur non valide : {", ".join(unknown)}. '
+                        f'Choisissez parmi les options suivantes : '
+                        f'{", ".join(self.include_options)}']})
+            self._includes = names
+        return self._includes
+
+    def get_loaded_relations(self):
+        # Relations jointes pour les ressources intégrées : chargées en
+        # entier, même avec ?fields= (SparseFieldsetMixin)
+        if self.action != 'retrieve':
+            return ()
+        return tuple(dict.fromkeys(
+            field for name in self.get_includes()
+            for field in self.include_select_related.get(name, ())))
+
+    def filter_queryset(self, queryset):
+        # get_queryset est redéfini par les vues : les jointures sont
+        # ajoutées ici, juste avant la lecture de l'objet par get_object.
+        queryset = super().filter_queryset(queryset)
+        related = self.get_loaded_relations()
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.get_includes():
+            return super().retrieve(request, *args, **kwargs)
+        instance = self.get_object()
+        data = self.get_serializer(instance).data
+        self.add_includes(instance, data)
+        return Response(data)
+
+    def add_includes(self, instance, data):
+        # Préchargements puis ressources demandées, ajoutées à `data`
+        includes = self.get_includes()
+        prefetch_related_objects([instance], *[
+            lookup for name in includes
+            for lookup in self.include_prefetch_related.get(name, ())])
+        for name in includes:
+            getattr(self, f'include_{name}')(instance, data)
@@ -0,0 +1,133 @@
+import asyncio
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from api import caching
+from api.authentication import StampedTokenObtainPairSerializer
+from api.models import Contributor, Issue
+
+# Lectures comparées : (nom, chemin synchrone) ; la variante asynchrone est
+# servie sous /api/async/ avec le même suffixe.
+ROUTES = {
+    'projects': 'projects/',
+    'issues': 'projects/{project}/issues/',
+    'comments': 'projects/{project}/issues/{issue}/comments/',
+}
+
+
+async def call(application, path, query_string, headers):
+    # Une requête HTTP GET passée directement à l'application ASGI, sans
+    # réseau : seul le coût du traitement par Django est mesuré.
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path':
+        path.encode(), 'query_string': query_string, 'root_path': '',
+        'headers': headers, 'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+class Command(BaseCommand):
+    help = "Compare le débit des lectures synchrones (/api/) et asynchrones " \
+           "(/api/async/) sous ASGI, avec de nombreux clients simultanés."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username',
+                            help='Utilisateur au nom duquel lire')
+        parser.add_argument('--route', choices=sorted(ROUTES),
+                            default='issues')
+        parser.add_argument('--clients', type=int, default=1000,
+                            help='Clients simultanés (1000 par défaut)')
+        parser.add_argument('--requests', type=int, default=5,
+                            help='Requêtes successives par client')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Taille de page demandée')
+        parser.add_argument('--keep-cache', action='store_true',
+                            help='Ne pas vider le cache de réponses entre '
+                                 'deux requêtes')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"Utilisateur {options['username']} "
+                               f"introuvable")
+        contribution = Contributor.objects.filter(user_id=user).order_by(
+            'project_id').values_list('project_id', flat=True).first()
+        if contribution is None and options['route'] != 'projects':
+            raise CommandError("L'utilisateur ne contribue à aucun projet")
+        issue = Issue.objects.filter(project_id=contribution).values_list(
+            'id', flat=True).first()
+        suffix = ROUTES[options['route']].format(project=contribution,
+                                                 issue=issue)
+        token = StampedTokenObtainPairSerializer.get_token(user).access_token
+        headers = [(b'host', b'localhost'),
+                   (b'authorization', f'Bearer {token}'.encode())]
+        query_string = f"limit={options['limit']}".encode()
+
+        results = {}
+        for name, prefix in (('sync', '/api/'), ('async', '/api/async/')):
+            results[name] = asyncio.run(self.run(
+                prefix + suffix, query_string, headers, options['clients'],
+                options['requests'], options['keep_cache']))
+            self.report(name, prefix + suffix, results[name])
+        if results['sync']['throughput']:
+            ratio = results['async']['throughput'] / \
+                results['sync']['throughput']
+            self.stdout.write(f'async / sync : {ratio:.2f}x')
+
+    async def run(self, path, query_string, headers, clients, requests,
+                  keep_cache):
+        application = ASGIHandler()
+        latencies, errors = [], 0
+
+        # Chaque client garde sa « connexion » et enchaîne ses requêtes,
+        # comme un client HTTP keep-alive.
+        async def client():
+            nonlocal errors
+            for _ in range(requests):
+                # Comme benchmark : chaque lecture est calculée, et non
+                # servie par le cache de réponses (api.caching).
+                if not keep_cache:
+                    caching.get_cache().clear()
+                start = time.perf_counter()
+                status = await call(application, path, query_string, headers)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+
+        # Échauffement : caches et connexion à la base
+        await call(application, path, query_string, headers)
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        quantiles = statistics.quantiles(latencies, n=100) \
+            if len(latencies) > 1 else latencies * 99
+        return {'requests': len(latencies), 'errors': errors,
+                'elapsed': elapsed,
+                'throughput': len(latencies) / elapsed if elapsed else 0,
+                'p50': quantiles[49], 'p99': quantiles[98]}
+
+    def report(self, name, path, result):
+        self.stdout.write(
+            f"{name:5} {path} : {result['requests']} requêtes en "
+            f"{result['elapsed']:.2f} s, {result['throughput']:.0f} req/s, "
+            f"p50 {result['p50'] * 1000:.1f} ms, "
+            f"p99 {result['p99'] * 1000:.1f} ms, "
+            f"{result['errors']} erreur(s)")
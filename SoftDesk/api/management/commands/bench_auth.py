@@ -0,0 +1,60 @@
+import base64
+import time
+
+from django.contrib.auth import authenticate
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import BasicAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import authentication
+from api.authentication import CachedBasicAuthentication, \
+    StampedTokenObtainPairSerializer, StatelessJWTAuthentication
+
+
+class Command(BaseCommand):
+    help = "Mesure le coût par requête de l'authentification Basic et JWT, " \
+           "avant (classes de DRF / simplejwt) et après (api.authentication)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('password')
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        user = authenticate(username=options['username'],
+                            password=options['password'])
+        if user is None:
+            raise CommandError('Identifiants invalides')
+        authentication.clear()
+
+        credentials = base64.b64encode(
+            f"{options['username']}:{options['password']}".encode()).decode()
+        basic = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+        legacy_token = AccessToken.for_user(user)
+        token = StampedTokenObtainPairSerializer.get_token(user).access_token
+        for name, backend, request in (
+                ('basic (DRF)', BasicAuthentication(), basic),
+                ('basic (cache)', CachedBasicAuthentication(), basic),
+                ('jwt (simplejwt)', JWTAuthentication(), RequestFactory().get(
+                    '/', HTTP_AUTHORIZATION=f'Bearer {legacy_token}')),
+                ('jwt (claims)', StatelessJWTAuthentication(),
+                 RequestFactory().get(
+                     '/', HTTP_AUTHORIZATION=f'Bearer {token}'))):
+            self.measure(name, backend, request, options['iterations'])
+
+    def measure(self, name, backend, request, iterations):
+        backend.authenticate(request)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(iterations):
+                backend.authenticate(request)
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{name:16} {elapsed / iterations * 1e6:10.0f} µs/requête  "
+            f"{len(queries.captured_queries) / iterations:.1f} requête(s) "
+            f"SQL")
@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = "Compare le débit d'une charge mixte lectures / écritures " \
+           "concurrentes sur SQLite entre la configuration d'origine " \
+           "(legacy) et le profil de production (WAL, connexions " \
+           "persistantes, transactions IMMEDIATE)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Durée de chaque mesure, en secondes')
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+        parser.add_argument('--profile', action='append',
+                            choices=sorted(benchmark.SQLITE_PROFILES),
+                            help='Profil à mesurer (tous par défaut)')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'concurrency.sqlite3')
+            for profile in options['profile'] or ['legacy', 'production']:
+                result = benchmark.concurrency(
+                    path, profile=profile, threads=options['threads'],
+                    duration=options['duration'],
+                    write_ratio=options['write_ratio'])
+                results.append(result)
+                if not options['json']:
+                    self.stdout.write(
+                        f"{profile:12} {result['journal_mode']:8} "
+                        f"{result['throughput_ops']:9.1f} op/s  "
+                        f"dont {result['write_throughput_ops']:8.1f} "
+                        f"écritures/s  {result['errors']} erreur(s) de "
+                        f"verrouillage")
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
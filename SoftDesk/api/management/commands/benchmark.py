@@ -0,0 +1,104 @@
+import json
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, \
+    teardown_test_environment
+from django.utils import timezone
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = "Génère un jeu de données dans une base de test puis mesure " \
+           "chaque route du DefaultRouter (p50/p95/p99, requêtes SQL, débit). " \
+           "Le résultat JSON peut être comparé à celui d'un run précédent."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--projects', type=int, default=1000)
+        parser.add_argument('--contributors', type=int, default=3,
+                            help='Contributeurs par projet')
+        parser.add_argument('--issues', type=int, default=10,
+                            help='Problèmes par projet')
+        parser.add_argument('--comments', type=int, default=10,
+                            help='Commentaires par problème')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requêtes mesurées par route')
+        parser.add_argument('--keep-cache', action='store_true',
+                            help='Ne pas vider le cache de réponses entre '
+                                 'deux requêtes')
+        parser.add_argument('--no-writes', action='store_true',
+                            help='Ne mesurer que les lectures')
+        parser.add_argument('--database-file',
+                            help='Base de test SQLite sur disque, conservée '
+                                 'et réutilisée si elle existe déjà')
+        parser.add_argument('--output', help='Fichier JSON de résultats')
+        parser.add_argument('--compare',
+                            help='Résultats JSON d\'un run précédent')
+
+    def handle(self, *args, **options):
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as file:
+                    previous = json.load(file)['routes']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Résultats illisibles : {exc}")
+
+        from SoftDesk.urls import router
+
+        keepdb = bool(options['database_file'])
+        if keepdb:
+            connection.settings_dict['TEST']['NAME'] = \
+                options['database_file']
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=keepdb)
+        try:
+            user = benchmark.seed_once(
+                users=options['users'], projects=options['projects'],
+                contributors=options['contributors'],
+                issues=options['issues'], comments=options['comments'],
+                stdout=self.stderr)
+            routes = benchmark.run(
+                router, user, requests=options['requests'],
+                keep_cache=options['keep_cache'],
+                writes=not options['no_writes'], stdout=self.stderr)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0,
+                                                keepdb=keepdb)
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'commit': self.git_commit(),
+                'python': sys.version.split()[0],
+                'volumes': {key: options[key] for key in (
+                    'users', 'projects', 'contributors', 'issues',
+                    'comments')},
+                'requests': options['requests'],
+                'keep_cache': options['keep_cache'],
+            },
+            'routes': routes,
+        }
+        if previous is not None:
+            report['comparison'] = benchmark.compare(previous, routes)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
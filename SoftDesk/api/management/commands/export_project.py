@@ -0,0 +1,51 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import export
+from api.models import Project
+
+
+class Command(BaseCommand):
+    help = "Exporte les problèmes d'un projet (NDJSON ou CSV) et mesure le " \
+           "débit en lignes par seconde."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_id', type=int)
+        parser.add_argument('--output', choices=sorted(export.CONTENT_TYPES),
+                            default='ndjson')
+        parser.add_argument('--comments', action='store_true',
+                            help='Inclure les commentaires des problèmes')
+        parser.add_argument('--file',
+                            help='Fichier de destination (sortie standard '
+                                 'par défaut, /dev/null pour mesurer)')
+
+    def handle(self, *args, **options):
+        if not Project.objects.filter(pk=options['project_id']).exists():
+            raise CommandError(f"Projet {options['project_id']} introuvable")
+
+        stream = open(options['file'], 'wb') if options['file'] \
+            else sys.stdout.buffer
+        rows = 0
+        start = time.perf_counter()
+        first_byte = None
+        try:
+            for chunk in export.export_project(options['project_id'],
+                                               options['output'],
+                                               options['comments']):
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                rows += chunk.count(b'\n')
+                stream.write(chunk)
+        finally:
+            if options['file']:
+                stream.close()
+        elapsed = time.perf_counter() - start
+        if options['output'] == 'csv':
+            rows -= 1
+        # Les statistiques vont sur stderr pour ne pas polluer l'export.
+        self.stderr.write(
+            f"{rows} lignes en {elapsed:.2f} s "
+            f"({rows / elapsed if elapsed else 0:.0f} lignes/s, premier "
+            f"bloc après {(first_byte or 0) * 1000:.1f} ms)")
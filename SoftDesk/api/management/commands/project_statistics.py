@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import Project, ProjectStatistics
+
+
+class Command(BaseCommand):
+    help = "Vérifie (par défaut) ou reconstruit les compteurs des projets " \
+           "à partir des tables des problèmes et des commentaires."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int,
+                            help='Projets à traiter (tous par défaut)')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Réécrire les compteurs au lieu de '
+                                 'seulement les comparer')
+
+    def handle(self, *args, **options):
+        project_ids = options['project_ids'] or list(
+            Project.objects.order_by('id').values_list('id', flat=True))
+        missing = set(project_ids) - set(Project.objects.filter(
+            pk__in=project_ids).values_list('id', flat=True))
+        if missing:
+            raise CommandError(
+                f"Projet(s) introuvable(s) : "
+                f"{', '.join(map(str, sorted(missing)))}")
+
+        stored = ProjectStatistics.objects.in_bulk(project_ids)
+        mismatches = 0
+        for project_id in project_ids:
+            with transaction.atomic():
+                expected = ProjectStatistics.compute(project_id)
+                current = stored.get(project_id)
+                found = current.counters() if current else {}
+                differences = {
+                    column: (found.get(column), count)
+                    for column, count in expected.items()
+                    if found.get(column) != count
+                }
+                if not differences:
+                    continue
+                mismatches += 1
+                details = ', '.join(
+                    f'{column} {old} -> {new}'
+                    for column, (old, new) in sorted(differences.items()))
+                self.stdout.write(f'Projet {project_id} : {details}')
+                if options['rebuild']:
+                    ProjectStatistics.rebuild(project_id)
+
+        if options['rebuild']:
+            self.stdout.write(self.style.SUCCESS(
+                f'{mismatches} projet(s) corrigé(s) sur {len(project_ids)}'))
+        elif mismatches:
+            raise CommandError(
+                f'{mismatches} projet(s) incohérent(s) sur '
+                f'{len(project_ids)}, relancer avec --rebuild')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(project_ids)} projet(s) cohérent(s)'))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api import sync
+from api.models import ChangeLog
+
+
+class Command(BaseCommand):
+    help = "Purge le journal de synchronisation des entrées plus anciennes " \
+           "que SYNC_TOKEN_MAX_AGE, par lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Entrées supprimées par transaction')
+
+    def handle(self, *args, **options):
+        limit = timezone.now() - timedelta(seconds=sync.get_max_age())
+        expired = ChangeLog.objects.filter(created_time__lt=limit)
+        total = 0
+        while True:
+            with transaction.atomic():
+                ids = list(expired.values_list('pk', flat=True)[
+                    :options['batch_size']])
+                if not ids:
+                    break
+                deleted, _ = ChangeLog.objects.filter(pk__in=ids).delete()
+            total += deleted
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} entrée(s) du journal supprimée(s)'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api import deletion
+from api.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = "Termine les suppressions en attente ou interrompues (arrêt du " \
+           "processus pendant la purge, depuis plus de DELETION_LEASE " \
+           "secondes), dans le processus courant."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Relancer aussi les suppressions en échec')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            deletion.retry_failed(DeletionJob.objects.all())
+        count = deletion.run_pending()
+        failed = DeletionJob.objects.filter(
+            status=DeletionJob.FAILED, retry_time__isnull=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} suppression(s) traitée(s)'))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'{failed} suppression(s) en échec, relancer avec '
+                f'--retry-failed'))
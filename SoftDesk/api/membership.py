@@ -0,0 +1,133 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from api.models import Contributor
+
+# Rôles par couple (utilisateur, projet), conservés dans le cache
+# MEMBERSHIP_CACHE, partagé par tous les processus : une invalidation faite
+# par l'un vaut pour tous. Une absence de contribution est aussi mémorisée
+# (NO_ROLE) afin que les refus répétés ne touchent pas la base. La taille du
+# cache est bornée par son backend (MAX_ENTRIES, éviction).
+ROLE_KEY = 'api:role:{project}:{generation}:{user}'
+# Génération des rôles d'un projet : en changer rend toutes les entrées du
+# projet inaccessibles (invalidate_project).
+GENERATION_KEY = 'api:role-generation:{project}'
+NO_ROLE = ''
+
+_MISSING = object()
+
+
+def get_cache():
+    return caches[getattr(settings, 'MEMBERSHIP_CACHE', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'MEMBERSHIP_CACHE_TIMEOUT', 60)
+
+
+def _project_key(project_id):
+    # Les identifiants issus de l'URL sont des chaînes : on les normalise
+    # pour que '3' et 3 désignent la même entrée.
+    try:
+        return int(project_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _generation(project_key, create=True):
+    key = GENERATION_KEY.format(project=project_key)
+    cache = get_cache()
+    generation = cache.get(key)
+    if generation is None and create:
+        # Génération inédite : une génération évincée puis recréée ne doit
+        # pas rendre accessibles les entrées qui la portaient.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def _role_key(key):
+    user_id, project_key = key
+    return ROLE_KEY.format(project=project_key, user=user_id,
+                           generation=_generation(project_key))
+
+
+def _lookup(request, project_id):
+    # Renvoie (clé, rôle) d'après le mémo de la requête ; le rôle vaut
+    # _MISSING s'il reste à lire, et la clé None si la requête ne peut
+    # correspondre à aucune contribution.
+    user_id = request.user.pk
+    project_key = _project_key(project_id)
+    if user_id is None or project_key is None:
+        return None, None
+    per_request = request.__dict__.setdefault('_membership_roles', {})
+    return (user_id, project_key), per_request.get(project_key, _MISSING)
+
+
+def _load(key):
+    cache = get_cache()
+    role_key = _role_key(key)
+    role = cache.get(role_key, _MISSING)
+    if role is _MISSING:
+        role = _query(key).first()
+        cache.set(role_key, NO_ROLE if role is None else role, get_timeout())
+    return role or None
+
+
+def _remember(request, key, role):
+    request.__dict__['_membership_roles'][key[1]] = role
+
+
+def _query(key):
+    # Un projet en attente de suppression n'a plus de contributeurs. Le rôle
+    # est lu dans la base principale, même pendant une lecture servie par un
+    # réplica (api.routing) : un réplica en retard rendrait à un contributeur
+    # retiré son rôle, conservé ensuite dans le cache partagé.
+    user_id, project_key = key
+    return Contributor.objects.using(DEFAULT_DB_ALIAS).filter(
+        user_id=user_id, project_id=project_key,
+        project_id__deleted_time__isnull=True).values_list('role', flat=True)
+
+
+def get_role(request, project_id):
+    """
+    Renvoie le rôle de l'utilisateur de la requête dans le projet
+    (Contributor.CREATOR, Contributor.CONTRIBUTOR) ou None s'il n'y
+    contribue pas. Le résultat est calculé une seule fois par requête.
+    """
+    key, role = _lookup(request, project_id)
+    if role is _MISSING:
+        role = _load(key)
+        _remember(request, key, role)
+    return role
+
+
+async def aget_role(request, project_id):
+    # Variante asynchrone de get_role, partageant les mêmes caches.
+    key, role = _lookup(request, project_id)
+    if role is _MISSING:
+        role = await sync_to_async(_load)(key)
+        _remember(request, key, role)
+    return role
+
+
+def invalidate(user_id, project_id):
+    project_key = _project_key(project_id)
+    generation = _generation(project_key, create=False)
+    if generation is not None:
+        get_cache().delete(ROLE_KEY.format(
+            project=project_key, user=user_id, generation=generation))
+
+
+def invalidate_project(project_id):
+    get_cache().delete(GENERATION_KEY.format(
+        project=_project_key(project_id)))
+
+
+def clear():
+    # Tests et mesures : vide tout le cache MEMBERSHIP_CACHE
+    get_cache().clear()
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+def remove_duplicate_contributors(apps, schema_editor):
+    # Conserve une seule ligne par couple (user_id, project_id), en
+    # privilégiant le rôle de créateur, avant d'ajouter la contrainte unique.
+    Contributor = apps.get_model('api', 'Contributor')
+    seen = set()
+    db = schema_editor.connection.alias
+    for contributor in Contributor.objects.using(db).order_by(
+            'user_id', 'project_id', '-role', 'id'):
+        key = (contributor.user_id_id, contributor.project_id_id)
+        if key in seen:
+            contributor.delete()
+        else:
+            seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('api', '0003_issue_assigned_alter_issue_author_user_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_contributors,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['issue_id', 'created_time', 'id'], name='comment_issue_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='issue',
+            index=models.Index(fields=['project_id', 'created_time', 'id'], name='issue_project_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='contributor',
+            constraint=models.UniqueConstraint(fields=('user_id', 'project_id'), name='unique_contributor_user_project'),
+        ),
+        # auth_user.email n'est pas indexé par Django alors qu'il est
+        # recherché à chaque inscription.
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS api_auth_user_email_idx '
+            'ON auth_user (email)',
+            'DROP INDEX IF EXISTS api_auth_user_email_idx',
+        ),
+    ]
@@ -0,0 +1,123 @@
+from django.db import migrations
+
+# Index plein texte SQLite FTS5 des problèmes et commentaires, tenu à jour
+# par des déclencheurs. Le rowid de l'index est dérivé de l'identifiant :
+# 2 * id pour un problème, 2 * id + 1 pour un commentaire, ce qui permet de
+# retrouver une entrée sans parcourir l'index.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE api_search_index USING fts5(
+        title, body,
+        kind UNINDEXED, object_id UNINDEXED, issue_id UNINDEXED,
+        project_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER api_search_issue_insert AFTER INSERT ON api_issue BEGIN
+        INSERT INTO api_search_index (rowid, title, body, kind,
+                                      object_id, issue_id, project_id)
+        VALUES (2 * new.id, new.title, new.description, 'issue', new.id,
+                new.id, new.project_id_id);
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_issue_update
+    AFTER UPDATE OF title, description, project_id_id ON api_issue BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id;
+        INSERT INTO api_search_index (rowid, title, body, kind,
+                                      object_id, issue_id, project_id)
+        VALUES (2 * new.id, new.title, new.description, 'issue', new.id,
+                new.id, new.project_id_id);
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_issue_delete AFTER DELETE ON api_issue BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_comment_insert AFTER INSERT ON api_comment
+    BEGIN
+        INSERT INTO api_search_index (rowid, title, body, kind,
+                                      object_id, issue_id, project_id)
+        SELECT 2 * new.id + 1, '', new.description, 'comment', new.id,
+               new.issue_id_id, api_issue.project_id_id
+        FROM api_issue WHERE api_issue.id = new.issue_id_id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_comment_update
+    AFTER UPDATE OF description, issue_id_id ON api_comment BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id + 1;
+        INSERT INTO api_search_index (rowid, title, body, kind,
+                                      object_id, issue_id, project_id)
+        SELECT 2 * new.id + 1, '', new.description, 'comment', new.id,
+               new.issue_id_id, api_issue.project_id_id
+        FROM api_issue WHERE api_issue.id = new.issue_id_id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_comment_delete AFTER DELETE ON api_comment
+    BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id + 1;
+    END
+    """,
+    """
+    INSERT INTO api_search_index (rowid, title, body, kind,
+                                  object_id, issue_id, project_id)
+    SELECT 2 * id, title, description, 'issue', id, id, project_id_id
+    FROM api_issue
+    """,
+    """
+    INSERT INTO api_search_index (rowid, title, body, kind,
+                                  object_id, issue_id, project_id)
+    SELECT 2 * api_comment.id + 1, '', api_comment.description, 'comment',
+           api_comment.id, api_comment.issue_id_id, api_issue.project_id_id
+    FROM api_comment JOIN api_issue ON api_issue.id = api_comment.issue_id_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS api_search_comment_delete',
+    'DROP TRIGGER IF EXISTS api_search_comment_update',
+    'DROP TRIGGER IF EXISTS api_search_comment_insert',
+    'DROP TRIGGER IF EXISTS api_search_issue_delete',
+    'DROP TRIGGER IF EXISTS api_search_issue_update',
+    'DROP TRIGGER IF EXISTS api_search_issue_insert',
+    'DROP TABLE IF EXISTS api_search_index',
+]
+
+
+def fts5_available(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    # Sur les autres bases, api.search se rabat sur une recherche SQL simple.
+    if not fts5_available(schema_editor):
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_project_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
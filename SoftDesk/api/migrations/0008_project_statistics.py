@@ -0,0 +1,64 @@
+# Generated by Django 4.1.7 on 2026-10-18 16:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+COUNTED_FIELDS = {
+    'status': ('AF', 'EC', 'TR'),
+    'priority': ('FA', 'MO', 'EL'),
+    'tag': ('BG', 'AM', 'TA'),
+}
+
+
+def fill_statistics(apps, schema_editor):
+    # Calcule les compteurs de chaque projet existant en deux agrégats
+    # groupés par projet.
+    Project = apps.get_model('api', 'Project')
+    Issue = apps.get_model('api', 'Issue')
+    Comment = apps.get_model('api', 'Comment')
+    ProjectStatistics = apps.get_model('api', 'ProjectStatistics')
+    db = schema_editor.connection.alias
+    aggregates = {'issues': models.Count('id')}
+    for field, codes in COUNTED_FIELDS.items():
+        for code in codes:
+            aggregates[f'{field}_{code.lower()}'] = models.Count(
+                'id', filter=models.Q(**{field: code}))
+    issues = {row.pop('project_id'): row for row in Issue.objects.using(
+        db).filter(project_id__isnull=False).values(
+        'project_id').order_by().annotate(**aggregates)}
+    comments = dict(Comment.objects.using(db).filter(
+        issue_id__project_id__isnull=False).values_list(
+        'issue_id__project_id').order_by().annotate(models.Count('id')))
+    ProjectStatistics.objects.using(db).bulk_create([
+        ProjectStatistics(project_id_id=pk, comments=comments.get(pk, 0),
+                          **issues.get(pk, {}))
+        for pk in Project.objects.using(db).values_list('id', flat=True)
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_issue_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStatistics',
+            fields=[
+                ('project_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', serialize=False, to='api.project')),
+                ('issues', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+                ('status_af', models.PositiveIntegerField(default=0)),
+                ('status_ec', models.PositiveIntegerField(default=0)),
+                ('status_tr', models.PositiveIntegerField(default=0)),
+                ('priority_fa', models.PositiveIntegerField(default=0)),
+                ('priority_mo', models.PositiveIntegerField(default=0)),
+                ('priority_el', models.PositiveIntegerField(default=0)),
+                ('tag_bg', models.PositiveIntegerField(default=0)),
+                ('tag_am', models.PositiveIntegerField(default=0)),
+                ('tag_ta', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('IS', 'Probléme'), ('CO', 'Commentaire'), ('CT', 'Contributeur')], max_length=2)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('created_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('project_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='api.project')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelog',
+            index=models.Index(fields=['project_id', 'id'], name='changelog_project_idx'),
+        ),
+    ]
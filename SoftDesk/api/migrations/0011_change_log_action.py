@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changelog',
+            name='action',
+            field=models.CharField(choices=[('C', 'Création'), ('U', 'Modification'), ('D', 'Suppression')], default='U', max_length=1),
+        ),
+    ]
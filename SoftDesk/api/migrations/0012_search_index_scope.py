@@ -0,0 +1,132 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# L'index plein texte reçoit une colonne indexée `scope` : l'identifiant du
+# projet, sous forme de terme. Le filtre sur les projets de l'utilisateur
+# fait alors partie de la requête MATCH et FTS5 croise les listes de
+# documents au lieu de relire le projet de chaque correspondance. Les
+# entrées d'un problème masqué (deleted_time) sont retirées par déclencheur,
+# ce qui évite de filtrer les problèmes supprimés à chaque recherche.
+# Les index de préfixes (2 à 4 caractères) servent la recherche en cours de
+# frappe sans fusionner les listes de tous les termes du préfixe.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE api_search_index USING fts5(
+        title, body, scope,
+        kind UNINDEXED, object_id UNINDEXED, issue_id UNINDEXED,
+        project_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER api_search_issue_insert AFTER INSERT ON api_issue
+    WHEN new.deleted_time IS NULL BEGIN
+        INSERT INTO api_search_index (rowid, title, body, scope, kind,
+                                      object_id, issue_id, project_id)
+        VALUES (2 * new.id, new.title, new.description, new.project_id_id,
+                'issue', new.id, new.id, new.project_id_id);
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_issue_update
+    AFTER UPDATE OF title, description, project_id_id ON api_issue
+    WHEN new.deleted_time IS NULL BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id;
+        INSERT INTO api_search_index (rowid, title, body, scope, kind,
+                                      object_id, issue_id, project_id)
+        VALUES (2 * new.id, new.title, new.description, new.project_id_id,
+                'issue', new.id, new.id, new.project_id_id);
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_issue_hide
+    AFTER UPDATE OF deleted_time ON api_issue
+    WHEN new.deleted_time IS NOT NULL BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * new.id;
+        DELETE FROM api_search_index WHERE rowid IN (
+            SELECT 2 * id + 1 FROM api_comment WHERE issue_id_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_issue_delete AFTER DELETE ON api_issue BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_comment_insert AFTER INSERT ON api_comment
+    BEGIN
+        INSERT INTO api_search_index (rowid, title, body, scope, kind,
+                                      object_id, issue_id, project_id)
+        SELECT 2 * new.id + 1, '', new.description, api_issue.project_id_id,
+               'comment', new.id, new.issue_id_id, api_issue.project_id_id
+        FROM api_issue
+        WHERE api_issue.id = new.issue_id_id
+          AND api_issue.deleted_time IS NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_comment_update
+    AFTER UPDATE OF description, issue_id_id ON api_comment BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id + 1;
+        INSERT INTO api_search_index (rowid, title, body, scope, kind,
+                                      object_id, issue_id, project_id)
+        SELECT 2 * new.id + 1, '', new.description, api_issue.project_id_id,
+               'comment', new.id, new.issue_id_id, api_issue.project_id_id
+        FROM api_issue
+        WHERE api_issue.id = new.issue_id_id
+          AND api_issue.deleted_time IS NULL;
+    END
+    """,
+    """
+    CREATE TRIGGER api_search_comment_delete AFTER DELETE ON api_comment
+    BEGIN
+        DELETE FROM api_search_index WHERE rowid = 2 * old.id + 1;
+    END
+    """,
+    """
+    INSERT INTO api_search_index (rowid, title, body, scope, kind,
+                                  object_id, issue_id, project_id)
+    SELECT 2 * id, title, description, project_id_id, 'issue', id, id,
+           project_id_id
+    FROM api_issue WHERE deleted_time IS NULL
+    """,
+    """
+    INSERT INTO api_search_index (rowid, title, body, scope, kind,
+                                  object_id, issue_id, project_id)
+    SELECT 2 * api_comment.id + 1, '', api_comment.description,
+           api_issue.project_id_id, 'comment', api_comment.id,
+           api_comment.issue_id_id, api_issue.project_id_id
+    FROM api_comment JOIN api_issue ON api_issue.id = api_comment.issue_id_id
+    WHERE api_issue.deleted_time IS NULL
+    """,
+]
+
+DROP_SQL = ['DROP TRIGGER IF EXISTS api_search_issue_hide']
+
+
+def previous():
+    return import_module('api.migrations.0006_search_index')
+
+
+def rebuild(statements):
+    def operation(apps, schema_editor):
+        initial = previous()
+        if not initial.fts5_available(schema_editor):
+            return
+        for statement in DROP_SQL + initial.DROP_SQL + statements():
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_change_log_action'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild(lambda: CREATE_SQL),
+                             rebuild(lambda: previous().CREATE_SQL)),
+    ]
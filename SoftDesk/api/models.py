@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.dispatch import Signal
+from django.utils import timezone
 
 
 class Contributor(models.Model):
@@ -20,12 +22,35 @@ class Contributor(models.Model):
     role = models.CharField(max_length=2,
                                   choices=ROLES)
 
+    class Meta:
+        # L'index unique sert aussi aux vérifications de permissions, qui
+        # filtrent toujours sur le couple (user_id, project_id).
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'project_id'],
+                                    name='unique_contributor_user_project'),
+        ]
 
     def __str__(self):
-        return f"Projet n° : {self.project_id.id} - " \
+        return f"Projet n° : {self.project_id_id} - " \
                f"Contributeur : {self.user_id.get_full_name()} - " \
                f"Role : {self.get_role_display()}"
 
+    def save(self, *args, **kwargs):
+        action = ChangeLog.CREATED if self._state.adding else \
+            ChangeLog.UPDATED
+        super().save(*args, **kwargs)
+        ChangeLog.record(self.project_id_id, ChangeLog.CONTRIBUTOR, action,
+                         [self.pk])
+        Project.bump_version(pk=self.project_id_id)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        ChangeLog.record(self.project_id_id, ChangeLog.CONTRIBUTOR,
+                         ChangeLog.DELETED, [pk])
+        Project.bump_version(pk=self.project_id_id)
+        return result
+
 class Project(models.Model):
 
     BACK_END = 'BE'
@@ -45,10 +70,33 @@ class Project(models.Model):
     type = models.CharField(max_length=2, choices=TYPES)
     author_user_id = models.ForeignKey(settings.AUTH_USER_MODEL,
                                        on_delete=models.CASCADE)
+    # Marqueur de version : incrémenté à chaque modification du projet, de
+    # ses problèmes, de leurs commentaires ou de ses contributeurs. Sert à
+    # produire les en-têtes ETag / Last-Modified.
+    version = models.PositiveIntegerField(default=1)
+    updated_time = models.DateTimeField(default=timezone.now)
+    # Renseigné par une demande de suppression : le projet est masqué en
+    # attendant que DeletionJob le supprime avec ses problèmes.
+    deleted_time = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return f"Projet n° : {self.id} - Titre : {self.title}"
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self._state.adding:
+            self.version = models.F('version') + 1
+            self.updated_time = timezone.now()
+        super().save(*args, **kwargs)
+        if isinstance(self.version, models.Expression):
+            self.refresh_from_db(fields=['version'])
+
+    @classmethod
+    def bump_version(cls, **filters):
+        # Incrémente la version des projets correspondant aux filtres, en une
+        # seule requête UPDATE sans charger les projets.
+        cls.objects.filter(**filters).update(
+            version=models.F('version') + 1, updated_time=timezone.now())
+
 class Issue(models.Model):
 
     FAIBLE = 'FA'
@@ -97,11 +145,79 @@ class Issue(models.Model):
     assigned = models.ForeignKey(settings.AUTH_USER_MODEL,
                                        on_delete=models.CASCADE,
                                 related_name='assigned_issues')
+    # Problème masqué en attente de suppression (DeletionJob)
+    deleted_time = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'created_time', 'id'],
+                         name='issue_project_created_idx'),
+            # Index des filtres de la liste des problèmes (api.filters)
+            models.Index(fields=['project_id', 'status', 'created_time',
+                                 'id'], name='issue_project_status_idx'),
+            models.Index(fields=['project_id', 'priority', 'created_time',
+                                 'id'], name='issue_project_priority_idx'),
+            models.Index(fields=['project_id', 'tag', 'created_time', 'id'],
+                         name='issue_project_tag_idx'),
+            models.Index(fields=['project_id', 'assigned', 'created_time',
+                                 'id'], name='issue_project_assigned_idx'),
+            # Index partiel : seuls les problèmes en attente de suppression,
+            # exclus des résultats de la recherche plein texte.
+            models.Index(fields=['deleted_time'],
+                         condition=models.Q(deleted_time__isnull=False),
+                         name='issue_deleted_idx'),
+        ]
 
     def __str__(self):
-        return f"Projet n° : {self.project_id.id} - " \
+        return f"Projet n° : {self.project_id_id} - " \
                f"Titre du probléme : {self.title}"
 
+    # Champs comptabilisés dans ProjectStatistics
+    COUNTED_FIELDS = {'status': STATUS, 'priority': PRIORITIES, 'tag': TAGS}
+
+    def counted_values(self):
+        return {field: getattr(self, field, None)
+                for field in self.COUNTED_FIELDS}
+
+    @classmethod
+    def stored_counted_values(cls, pks):
+        # Valeurs comptabilisées enregistrées en base, {pk: {champ: valeur}}.
+        # À lire dans la transaction de l'écriture : celles d'une instance
+        # chargée avant peuvent avoir été modifiées depuis par une autre
+        # requête, et les compteurs décrémentés à tort.
+        return {row.pop('pk'): row for row in cls.objects.filter(
+            pk__in=pks).values('pk', *cls.COUNTED_FIELDS)}
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = self.stored_counted_values([self.pk]).get(self.pk)
+            super().save(*args, **kwargs)
+            ProjectStatistics.apply(
+                self.project_id_id,
+                ProjectStatistics.issue_deltas(previous,
+                                               self.counted_values()))
+            ChangeLog.record(self.project_id_id, ChangeLog.ISSUE,
+                             ChangeLog.CREATED if previous is None else
+                             ChangeLog.UPDATED, [self.pk])
+            Project.bump_version(pk=self.project_id_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pk = self.pk
+            comments = self.issue_comments.count()
+            previous = self.stored_counted_values([pk]).get(pk)
+            result = super().delete(*args, **kwargs)
+            deltas = ProjectStatistics.issue_deltas(previous, None)
+            if comments:
+                deltas['comments'] = -comments
+            ProjectStatistics.apply(self.project_id_id, deltas)
+            ChangeLog.record(self.project_id_id, ChangeLog.ISSUE,
+                             ChangeLog.DELETED, [pk])
+            Project.bump_version(pk=self.project_id_id)
+        return result
+
 class Comment(models.Model):
     description = models.CharField(max_length=255)
     author_user_id = models.ForeignKey(settings.AUTH_USER_MODEL,
@@ -111,7 +227,267 @@ class Comment(models.Model):
                                  related_name='issue_comments')
     created_time = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['issue_id', 'created_time', 'id'],
+                         name='comment_issue_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Projet n° : {self.issue_id.project_id.id} - " \
+        return f"Projet n° : {self.issue_id.project_id_id} - " \
                f"Titre du probléme : {self.issue_id.title} - " \
                f"Commentaire : {self.description}"
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            created = self._state.adding
+            super().save(*args, **kwargs)
+            project_id = self.issue_id.project_id_id
+            if created:
+                ProjectStatistics.apply(project_id, {'comments': 1})
+            ChangeLog.record(project_id, ChangeLog.COMMENT,
+                             ChangeLog.CREATED if created else
+                             ChangeLog.UPDATED, [self.pk])
+            Project.bump_version(pk=project_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            pk = self.pk
+            project_id = self.issue_id.project_id_id
+            result = super().delete(*args, **kwargs)
+            ProjectStatistics.apply(project_id, {'comments': -1})
+            ChangeLog.record(project_id, ChangeLog.COMMENT,
+                             ChangeLog.DELETED, [pk])
+            Project.bump_version(pk=project_id)
+        return result
+
+
+class ProjectStatistics(models.Model):
+    """
+    Compteurs d'un projet, mis à jour dans la même transaction que les
+    écritures sur Issue et Comment : nombre de problèmes par statut,
+    priorité et balise, et nombre de commentaires. Une colonne par valeur
+    de choix, nommée <champ>_<code> (status_af, priority_el, tag_bg...).
+    """
+    project_id = models.OneToOneField('api.Project', primary_key=True,
+                                      on_delete=models.CASCADE,
+                                      related_name='statistics')
+    issues = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    status_af = models.PositiveIntegerField(default=0)
+    status_ec = models.PositiveIntegerField(default=0)
+    status_tr = models.PositiveIntegerField(default=0)
+    priority_fa = models.PositiveIntegerField(default=0)
+    priority_mo = models.PositiveIntegerField(default=0)
+    priority_el = models.PositiveIntegerField(default=0)
+    tag_bg = models.PositiveIntegerField(default=0)
+    tag_am = models.PositiveIntegerField(default=0)
+    tag_ta = models.PositiveIntegerField(default=0)
+
+    @staticmethod
+    def column(field, code):
+        return f'{field}_{code.lower()}'
+
+    @classmethod
+    def counter_columns(cls):
+        return ['issues', 'comments'] + [
+            cls.column(field, code)
+            for field, choices in Issue.COUNTED_FIELDS.items()
+            for code, _ in choices]
+
+    @classmethod
+    def issue_deltas(cls, previous, current):
+        # Variations des compteurs entre deux états d'un problème ; None
+        # représente un problème inexistant (création ou suppression).
+        deltas = {}
+        if previous is None:
+            deltas['issues'] = 1
+        if current is None:
+            deltas['issues'] = -1
+        for field in Issue.COUNTED_FIELDS:
+            old = previous and previous.get(field)
+            new = current and current.get(field)
+            if old == new:
+                continue
+            if old:
+                column = cls.column(field, old)
+                deltas[column] = deltas.get(column, 0) - 1
+            if new:
+                column = cls.column(field, new)
+                deltas[column] = deltas.get(column, 0) + 1
+        return {column: delta for column, delta in deltas.items() if delta}
+
+    @classmethod
+    def apply(cls, project_id, deltas):
+        # Une seule requête UPDATE ; si la ligne du projet n'existe pas
+        # encore, elle est calculée à partir des tables (écriture courante
+        # comprise).
+        columns = set(cls.counter_columns())
+        deltas = {column: delta for column, delta in deltas.items()
+                  if column in columns}
+        if not deltas:
+            return
+        updated = cls.objects.filter(project_id=project_id).update(**{
+            column: models.F(column) + delta
+            for column, delta in deltas.items()})
+        if not updated:
+            cls.rebuild(project_id)
+
+    @classmethod
+    def compute(cls, project_id):
+        # Recalcule les compteurs depuis les tables Issue et Comment
+        aggregates = {'issues': models.Count('id')}
+        for field, choices in Issue.COUNTED_FIELDS.items():
+            for code, _ in choices:
+                aggregates[cls.column(field, code)] = models.Count(
+                    'id', filter=models.Q(**{field: code}))
+        # Les problèmes en attente de suppression ne sont plus comptés
+        counts = Issue.objects.filter(
+            project_id=project_id, deleted_time__isnull=True).aggregate(
+            **aggregates)
+        counts['comments'] = Comment.objects.filter(
+            issue_id__project_id=project_id,
+            issue_id__deleted_time__isnull=True).count()
+        return counts
+
+    @classmethod
+    def rebuild(cls, project_id):
+        counts = cls.compute(project_id)
+        statistics, _ = cls.objects.update_or_create(project_id_id=project_id,
+                                                     defaults=counts)
+        return statistics
+
+    @classmethod
+    def for_project(cls, project_id):
+        statistics = cls.objects.filter(project_id=project_id).first()
+        if statistics is None:
+            statistics = cls.rebuild(project_id)
+        return statistics
+
+    def counters(self):
+        return {column: getattr(self, column)
+                for column in self.counter_columns()}
+
+
+class ChangeLog(models.Model):
+    """
+    Journal des modifications des problèmes, commentaires et contributeurs
+    d'un projet, lu par la synchronisation incrémentale (api.sync) et les
+    flux d'événements (api.events). Chaque création, modification ou
+    suppression ajoute une ligne ; l'identifiant, croissant, sert de numéro
+    de séquence. La ligne d'un objet supprimé tient lieu de pierre tombale.
+    """
+
+    ISSUE = 'IS'
+    COMMENT = 'CO'
+    CONTRIBUTOR = 'CT'
+
+    MODELS = [
+        (ISSUE, 'Probléme'),
+        (COMMENT, 'Commentaire'),
+        (CONTRIBUTOR, 'Contributeur'),
+    ]
+
+    CREATED = 'C'
+    UPDATED = 'U'
+    DELETED = 'D'
+
+    ACTIONS = [
+        (CREATED, 'Création'),
+        (UPDATED, 'Modification'),
+        (DELETED, 'Suppression'),
+    ]
+
+    project_id = models.ForeignKey('api.Project', on_delete=models.CASCADE,
+                                   related_name='changes')
+    model = models.CharField(max_length=2, choices=MODELS)
+    action = models.CharField(max_length=1, choices=ACTIONS,
+                              default=UPDATED)
+    object_id = models.PositiveBigIntegerField()
+    created_time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project_id', 'id'],
+                         name='changelog_project_idx'),
+        ]
+
+    def __str__(self):
+        return f"Projet n° : {self.project_id_id} - " \
+               f"{self.get_action_display()} : " \
+               f"{self.get_model_display()} n° {self.object_id}"
+
+    @classmethod
+    def record(cls, project_id, model, action, object_ids):
+        if project_id is None or not object_ids:
+            return
+        now = timezone.now()
+        entries = cls.objects.bulk_create([
+            cls(project_id_id=project_id, model=model, action=action,
+                object_id=object_id, created_time=now)
+            for object_id in object_ids])
+        changes_recorded.send(sender=cls, project_id=project_id,
+                              entries=entries)
+
+
+# Envoyé à chaque ajout au journal, dans la transaction de l'écriture
+changes_recorded = Signal()
+
+
+class DeletionJob(models.Model):
+    """
+    Suppression d'un projet ou d'un problème, exécutée par lots en arrière-
+    plan (api.deletion). La cible est masquée dès la création de la tâche ;
+    `deleted` compte les lignes déjà supprimées. Une tâche interrompue
+    (PENDING ou RUNNING) est reprise là où elle s'était arrêtée.
+    `heartbeat_time`, renouvelé à chaque lot, signale qu'un processus
+    exécute encore la tâche. Une tâche en échec est retentée à `retry_time`
+    ; après DELETION_ATTEMPTS échecs, `retry_time` est vide et seule une
+    relance manuelle (admin, resume_deletions --retry-failed) la reprend.
+    """
+
+    PROJECT = 'PR'
+    ISSUE = 'IS'
+
+    TARGETS = [
+        (PROJECT, 'Projet'),
+        (ISSUE, 'Probléme'),
+    ]
+
+    PENDING = 'PE'
+    RUNNING = 'RU'
+    DONE = 'DO'
+    FAILED = 'FA'
+
+    STATUS = [
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Terminée'),
+        (FAILED, 'En échec'),
+    ]
+
+    target = models.CharField(max_length=2, choices=TARGETS)
+    # Pas de clé étrangère : la tâche survit à la suppression de sa cible
+    object_id = models.PositiveBigIntegerField()
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True,
+                                     on_delete=models.SET_NULL,
+                                     related_name='deletion_jobs')
+    status = models.CharField(max_length=2, choices=STATUS, default=PENDING)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    retry_time = models.DateTimeField(null=True, blank=True)
+    created_time = models.DateTimeField(auto_now_add=True)
+    started_time = models.DateTimeField(null=True, blank=True)
+    heartbeat_time = models.DateTimeField(null=True, blank=True)
+    finished_time = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'],
+                         name='deletionjob_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Suppression : {self.get_target_display()} " \
+               f"n° {self.object_id} - {self.get_status_display()}"
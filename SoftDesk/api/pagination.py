@@ -0,0 +1,155 @@
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CreatedTimeCursorPagination(BasePagination):
+    """
+    Pagination par curseur (keyset) sur le couple (created_time, id).
+
+    Chaque page est lue avec un WHERE sur la position du curseur au lieu d'un
+    OFFSET, et aucun COUNT n'est exécuté : la page 500 coûte autant que la
+    page 1. L'ordre est stable même lorsque plusieurs objets partagent la
+    même date de création.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = 'Curseur invalide'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        # Requête de la page, sans l'exécuter (lecture asynchrone possible,
+        # voir api.async_views) ; set_page() reçoit ensuite ses lignes.
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            queryset = queryset.order_by('created_time', 'id')
+        else:
+            reverse, created_time, pk = self.cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_time__lt=created_time) |
+                    Q(created_time=created_time, id__lt=pk)
+                ).order_by('-created_time', '-id')
+            else:
+                queryset = queryset.filter(
+                    Q(created_time__gt=created_time) |
+                    Q(created_time=created_time, id__gt=pk)
+                ).order_by('created_time', 'id')
+        # Une ligne de plus que la taille de page indique s'il reste des
+        # résultats dans le sens de lecture.
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        reverse = self.cursor is not None and self.cursor[0]
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next = self.cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Page vide atteinte en avançant : on repart du début.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode()
+            direction, created_time, pk = raw.split('|')
+            created_time = parse_datetime(created_time)
+            if direction not in ('f', 'r') or created_time is None:
+                raise ValueError
+            return direction == 'r', created_time, int(pk)
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, row):
+        # Les lignes peuvent être des instances de modèle ou des dictionnaires
+        # issus de values().
+        if isinstance(row, dict):
+            created_time, pk = row['created_time'], row['id']
+        else:
+            created_time, pk = row.created_time, row.id
+        raw = f"{'r' if reverse else 'f'}|{created_time.isoformat()}|{pk}"
+        encoded = base64.urlsafe_b64encode(raw.encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encoded)
+
+
+class CursorPaginationMixin:
+    """
+    Active la pagination par curseur à la demande : ?pagination=cursor (ou la
+    présence d'un curseur) remplace la pagination par défaut du projet.
+    """
+    cursor_pagination_class = CreatedTimeCursorPagination
+
+    def uses_cursor_pagination(self):
+        params = self.request.query_params
+        return (params.get('pagination') == 'cursor'
+                or CreatedTimeCursorPagination.cursor_query_param in params)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.uses_cursor_pagination():
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,161 @@
+"""
+Profilage des requêtes SQL par requête HTTP.
+
+QueryProfilingMiddleware (actif si DEBUG ou QUERY_PROFILING) compte les
+requêtes SQL exécutées pendant le traitement d'une requête, leur durée
+totale et les requêtes dupliquées (même SQL exécuté plusieurs fois, signe
+habituel d'un N+1). Les résultats sont renvoyés dans les en-têtes
+X-Query-Count, X-Query-Time (ms) et X-Query-Duplicates, et conservés dans
+un journal glissant consultable par /api/debug/queries/.
+
+query_budget() fait échouer un test qui dépasse le nombre de requêtes
+annoncé.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.queries')
+
+# Les requêtes de l'ORM arrivent avec leurs paramètres à part (%s) ; les
+# valeurs littérales du SQL brut sont aussi remplacées pour regrouper les
+# requêtes de même forme.
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+_log = deque(maxlen=getattr(settings, 'QUERY_PROFILING_LOG_SIZE', 200))
+_log_lock = threading.Lock()
+
+
+def is_enabled():
+    return settings.DEBUG or getattr(settings, 'QUERY_PROFILING', False)
+
+
+class QueryProfile:
+    """
+    execute_wrapper qui enregistre chaque requête exécutée et sa durée.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def duplicated(self):
+        # {sql normalisé: nombre d'exécutions} pour les requêtes répétées
+        shapes = Counter(_LITERALS.sub('?', sql) for sql, _ in self.queries)
+        return {sql: count for sql, count in shapes.items() if count > 1}
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.duplicated().values())
+
+
+class QueryProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        with profile.capture():
+            response = self.get_response(request)
+        # Pour une réponse en flux, seules les requêtes précédant le premier
+        # bloc sont comptées.
+        response['X-Query-Count'] = str(profile.count)
+        response['X-Query-Time'] = f'{profile.duration * 1000:.2f}'
+        response['X-Query-Duplicates'] = str(profile.duplicates)
+        record(request, response, profile)
+        return response
+
+
+def record(request, response, profile):
+    duplicated = sorted(profile.duplicated().items(),
+                        key=lambda item: item[1], reverse=True)
+    entry = {
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'queries': profile.count,
+        'time_ms': round(profile.duration * 1000, 2),
+        'duplicates': profile.duplicates,
+        'duplicated_sql': [{'sql': sql, 'count': count}
+                           for sql, count in duplicated[:5]],
+    }
+    with _log_lock:
+        _log.append(entry)
+    if profile.duplicates:
+        logger.warning('%s %s : %d requêtes dont %d dupliquées',
+                       entry['method'], entry['path'], entry['queries'],
+                       entry['duplicates'])
+    else:
+        logger.debug('%s %s : %d requêtes, %.2f ms', entry['method'],
+                     entry['path'], entry['queries'], entry['time_ms'])
+
+
+def recent():
+    # Entrées du journal, de la plus récente à la plus ancienne
+    with _log_lock:
+        return list(reversed(_log))
+
+
+def clear():
+    with _log_lock:
+        _log.clear()
+
+
+def query_budget(max_queries, max_duplicates=0):
+    """
+    Décorateur de méthode de test : échoue si le test exécute plus de
+    `max_queries` requêtes SQL ou plus de `max_duplicates` requêtes
+    dupliquées. Le jeu de données est préparé dans setUpTestData pour que
+    seules les requêtes des appels à l'API soient comptées.
+    """
+    def decorator(test):
+        @wraps(test)
+        def wrapper(self, *args, **kwargs):
+            profile = QueryProfile()
+            with profile.capture():
+                result = test(self, *args, **kwargs)
+            details = '\n'.join(sql for sql, _ in profile.queries)
+            if profile.count > max_queries:
+                self.fail(f'{profile.count} requêtes pour un budget de '
+                          f'{max_queries} :\n{details}')
+            if profile.duplicates > max_duplicates:
+                duplicated = '\n'.join(
+                    f'{count} x {sql}'
+                    for sql, count in profile.duplicated().items())
+                self.fail(f'{profile.duplicates} requêtes dupliquées pour '
+                          f'un maximum de {max_duplicates} :\n{duplicated}')
+            return result
+        return wrapper
+    return decorator
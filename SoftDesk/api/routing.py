@@ -0,0 +1,145 @@
+"""
+Lectures servies par des réplicas de la base (DATABASE_REPLICAS).
+
+Les vues qui héritent de ReplicaReadMixin lisent, pour les méthodes sûres
+(GET, HEAD, OPTIONS), dans un réplica tiré au sort pour toute la requête.
+ReplicaRouter envoie toutes les écritures et les migrations vers la base
+principale, ainsi que les lectures faites dans une transaction ouverte sur
+celle-ci.
+
+Lecture de ses propres écritures : après une requête d'écriture réussie,
+ReplicaStickinessMiddleware attache l'utilisateur à la base principale
+pendant REPLICA_STICKINESS_TIMEOUT secondes, le temps que la réplication
+rattrape son retard. Le marqueur est conservé dans le cache
+REPLICA_STICKY_CACHE, à partager entre processus en production : un cache
+propre au processus (LocMemCache) est signalé par la vérification api.W001.
+
+Sans réplica configuré, le routeur et le middleware sont sans effet.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+STICKY_KEY = 'api:replica-sticky:{}'
+
+# Alias du réplica choisi pour la requête en cours, ou None
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _sticky_cache():
+    return caches[getattr(settings, 'REPLICA_STICKY_CACHE', 'default')]
+
+
+def check_sticky_cache(app_configs=None, **kwargs):
+    # Avec un cache local, les autres processus ignorent le marqueur et
+    # servent depuis un réplica les lectures qui suivent une écriture.
+    if not get_replicas() or not isinstance(_sticky_cache(), LocMemCache):
+        return []
+    return [checks.Warning(
+        'REPLICA_STICKY_CACHE désigne un cache propre au processus : la '
+        'lecture de ses propres écritures n\'est garantie que dans le '
+        'processus qui a servi l\'écriture.',
+        hint='Configurez un cache partagé entre processus '
+             '(SOFTDESK_API_CACHE_BACKEND).',
+        id='api.W001')]
+
+
+def stick_to_primary(user_id):
+    _sticky_cache().set(STICKY_KEY.format(user_id), True, getattr(
+        settings, 'REPLICA_STICKINESS_TIMEOUT', 10))
+
+
+def is_sticky(user_id):
+    return _sticky_cache().get(STICKY_KEY.format(user_id), False)
+
+
+def choose_replica(user):
+    # None : la requête doit lire la base principale
+    replicas = get_replicas()
+    if not replicas or (user.is_authenticated and is_sticky(user.pk)):
+        return None
+    return random.choice(replicas)
+
+
+def in_transaction():
+    # Transaction ouverte sur la base principale ; celles de TestCase ne
+    # comptent pas, comme pour atomic(durable=True).
+    return any(not block._from_testcase
+               for block in connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+def read_database():
+    alias = _read_alias.get()
+    if alias is None or in_transaction():
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Les réplicas sont des copies de la base principale
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Le schéma des réplicas vient de la réplication
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Sert les requêtes de lecture du ViewSet depuis un réplica. Le choix est
+    fait avant les permissions, pour que toute la requête lise la même base.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        self._replica_token = None
+        if request.method in SAFE_METHODS:
+            alias = choose_replica(request.user)
+            if alias is not None:
+                self._replica_token = _read_alias.set(alias)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaStickinessMiddleware:
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # request.user est celui authentifié par DRF, le cas échéant
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and \
+                response.status_code < 400 and \
+                user is not None and user.is_authenticated:
+            stick_to_primary(user.pk)
+        return response
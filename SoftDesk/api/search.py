@@ -0,0 +1,156 @@
+import json
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from api.models import Contributor, Issue, Comment
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchBackend:
+    """
+    Interface des moteurs de recherche. search() renvoie au plus `limit`
+    résultats, classés du plus pertinent au moins pertinent, sous la forme
+    de dictionnaires : type, id, issue_id, project_id, title, excerpt.
+    """
+
+    def search(self, project_ids, text, limit, offset):
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    Recherche dans la table virtuelle FTS5 api_search_index, maintenue par
+    les déclencheurs des migrations 0006 et 0012, classée par bm25() sur
+    l'ensemble des correspondances (titre deux fois plus lourd que le
+    corps), avec LIMIT / OFFSET en SQL.
+
+    Jusqu'à SEARCH_SCOPE_PROJECTS projets, ceux de l'utilisateur sont des
+    termes de la colonne `scope` de la requête MATCH : FTS5 ne parcourt que
+    les correspondances de ces projets. Leur poids est nul dans bm25() : ils
+    ne modifient pas le classement. Au-delà, la liste OR ralentit FTS5 plus
+    que le filtrage des correspondances : les projets sont alors passés en
+    un seul paramètre JSON (json_each), sans limite du nombre de variables
+    de SQLite.
+    """
+    select = """
+        SELECT kind, object_id, issue_id, project_id, title,
+               snippet(api_search_index, 1, '', '', '…', 12)
+        FROM api_search_index
+        WHERE api_search_index MATCH %s {projects}
+        ORDER BY bm25(api_search_index, %s, %s, 0), rowid DESC
+        LIMIT %s OFFSET %s
+    """
+    projects_filter = """
+        AND project_id IN (SELECT value FROM json_each(%s))
+    """
+    # Poids du titre et du corps
+    weights = (2.0, 1.0)
+    # Longueurs couvertes par les index de préfixes (migration 0012). Un
+    # préfixe plus long ou plus court obligerait FTS5 à fusionner les listes
+    # de tous les termes qui le prolongent, à chaque requête.
+    prefix_lengths = range(2, 5)
+
+    def build_match(self, text):
+        # Chaque mot est cité pour neutraliser la syntaxe FTS5 ; le dernier,
+        # s'il est court, est recherché en préfixe pour la saisie en cours
+        # de frappe.
+        words = WORD_RE.findall(text)
+        phrases = [f'"{word}"' for word in words]
+        if len(words[-1]) in self.prefix_lengths:
+            phrases[-1] += '*'
+        return '{title body} : (' + ' '.join(phrases) + ')'
+
+    def build_scope(self, project_ids):
+        terms = ' OR '.join(f'"{int(project_id)}"'
+                            for project_id in project_ids)
+        return f'scope : ({terms})'
+
+    def search(self, project_ids, text, limit, offset):
+        if not project_ids or not WORD_RE.search(text):
+            return []
+        match = self.build_match(text)
+        if len(project_ids) <= getattr(settings, 'SEARCH_SCOPE_PROJECTS',
+                                       100):
+            sql = self.select.format(projects='')
+            params = [f'{self.build_scope(project_ids)} AND {match}']
+        else:
+            sql = self.select.format(projects=self.projects_filter)
+            params = [match, json.dumps([int(project_id)
+                                         for project_id in project_ids])]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, *self.weights, limit, offset])
+            rows = cursor.fetchall()
+        return [{'type': kind, 'id': object_id, 'issue_id': issue_id,
+                 'project_id': project_id, 'title': title,
+                 'excerpt': excerpt}
+                for kind, object_id, issue_id, project_id, title, excerpt
+                in rows]
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """
+    Repli pour les bases sans FTS5 : filtre icontains, sans classement par
+    pertinence (du plus récent au plus ancien).
+    """
+
+    def search(self, project_ids, text, limit, offset):
+        words = WORD_RE.findall(text)
+        if not project_ids or not words:
+            return []
+        issue_filter, comment_filter = Q(), Q()
+        for word in words:
+            issue_filter &= Q(title__icontains=word) | \
+                Q(description__icontains=word)
+            comment_filter &= Q(description__icontains=word)
+        issues = Issue.objects.filter(
+            issue_filter, project_id__in=project_ids,
+            deleted_time__isnull=True).order_by(
+            '-created_time').values_list(
+            'id', 'project_id', 'title', 'description', 'created_time')
+        comments = Comment.objects.filter(
+            comment_filter, issue_id__project_id__in=project_ids,
+            issue_id__deleted_time__isnull=True).order_by(
+            '-created_time').values_list(
+            'id', 'issue_id', 'issue_id__project_id', 'description',
+            'created_time')
+        results = [('issue', pk, pk, project_id, title, description, created)
+                   for pk, project_id, title, description, created
+                   in issues[:offset + limit]]
+        results += [('comment', pk, issue_id, project_id, '', description,
+                     created)
+                    for pk, issue_id, project_id, description, created
+                    in comments[:offset + limit]]
+        results.sort(key=lambda result: result[-1], reverse=True)
+        return [{'type': kind, 'id': pk, 'issue_id': issue_id,
+                 'project_id': project_id, 'title': title,
+                 'excerpt': description}
+                for kind, pk, issue_id, project_id, title, description, _
+                in results[offset:offset + limit]]
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite' and 'api_search_index' in \
+            connection.introspection.table_names():
+        return SQLiteFTS5Backend()
+    return DatabaseSearchBackend()
+
+
+def search(user, text, limit, offset):
+    """
+    Recherche `text` dans les problèmes et commentaires des projets
+    auxquels l'utilisateur contribue.
+    """
+    project_ids = list(Contributor.objects.filter(
+        user_id=user, project_id__deleted_time__isnull=True).values_list(
+        'project_id', flat=True))
+    return get_backend().search(project_ids, text, limit, offset)
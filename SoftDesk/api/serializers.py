@@ -1,12 +1,53 @@
+from operator import itemgetter
+
 from rest_framework.serializers import ModelSerializer
 from rest_framework import serializers
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from api.utils import display_time, display_name, \
     display_id, choice_fields_validator
-from api.models import Contributor, Project, Issue, Comment
+from api.models import Contributor, Project, Issue, Comment, DeletionJob
+
+
+class SparseFieldsMixin:
+    """
+    Limite la sortie aux champs demandés (context['fields'], renseigné par
+    SparseFieldsetMixin d'après ?fields=) : les autres champs, y compris les
+    SerializerMethodField, ne sont jamais évalués.
+
+    `field_sources` donne les colonnes lues par les champs qui ne portent
+    pas le nom d'un champ du modèle ; la vue en déduit le only() et les
+    jointures de sa requête.
+    """
+
+    @classmethod
+    def sparse_field_names(cls):
+        return list(dict.fromkeys(cls.Meta.fields))
+
+    @classmethod
+    def get_columns(cls, fields):
+        sources = getattr(cls, 'field_sources', {})
+        return [column for name in fields
+                for column in sources.get(name, (name,))]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if requested is None:
+            return fields
+        return {name: field for name, field in fields.items()
+                if name in requested}
 
 
 class ProjectMixin:
+    field_sources = {
+        'project_id': ('id',),
+        'author_name': ('author_user_id__first_name',
+                        'author_user_id__last_name'),
+    }
+
     def get_project_id(self, obj):
         return display_id(obj)
 
@@ -18,6 +59,13 @@ class ProjectMixin:
 
 
 class IssueMixin:
+    field_sources = {
+        'issue_id': ('id',),
+        'author_name': ('author_user_id__first_name',
+                        'author_user_id__last_name'),
+        'assigned_name': ('assigned__first_name', 'assigned__last_name'),
+    }
+
     def get_issue_id(self, obj):
         return display_id(obj)
 
@@ -40,6 +88,12 @@ class IssueMixin:
         return display_name(obj.assigned)
 
 class CommentMixin:
+    field_sources = {
+        'comment_id': ('id',),
+        'author_name': ('author_user_id__first_name',
+                        'author_user_id__last_name'),
+    }
+
     def get_comment_id(self, obj):
         return display_id(obj)
 
@@ -58,10 +112,17 @@ class UserSerializer(serializers.Serializer):
     first_name = serializers.CharField()
     last_name = serializers.CharField()
 
+    duplicate_message = "Un utilisateur avec cette adresse e-mail existe " \
+                        "déjà."
+
     def validate_email(self, value):
+        # Normalisation de UserManager.create_user (domaine en minuscules),
+        # avant la recherche pour que Jean@Gmail.com et Jean@gmail.com
+        # désignent le même compte. Recherche par index (auth_user.email,
+        # migration 0004).
+        value = User.objects.normalize_email(value)
         if User.objects.filter(email=value).exists():
-            raise serializers.ValidationError(
-                "Un utilisateur avec cette adresse e-mail existe déjà.")
+            raise serializers.ValidationError(self.duplicate_message)
         return value
 
     def validate(self, data):
@@ -71,17 +132,45 @@ class UserSerializer(serializers.Serializer):
         return data
 
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['email'],
+        # Le hachage du mot de passe est fourni par la vue (password_hash),
+        # calculé hors du thread de la requête par api.hashing.
+        user = User(
+            username=User.normalize_username(validated_data['email']),
             email=validated_data['email'],
-            password=validated_data['password'],
             first_name=validated_data['first_name'],
-            last_name=validated_data['last_name']
+            last_name=validated_data['last_name'],
+            password=validated_data.get('password_hash') or
+            make_password(validated_data['password'])
         )
+        # Deux inscriptions simultanées peuvent passer validate_email :
+        # l'unicité de username (égal à l'e-mail) tranche.
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'email': [self.duplicate_message]})
         return user
 
 
-class ProjectsListSerializer(ModelSerializer, ProjectMixin):
+class UserProfileSerializer(ModelSerializer):
+    # Profil public d'un utilisateur, intégré aux vues de détail (?include=)
+    user_id = serializers.SerializerMethodField()
+    user_name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['user_id', 'first_name', 'last_name', 'user_name']
+
+    def get_user_id(self, obj):
+        return display_id(obj)
+
+    def get_user_name(self, obj):
+        return display_name(obj)
+
+
+class ProjectsListSerializer(SparseFieldsMixin, ModelSerializer,
+                             ProjectMixin):
     project_id = serializers.SerializerMethodField()
     author_name = serializers.SerializerMethodField()
     type = serializers.SerializerMethodField()
@@ -93,7 +182,8 @@ class ProjectsListSerializer(ModelSerializer, ProjectMixin):
         read_only_field = ['author_name']
 
 
-class ProjectsDetailSerializer(ModelSerializer, ProjectMixin):
+class ProjectsDetailSerializer(SparseFieldsMixin, ModelSerializer,
+                               ProjectMixin):
     project_id = serializers.SerializerMethodField()
     author_name = serializers.SerializerMethodField()
 
@@ -105,20 +195,30 @@ class ProjectsDetailSerializer(ModelSerializer, ProjectMixin):
 
     def to_internal_value(self, data):
         choice_fields = {'type': Project.TYPES}
-        choice_fields_validator(data, choice_fields)
+        choice_fields_validator(data, choice_fields, self.partial)
         return super().to_internal_value(data)
 
 
-class ContributorsSerializer(ModelSerializer):
+class ContributorsSerializer(SparseFieldsMixin, ModelSerializer):
     contributor_id = serializers.SerializerMethodField()
     user_name = serializers.SerializerMethodField()
     role = serializers.SerializerMethodField()
 
+    field_sources = {
+        'contributor_id': ('id',),
+        'user_name': ('user_id__first_name', 'user_id__last_name'),
+    }
+
     class Meta:
         model = Contributor
         fields = ['contributor_id', 'user_id', 'user_name', 'role']
         read_only_fields = ['contributor_id','role', 'user_name']
 
+    # L'unicité du couple (user_id, project_id) est garantie par la
+    # contrainte unique_contributor_user_project, vérifiée à l'insertion
+    # par ContributorsViewSet.perform_create.
+    duplicate_message = "User déjà présent dans les contributeurs"
+
     def get_contributor_id(self, obj):
         return obj.id
 
@@ -128,19 +228,14 @@ class ContributorsSerializer(ModelSerializer):
     def get_role(self, obj):
         return obj.get_role_display()
 
-    def validate_user_id(self, data):
-        # data correspond aux donnés qui doivent être validés, ici user_id
-        project_id = self.context['request'].parser_context['kwargs'].get(
-            'project_id')
-        if Contributor.objects.filter(
-                project_id=project_id, user_id=data).exists():
-            raise serializers.ValidationError(
-                "User déjà présent dans les contributeurs"
-            )
-        return data
+
+class ContributorsBulkSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(),
+                                     allow_empty=False, max_length=1000)
 
 
-class IssuesListSerializer(ModelSerializer, IssueMixin):
+class IssuesListSerializer(SparseFieldsMixin, ModelSerializer,
+                           IssueMixin):
     issue_id = serializers.SerializerMethodField()
     created_time = serializers.SerializerMethodField()
     tag = serializers.SerializerMethodField()
@@ -155,7 +250,8 @@ class IssuesListSerializer(ModelSerializer, IssueMixin):
                   'status', 'created_time','author_name','assigned_name']
 
 
-class IssuesDetailSerializer(ModelSerializer, IssueMixin):
+class IssuesDetailSerializer(SparseFieldsMixin, ModelSerializer,
+                             IssueMixin):
     issue_id = serializers.SerializerMethodField()
     author_name = serializers.SerializerMethodField()
     created_time = serializers.SerializerMethodField()
@@ -173,10 +269,17 @@ class IssuesDetailSerializer(ModelSerializer, IssueMixin):
         choice_fields = {'tag': Issue.TAGS,
                    'priority': Issue.PRIORITIES,
                    'status': Issue.STATUS}
-        choice_fields_validator(data, choice_fields)
+        choice_fields_validator(data, choice_fields, self.partial)
         return super().to_internal_value(data)
 
-class CommentsListSerializer(ModelSerializer, CommentMixin):
+
+class IssuesBulkSerializer(IssuesDetailSerializer):
+    # Les utilisateurs assignés sont résolus en une seule requête pour tout
+    # le lot par IssuesViewSet.bulk, au lieu d'une requête par problème.
+    assigned = serializers.IntegerField()
+
+class CommentsListSerializer(SparseFieldsMixin, ModelSerializer,
+                             CommentMixin):
     comment_id = serializers.SerializerMethodField()
     author_name = serializers.SerializerMethodField()
 
@@ -186,7 +289,8 @@ class CommentsListSerializer(ModelSerializer, CommentMixin):
                   'author_user_id', 'author_name']
 
 
-class CommentsDetailSerializer(ModelSerializer, CommentMixin):
+class CommentsDetailSerializer(SparseFieldsMixin, ModelSerializer,
+                               CommentMixin):
     comment_id = serializers.SerializerMethodField()
     author_name = serializers.SerializerMethodField()
     created_time = serializers.SerializerMethodField()
@@ -197,3 +301,156 @@ class CommentsDetailSerializer(ModelSerializer, CommentMixin):
                   'author_user_id', 'author_name', 'created_time']
         read_only_fields = ['comment_id', 'author_user_id', 'issue_id',
                             'author_name']
+
+
+class ProjectionSerializer(serializers.BaseSerializer):
+    """
+    Sérialiseur en lecture seule qui travaille sur les dictionnaires d'un
+    QuerySet.values() : seules les colonnes de `field_sources` sont lues,
+    les noms des utilisateurs arrivent par jointure et aucun objet modèle
+    n'est instancié. Le résultat est identique à celui du serializer de
+    liste correspondant.
+
+    Avec ?fields= (context['fields']), seuls les champs demandés sont lus et
+    calculés : get_representers() associe à chaque champ la fonction qui le
+    calcule à partir d'une ligne.
+    """
+    # {champ de sortie: colonnes lues}, dans l'ordre de la représentation
+    field_sources = {}
+    # Colonnes toujours lues : position de la pagination par curseur
+    key_columns = ('id', 'created_time')
+
+    @classmethod
+    def sparse_field_names(cls):
+        return list(cls.field_sources)
+
+    @classmethod
+    def project(cls, queryset, fields=None):
+        columns = [column for name, sources in cls.field_sources.items()
+                   if fields is None or name in fields
+                   for column in sources]
+        return queryset.values(*dict.fromkeys(cls.key_columns + tuple(
+            columns)))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.timezone = timezone.get_current_timezone()
+        self._times = {}
+        self._representers = None
+
+    def get_representers(self):
+        raise NotImplementedError
+
+    def to_representation(self, row):
+        if self._representers is None:
+            fields = self.context.get('fields')
+            self._representers = [
+                (name, represent)
+                for name, represent in self.get_representers().items()
+                if fields is None or name in fields]
+        return {name: represent(row) for name, represent in self._representers}
+
+    def display_time(self, value):
+        # Équivalent de utils.display_time. Le décalage horaire ne change
+        # jamais au sein d'une même minute : le texte est calculé une fois
+        # par minute distincte de la page.
+        key = value.replace(second=0, microsecond=0)
+        text = self._times.get(key)
+        if text is None:
+            text = value.astimezone(self.timezone).strftime("%d/%m/%Y %H:%M")
+            self._times[key] = text
+        return text
+
+    @staticmethod
+    def display_name(first_name, last_name):
+        # Équivalent de User.get_full_name()
+        return f"{first_name} {last_name}".strip()
+
+
+class IssuesListProjectionSerializer(ProjectionSerializer):
+    field_sources = {
+        'issue_id': ('id',),
+        'title': ('title',),
+        'tag': ('tag',),
+        'priority': ('priority',),
+        'status': ('status',),
+        'created_time': ('created_time',),
+        'author_name': ('author_user_id__first_name',
+                        'author_user_id__last_name'),
+        'assigned_name': ('assigned__first_name', 'assigned__last_name'),
+    }
+    tag_labels = dict(Issue.TAGS)
+    priority_labels = dict(Issue.PRIORITIES)
+    status_labels = dict(Issue.STATUS)
+
+    def get_representers(self):
+        def label(labels, column):
+            return lambda row: labels.get(row[column], row[column])
+
+        return {
+            'issue_id': itemgetter('id'),
+            'title': itemgetter('title'),
+            'tag': label(self.tag_labels, 'tag'),
+            'priority': label(self.priority_labels, 'priority'),
+            'status': label(self.status_labels, 'status'),
+            'created_time': lambda row: self.display_time(
+                row['created_time']),
+            'author_name': lambda row: self.display_name(
+                row['author_user_id__first_name'],
+                row['author_user_id__last_name']),
+            'assigned_name': lambda row: self.display_name(
+                row['assigned__first_name'], row['assigned__last_name']),
+        }
+
+
+class CommentsListProjectionSerializer(ProjectionSerializer):
+    field_sources = {
+        'comment_id': ('id',),
+        'issue_id': ('issue_id',),
+        'description': ('description',),
+        'author_user_id': ('author_user_id',),
+        'author_name': ('author_user_id__first_name',
+                        'author_user_id__last_name'),
+    }
+
+    def get_representers(self):
+        return {
+            'comment_id': itemgetter('id'),
+            'issue_id': itemgetter('issue_id'),
+            'description': itemgetter('description'),
+            'author_user_id': itemgetter('author_user_id'),
+            'author_name': lambda row: self.display_name(
+                row['author_user_id__first_name'],
+                row['author_user_id__last_name']),
+        }
+
+
+class ProjectStatisticsSerializer(serializers.BaseSerializer):
+    # Compteurs d'un projet, présentés comme les facettes des listes de
+    # problèmes : {champ: [{'value', 'label', 'count'}]}.
+
+    def to_representation(self, statistics):
+        data = {'project_id': statistics.project_id_id,
+                'issues': statistics.issues,
+                'comments': statistics.comments}
+        for field, choices in Issue.COUNTED_FIELDS.items():
+            data[field] = [
+                {'value': code, 'label': label,
+                 'count': getattr(statistics,
+                                  statistics.column(field, code))}
+                for code, label in choices]
+        return data
+
+
+class DeletionJobSerializer(ModelSerializer):
+    target_display = serializers.CharField(source='get_target_display',
+                                           read_only=True)
+    status_display = serializers.CharField(source='get_status_display',
+                                           read_only=True)
+
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'target', 'target_display', 'object_id', 'status',
+                  'status_display', 'deleted', 'error', 'attempts',
+                  'retry_time', 'created_time', 'started_time',
+                  'finished_time']
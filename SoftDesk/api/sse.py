@@ -0,0 +1,180 @@
+"""
+Flux Server-Sent Events des projets : GET /api/projects/<id>/events/.
+
+Servi par l'application ASGI (SoftDesk/asgi.py) en dehors des vues Django :
+le gestionnaire ASGI de Django 4.1 parcourt les réponses en flux de façon
+synchrone et ne voit pas la déconnexion du client. EventStreamRouter prend
+en charge ce chemin et transmet toutes les autres requêtes à Django.
+
+Mêmes règles d'accès que IsProjectContributor : utilisateur authentifié
+(JWT, Basic ou session) et contributeur du projet, vérifié à nouveau à
+chaque battement (EVENTS_KEEPALIVE secondes) pour fermer le flux d'un
+contributeur retiré. Un client qui se reconnecte envoie Last-Event-ID (ou
+?last_event_id=) et reçoit d'abord les événements manqués.
+"""
+import asyncio
+import io
+import re
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework import exceptions
+
+from api import events, membership
+from api.async_views import AsyncAPIView, authenticate
+
+EVENTS_PATH = re.compile(r'^/api/projects/(?P<project_id>\d+)/events/$')
+
+INVALID_LAST_EVENT_ID_MESSAGE = 'Last-Event-ID invalide'
+
+
+def get_keepalive():
+    return getattr(settings, 'EVENTS_KEEPALIVE', 15)
+
+
+async def send_response(response, send):
+    # Réponse Django complète (erreurs avant l'ouverture du flux)
+    await send({
+        'type': 'http.response.start', 'status': response.status_code,
+        'headers': [(header.encode('ascii'), value.encode('latin1'))
+                    for header, value in response.items()]})
+    await send({'type': 'http.response.body', 'body': response.content})
+
+
+def get_last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or \
+        request.GET.get('last_event_id')
+    if not value:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise exceptions.ValidationError(
+            {'last_event_id': [INVALID_LAST_EVENT_ID_MESSAGE]})
+    return value
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class EventStream:
+    """
+    Un flux ouvert : abonnement au Broker, rattrapage depuis Last-Event-ID
+    puis événements en direct jusqu'à la déconnexion du client.
+    """
+
+    def __init__(self, request, project_id, send):
+        self.request = request
+        self.project_id = project_id
+        self.send = send
+
+    async def write(self, body):
+        await self.send({'type': 'http.response.body', 'body': body,
+                         'more_body': True})
+
+    async def is_member(self):
+        # Le mémo des rôles de la requête durerait autant que le flux
+        self.request.__dict__.pop('_membership_roles', None)
+        return await membership.aget_role(
+            self.request, self.project_id) is not None
+
+    async def run(self, receive, last_id):
+        # L'abonnement précède la relecture du journal : les événements
+        # publiés entre temps attendent dans la file et les doublons sont
+        # écartés par leur identifiant.
+        subscription = events.broker.subscribe(self.project_id)
+        disconnect = asyncio.ensure_future(wait_disconnect(receive))
+        get = None
+        try:
+            await self.send({
+                'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/event-stream'),
+                            (b'cache-control', b'no-cache'),
+                            (b'x-accel-buffering', b'no')]})
+            await self.write(
+                f'retry: {getattr(settings, "EVENTS_RETRY", 3000)}\n\n'
+                .encode())
+            if last_id is not None:
+                last_id = await self.replay(last_id)
+            while True:
+                if get is None:
+                    get = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait(
+                    {get, disconnect}, timeout=get_keepalive(),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    break
+                if get in done:
+                    event, get = get.result(), None
+                    if last_id is not None and event.id <= last_id:
+                        continue
+                    await self.write(events.encode(event))
+                    last_id = event.id
+                    if subscription.overflow and subscription.queue.empty():
+                        # Événements perdus : le client reprendra au
+                        # dernier reçu
+                        break
+                elif await self.is_member():
+                    await self.write(b': keepalive\n\n')
+                else:
+                    break
+            await self.send({'type': 'http.response.body'})
+        finally:
+            events.broker.unsubscribe(subscription)
+            disconnect.cancel()
+            if get is not None:
+                get.cancel()
+
+    async def replay(self, last_id):
+        replayed, complete = await sync_to_async(events.replay)(
+            self.project_id, last_id)
+        if not complete:
+            # Trop d'événements manqués : le client doit recharger le projet
+            # puis reprendre à partir de l'identifiant de `reset`.
+            position = await sync_to_async(events.last_event_id)(
+                self.project_id)
+            replayed = [events.Event(position, self.project_id, 'reset', {})]
+        for event in replayed:
+            await self.write(events.encode(event))
+            last_id = event.id
+        return last_id
+
+
+async def stream(scope, receive, send, project_id):
+    request = ASGIRequest(scope, io.BytesIO())
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    try:
+        request.user = await authenticate(request)
+        if not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+        if await membership.aget_role(request, project_id) is None:
+            raise exceptions.PermissionDenied()
+        last_id = get_last_event_id(request)
+    except exceptions.APIException as exc:
+        await send_response(AsyncAPIView().handle_exception(exc), send)
+        return
+    await EventStream(request, project_id, send).run(receive, last_id)
+
+
+class EventStreamRouter:
+    # Application ASGI : flux d'événements, ou Django pour le reste
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = EVENTS_PATH.match(scope['path'])
+            if match:
+                await stream(scope, receive, send,
+                             int(match['project_id']))
+                return
+        await self.application(scope, receive, send)
@@ -0,0 +1,136 @@
+"""
+Synchronisation incrémentale d'un projet.
+
+Le client conserve un jeton opaque qui désigne une position dans le journal
+ChangeLog du projet. GET /api/projects/<id>/sync/?token=... renvoie les
+problèmes, commentaires et contributeurs créés ou modifiés depuis cette
+position, dans leur état actuel, et les identifiants de ceux qui ont été
+supprimés (pierres tombales), avec le jeton à présenter la fois suivante.
+
+Sans modification, la réponse est un 204 sans corps qui coûte une requête
+sur l'index (project_id, id) du journal. Le journal est purgé au-delà de
+SYNC_TOKEN_MAX_AGE (commande prune_changes) : un jeton plus ancien reçoit un
+410 et le client doit repartir d'un chargement complet.
+"""
+import base64
+import binascii
+import time
+
+from django.conf import settings
+from django.db.models import Max
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from api.models import ChangeLog, Comment, Contributor, Issue
+from api.serializers import CommentsDetailSerializer, ContributorsSerializer, \
+    IssuesDetailSerializer
+
+INVALID_TOKEN_MESSAGE = 'Jeton de synchronisation invalide'
+
+# Clé de la réponse, serializer et objets actuels du projet pour chaque type
+# d'objet du journal
+KINDS = {
+    ChangeLog.ISSUE: (
+        'issues', IssuesDetailSerializer,
+        lambda project_id: Issue.objects.filter(
+            project_id=project_id, deleted_time__isnull=True).select_related(
+            'author_user_id', 'assigned')),
+    ChangeLog.COMMENT: (
+        'comments', CommentsDetailSerializer,
+        lambda project_id: Comment.objects.filter(
+            issue_id__project_id=project_id,
+            issue_id__deleted_time__isnull=True).select_related(
+            'author_user_id')),
+    ChangeLog.CONTRIBUTOR: (
+        'contributors', ContributorsSerializer,
+        lambda project_id: Contributor.objects.filter(
+            project_id=project_id).select_related('user_id')),
+}
+
+
+class TokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Jeton de synchronisation expiré, rechargez le projet.'
+    default_code = 'sync_token_expired'
+
+
+def get_page_size():
+    return getattr(settings, 'SYNC_PAGE_SIZE', 500)
+
+
+def get_max_age():
+    return getattr(settings, 'SYNC_TOKEN_MAX_AGE', 30 * 24 * 3600)
+
+
+def encode_token(project_id, seq, issued=None):
+    issued = int(time.time() if issued is None else issued)
+    raw = f'{project_id}|{seq}|{issued}'
+    return base64.urlsafe_b64encode(raw.encode()).decode('ascii')
+
+
+def decode_token(project_id, token):
+    # (séquence, date d'émission) ; le jeton doit venir du même projet
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode()
+        project, seq, issued = (int(part) for part in raw.split('|'))
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise serializers.ValidationError({'token': [INVALID_TOKEN_MESSAGE]})
+    if project != int(project_id) or seq < 0:
+        raise serializers.ValidationError({'token': [INVALID_TOKEN_MESSAGE]})
+    if issued < time.time() - get_max_age():
+        raise TokenExpired()
+    return seq, issued
+
+
+def current_token(project_id):
+    seq = ChangeLog.objects.filter(project_id=project_id).aggregate(
+        seq=Max('id'))['seq']
+    return encode_token(project_id, seq or 0)
+
+
+def fetch(project_id, model, object_ids, context=None):
+    """
+    État actuel des objets `object_ids` du projet, sérialisés : {id: données}
+    en une requête. Les objets supprimés sont absents du résultat.
+    """
+    key, serializer_class, queryset = KINDS[model]
+    objects = queryset(project_id).in_bulk(list(object_ids))
+    found = [pk for pk in object_ids if pk in objects]
+    rows = serializer_class([objects[pk] for pk in found], many=True,
+                            context=context or {}).data
+    return dict(zip(found, rows))
+
+
+def changes_since(project_id, seq, issued, context=None):
+    """
+    Modifications postérieures à `seq`, au plus SYNC_PAGE_SIZE entrées du
+    journal. Renvoie None s'il n'y en a aucune.
+    """
+    page_size = get_page_size()
+    entries = list(ChangeLog.objects.filter(
+        project_id=project_id, id__gt=seq).order_by('id').values_list(
+        'id', 'model', 'object_id')[:page_size + 1])
+    if not entries:
+        return None
+    has_more = len(entries) > page_size
+    entries = entries[:page_size]
+
+    # Un objet modifié plusieurs fois n'est relu qu'une fois
+    changed = {model: {} for model in KINDS}
+    for _, model, object_id in entries:
+        changed[model][object_id] = None
+
+    data, deleted = {}, {}
+    for model, (key, _, _) in KINDS.items():
+        data[key], deleted[key] = [], []
+        if not changed[model]:
+            continue
+        rows = fetch(project_id, model, list(changed[model]), context)
+        data[key] = list(rows.values())
+        deleted[key] = [pk for pk in changed[model] if pk not in rows]
+
+    # Une page incomplète garde la date d'émission du jeton reçu : les
+    # entrées suivantes peuvent être aussi anciennes que lui.
+    token = encode_token(project_id, entries[-1][0],
+                         issued if has_more else None)
+    return {'token': token, 'has_more': has_more, **data, 'deleted': deleted}
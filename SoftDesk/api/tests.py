@@ -1,3 +1,2264 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started
+from django.db import OperationalError, connection, connections, \
+    transaction
+from django.test import AsyncClient, RequestFactory, TestCase, \
+    override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import authentication, benchmark, caching, deletion, events, \
+    export, hashing, membership, profiling, routing, search, sync, views
+from api.models import Contributor, Project, Issue, Comment, ChangeLog, \
+    DeletionJob, ProjectStatistics
+from api.serializers import (
+    UserSerializer,
+    IssuesListSerializer,
+    IssuesListProjectionSerializer,
+    CommentsListSerializer,
+    CommentsListProjectionSerializer,
+)
+from api.profiling import query_budget
+from api.sse import EventStreamRouter
+from api.utils import BoundedCache
+
+
+class ApiTestCase(TestCase):
+    """
+    Jeu de données commun : un utilisateur authentifié, propriétaire d'un
+    projet contenant un problème et un commentaire.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='jean-luc@gmail.com', email='jean-luc@gmail.com',
+            password='password', first_name='Jean', last_name='Luc')
+        cls.other = User.objects.create_user(
+            username='jean-marc@gmail.com', email='jean-marc@gmail.com',
+            password='password', first_name='Jean', last_name='Marc')
+        cls.project = cls.create_project(cls.user)
+        cls.issue = Issue.objects.create(
+            title='Probléme', description='Description', tag=Issue.BUG,
+            priority=Issue.ELEVEE, status=Issue.A_FAIRE,
+            project_id=cls.project, author_user_id=cls.user,
+            assigned=cls.other)
+        cls.comment = Comment.objects.create(
+            description='Commentaire', author_user_id=cls.user,
+            issue_id=cls.issue)
+
+    @staticmethod
+    def create_project(user, title='Projet'):
+        project = Project.objects.create(
+            title=title, description='Description', type=Project.BACK_END,
+            author_user_id=user)
+        Contributor.objects.create(user_id=user, project_id=project,
+                                   role=Contributor.CREATOR)
+        return project
+
+    def setUp(self):
+        membership.clear()
+        authentication.clear()
+        caching.get_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class ProjectsQueryBudgetTests(ApiTestCase):
+
+    def test_list_query_count_does_not_depend_on_memberships(self):
+        url = reverse('projects-list')
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+        for index in range(50):
+            project = self.create_project(self.other, f'Projet {index}')
+            Contributor.objects.create(user_id=self.user, project_id=project,
+                                       role=Contributor.CONTRIBUTOR)
+
+        # Le marqueur de version (ETag), une requête COUNT pour la
+        # pagination et une requête pour la page.
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.data['count'], 51)
+        self.assertEqual(response.data['results'][1]['author_name'],
+                         'Jean Marc')
+
+    def test_detail_query_count_is_constant(self):
+        url = reverse('projects-detail', kwargs={'pk': self.project.pk})
+        # Le marqueur de version (ETag) puis le projet et son auteur.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['author_name'], 'Jean Luc')
+
+    def test_list_hides_projects_without_membership(self):
+        self.create_project(self.other, 'Projet privé')
+        response = self.client.get(reverse('projects-list'))
+        self.assertEqual([p['project_id'] for p in response.data['results']],
+                         [self.project.pk])
+
+
+class MembershipCacheTests(ApiTestCase):
+
+    def test_role_is_resolved_once_across_requests(self):
+        url = reverse('project-issues-list',
+                      kwargs={'project_id': self.project.pk})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'api_contributor' in query['sql']])
+
+    def test_cache_is_invalidated_when_contributor_is_added(self):
+        url = reverse('project-issues-list',
+                      kwargs={'project_id': self.project.pk})
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        self.assertEqual(other_client.get(url).status_code, 403)
+
+        response = self.client.post(
+            reverse('project-contributors-list',
+                    kwargs={'project_id': self.project.pk}),
+            {'user_id': self.other.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(other_client.get(url).status_code, 200)
+
+        self.client.delete(
+            reverse('project-contributors-detail',
+                    kwargs={'project_id': self.project.pk,
+                            'pk': response.data['contributor_id']}))
+        self.assertEqual(other_client.get(url).status_code, 403)
+
+    def test_only_creator_can_manage_contributors(self):
+        Contributor.objects.create(user_id=self.other, project_id=self.project,
+                                   role=Contributor.CONTRIBUTOR)
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        url = reverse('project-contributors-list',
+                      kwargs={'project_id': self.project.pk})
+        self.assertEqual(other_client.get(url).status_code, 200)
+        self.assertEqual(
+            other_client.post(url, {'user_id': self.other.pk}).status_code,
+            403)
+
+    def test_roles_are_shared_through_cache_framework(self):
+        # Un autre processus ne partage que le cache MEMBERSHIP_CACHE : les
+        # rôles et leur invalidation doivent y être conservés.
+        url = reverse('project-issues-list',
+                      kwargs={'project_id': self.project.pk})
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        contributor = Contributor.objects.create(
+            user_id=self.other, project_id=self.project,
+            role=Contributor.CONTRIBUTOR)
+        self.assertEqual(other_client.get(url).status_code, 200)
+        cache = membership.get_cache()
+        self.assertEqual(cache.get(membership._role_key(
+            (self.other.pk, self.project.pk))), Contributor.CONTRIBUTOR)
+
+        Contributor.objects.filter(pk=contributor.pk).delete()
+        membership.invalidate(self.other.pk, self.project.pk)
+        self.assertEqual(other_client.get(url).status_code, 403)
+        Contributor.objects.create(user_id=self.other, project_id=self.project,
+                                   role=Contributor.CONTRIBUTOR)
+        membership.invalidate_project(self.project.pk)
+        self.assertEqual(other_client.get(url).status_code, 200)
+
+    def test_cache_is_bounded(self):
+        cache = BoundedCache(max_entries=2)
+        for key in range(3):
+            cache.set(key, key)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(2), 2)
+
+
+class CursorPaginationTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('project-issues-list',
+                           kwargs={'project_id': self.project.pk})
+        created_time = self.issue.created_time
+        for index in range(6):
+            Issue.objects.create(
+                title=f'Probléme {index}', description='Description',
+                tag=Issue.BUG, priority=Issue.FAIBLE, status=Issue.A_FAIRE,
+                project_id=self.project, author_user_id=self.user,
+                assigned=self.user)
+        # Dates identiques pour vérifier le départage par id.
+        Issue.objects.filter(project_id=self.project).update(
+            created_time=created_time)
+
+    def test_pages_cover_every_issue_once_without_count(self):
+        seen = []
+        url = self.url + '?pagination=cursor&limit=3'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            self.assertFalse([query for query in queries.captured_queries
+                              if 'COUNT(' in query['sql']])
+            seen += [issue['issue_id'] for issue in response.data['results']]
+            url = response.data['next']
+        expected = list(Issue.objects.filter(
+            project_id=self.project).order_by('id').values_list(
+            'id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(self.url + '?pagination=cursor&limit=3')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url + '?cursor=invalide')
+        self.assertEqual(response.status_code, 404)
+
+    def test_default_pagination_is_unchanged(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 7)
+
+
+class QueryPlanAssertions:
+    """
+    Vérifie avec EXPLAIN QUERY PLAN que les requêtes passent par un index
+    plutôt que par un parcours complet de table.
+    """
+
+    def assertQueriesUseIndexes(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
+        for query in queries.captured_queries:
+            self.assertSqlUsesIndexes(query['sql'])
+        return response
+
+    def assertSqlUsesIndexes(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        for step in plan:
+            if step.startswith('SCAN') and 'USING' not in step:
+                self.fail(f'Parcours complet ({step}) pour : {sql}')
+            self.assertNotIn('TEMP B-TREE', step, sql)
+
+
+class IndexUsageTests(QueryPlanAssertions, ApiTestCase):
+
+    def test_endpoints_use_indexes(self):
+        urls = [
+            reverse('projects-list'),
+            reverse('projects-detail', kwargs={'pk': self.project.pk}),
+            reverse('project-contributors-list',
+                    kwargs={'project_id': self.project.pk}),
+            reverse('project-issues-list',
+                    kwargs={'project_id': self.project.pk}),
+            reverse('project-issues-detail',
+                    kwargs={'project_id': self.project.pk,
+                            'pk': self.issue.pk}),
+            reverse('issue-comments-list',
+                    kwargs={'project_id': self.project.pk,
+                            'issue_id': self.issue.pk}),
+            reverse('issue-comments-detail',
+                    kwargs={'project_id': self.project.pk,
+                            'issue_id': self.issue.pk,
+                            'pk': self.comment.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                membership.clear()
+                self.assertQueriesUseIndexes(url)
+
+    def test_signup_email_lookup_uses_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.filter(email='jean-luc@gmail.com').exists()
+        self.assertSqlUsesIndexes(queries.captured_queries[0]['sql'])
+
+
+class ContributorUniquenessTests(ApiTestCase):
+
+    def test_duplicate_contributor_is_rejected(self):
+        url = reverse('project-contributors-list',
+                      kwargs={'project_id': self.project.pk})
+        response = self.client.post(url, {'user_id': self.user.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['user_id'],
+                         ['User déjà présent dans les contributeurs'])
+        self.assertEqual(Contributor.objects.filter(
+            project_id=self.project).count(), 1)
+
+
+class IssuesBulkTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('project-issues-bulk',
+                           kwargs={'project_id': self.project.pk})
+
+    def issue_payload(self, index):
+        return {'title': f'Import {index}', 'description': 'Description',
+                'tag': Issue.TACHE, 'priority': Issue.MOYENNE,
+                'status': Issue.A_FAIRE, 'assigned': self.other.pk}
+
+    def test_bulk_create_uses_constant_queries(self):
+        payload = [self.issue_payload(index) for index in range(100)]
+        # Rôle, utilisateurs assignés, puis l'insertion groupée, la mise à
+        # jour des compteurs, le journal de synchronisation et la version du
+        # projet, encadrés par le SAVEPOINT de la transaction. SQLite limite
+        # une requête à 999 paramètres : 100 problèmes de 10 colonnes font
+        # deux INSERT.
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 100)
+        self.assertEqual(response.data[0]['assigned_name'], 'Jean Marc')
+        self.assertEqual(Issue.objects.filter(
+            project_id=self.project).count(), 101)
+
+    def test_bulk_create_reports_errors_per_item(self):
+        payload = [self.issue_payload(0), self.issue_payload(1),
+                   self.issue_payload(2)]
+        payload[1]['status'] = 'XX'
+        payload[2]['assigned'] = 9999
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('status', response.data[1])
+        self.assertIn('assigned', response.data[2])
+        self.assertEqual(Issue.objects.count(), 1)
+
+    def test_bulk_partial_update(self):
+        other_issue = Issue.objects.create(
+            title='Autre', description='Description', tag=Issue.BUG,
+            priority=Issue.FAIBLE, status=Issue.A_FAIRE,
+            project_id=self.project, author_user_id=self.other,
+            assigned=self.other)
+        response = self.client.patch(
+            self.url, [{'issue_id': self.issue.pk, 'status': Issue.TERMINE},
+                       {'issue_id': other_issue.pk, 'status': Issue.TERMINE}],
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('non_field_errors', response.data[1])
+
+        response = self.client.patch(
+            self.url, [{'issue_id': self.issue.pk, 'status': Issue.TERMINE,
+                        'assigned': self.user.pk}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['status'], Issue.TERMINE)
+        self.issue.refresh_from_db()
+        self.assertEqual(self.issue.status, Issue.TERMINE)
+        self.assertEqual(self.issue.assigned, self.user)
+        self.assertEqual(self.issue.title, 'Probléme')
+
+    def test_bulk_reports_non_object_items(self):
+        response = self.client.post(self.url, [self.issue_payload(0), 'x'],
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('non_field_errors', response.data[1])
+
+        response = self.client.patch(
+            self.url, [['x'], {'issue_id': True, 'status': Issue.TERMINE}],
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.data[0])
+        self.assertIn('issue_id', response.data[1])
+        self.issue.refresh_from_db()
+        self.assertEqual(self.issue.status, Issue.A_FAIRE)
+
+    def test_bulk_rejects_non_list_payload(self):
+        response = self.client.post(self.url, self.issue_payload(0),
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ContributorsBulkTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('project-contributors-bulk',
+                           kwargs={'project_id': self.project.pk})
+        self.team = User.objects.bulk_create(
+            [User(username=f'membre{index}@gmail.com')
+             for index in range(30)])
+
+    def test_bulk_add_skips_existing_members(self):
+        user_ids = [user.pk for user in self.team] + [self.user.pk]
+        # Dont la relecture des contributeurs ajoutés et leur inscription
+        # au journal de synchronisation
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, {'user_ids': user_ids},
+                                        format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['added']), 30)
+        self.assertEqual(response.data['skipped'], [self.user.pk])
+        self.assertEqual(Contributor.objects.filter(
+            project_id=self.project).count(), 31)
+
+    def test_bulk_add_rejects_unknown_users(self):
+        response = self.client.post(self.url, {'user_ids': [9999]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Contributor.objects.filter(
+            project_id=self.project).count(), 1)
+
+    def test_bulk_remove_refuses_creator(self):
+        user_ids = [user.pk for user in self.team]
+        self.client.post(self.url, {'user_ids': user_ids}, format='json')
+
+        response = self.client.delete(
+            self.url, {'user_ids': user_ids + [self.user.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Contributor.objects.filter(
+            project_id=self.project).count(), 31)
+
+        response = self.client.delete(self.url, {'user_ids': user_ids},
+                                      format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['removed']), 30)
+        self.assertEqual(Contributor.objects.filter(
+            project_id=self.project).count(), 1)
+
+
+class ConditionalGetTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('project-issues-list',
+                           kwargs={'project_id': self.project.pk})
+
+    def test_unchanged_list_returns_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        # Seule la lecture du marqueur de version est exécutée.
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_write_in_the_same_second_is_not_hidden(self):
+        response = self.client.get(self.url)
+        last_modified = response['Last-Modified']
+        # Écriture dans la seconde de Last-Modified
+        updated_time = Project.objects.get(pk=self.project.pk).updated_time
+        self.issue.title = 'Modifié'
+        self.issue.save()
+        Project.objects.filter(pk=self.project.pk).update(
+            updated_time=updated_time.replace(microsecond=999999))
+        response = self.client.get(self.url,
+                                   HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], last_modified)
+        self.assertEqual(response.data['results'][0]['title'], 'Modifié')
+
+    def test_etag_changes_with_issues_comments_and_contributors(self):
+        etags = [self.client.get(self.url)['ETag']]
+
+        self.comment.description = 'Modifié'
+        self.comment.save()
+        etags.append(self.client.get(self.url)['ETag'])
+
+        Contributor.objects.create(user_id=self.other,
+                                   project_id=self.project,
+                                   role=Contributor.CONTRIBUTOR)
+        etags.append(self.client.get(self.url)['ETag'])
+
+        self.issue.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[-1])
+        self.assertEqual(response.status_code, 200)
+        etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+
+    def test_project_list_etag_follows_memberships(self):
+        url = reverse('projects-list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        project = self.create_project(self.other, 'Autre projet')
+        Contributor.objects.create(user_id=self.user, project_id=project,
+                                   role=Contributor.CONTRIBUTOR)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_project_update_changes_detail_etag(self):
+        url = reverse('projects-detail', kwargs={'pk': self.project.pk})
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'title': 'Nouveau titre'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Nouveau titre')
+
+
+class ResponseCacheTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        caching.reset_stats()
+        self.url = reverse('project-issues-list',
+                           kwargs={'project_id': self.project.pk})
+
+    def test_cached_list_skips_view_queries(self):
+        first = self.client.get(self.url)
+        # Seule la lecture de la version du projet reste.
+        with self.assertNumQueries(1):
+            second = self.client.get(self.url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(caching.get_stats()['hits'], 1)
+        self.assertEqual(caching.get_stats()['misses'], 1)
+
+    def test_query_parameters_are_part_of_the_key(self):
+        self.client.get(self.url)
+        self.client.get(self.url + '?limit=1')
+        self.assertEqual(caching.get_stats()['misses'], 2)
+
+    def test_write_through_viewset_invalidates(self):
+        self.client.get(self.url)
+        response = self.client.post(self.url, {
+            'title': 'Nouveau', 'description': 'Description',
+            'tag': Issue.BUG, 'priority': Issue.FAIBLE,
+            'status': Issue.A_FAIRE, 'assigned': self.user.pk})
+        self.assertEqual(response.status_code, 201)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(caching.get_stats()['misses'], 2)
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+                'OPTIONS': {'MAX_ENTRIES': 10},
+            }
+            with self.settings(CACHES={'default': backend, 'api': backend}):
+                self.client.get(self.url)
+                response = self.client.get(self.url)
+                self.assertEqual(response.data['count'], 1)
+                self.assertEqual(caching.get_stats()['hits'], 1)
+
+    def test_stats_endpoint_is_restricted_to_staff(self):
+        url = reverse('response-cache-stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(url).data['hits'], 0)
+
+
+class ProjectionSerializerTests(ApiTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        users = [cls.user, cls.other] + User.objects.bulk_create([
+            User(username='sans-nom@gmail.com'),
+            User(username='eloise@gmail.com', first_name='Éloïse',
+                 last_name=''),
+        ])
+        # Dates de part et d'autre du passage à l'heure d'été à Paris.
+        start = datetime(2023, 3, 25, 23, 58, 30, tzinfo=dt_timezone.utc)
+        issues = []
+        for index in range(200):
+            issues.append(Issue(
+                title=f'Probléme "{index}"', description='Description',
+                tag=Issue.TAGS[index % 3][0],
+                priority=Issue.PRIORITIES[index % 3][0],
+                status=Issue.STATUS[(index // 3) % 3][0],
+                project_id=cls.project,
+                author_user_id=users[index % len(users)],
+                assigned=users[(index + 1) % len(users)]))
+        Issue.objects.bulk_create(issues)
+        issues = list(Issue.objects.filter(project_id=cls.project))
+        for index, issue in enumerate(issues):
+            issue.created_time = start + timedelta(seconds=37 * index)
+        Issue.objects.bulk_update(issues, ['created_time'])
+        Comment.objects.bulk_create([
+            Comment(description=f'Commentaire {index}', issue_id=cls.issue,
+                    author_user_id=users[index % len(users)])
+            for index in range(200)])
+
+    def render_both(self, queryset, serializer, projection):
+        slow = JSONRenderer().render(serializer(queryset, many=True).data)
+        fast = JSONRenderer().render(
+            projection(projection.project(queryset), many=True).data)
+        return slow, fast
+
+    def test_issue_list_output_is_byte_identical(self):
+        queryset = Issue.objects.filter(project_id=self.project).order_by(
+            'created_time', 'id')
+        slow, fast = self.render_both(queryset, IssuesListSerializer,
+                                      IssuesListProjectionSerializer)
+        self.assertEqual(fast, slow)
+
+    def test_comment_list_output_is_byte_identical(self):
+        queryset = Comment.objects.filter(issue_id=self.issue).order_by(
+            'created_time', 'id')
+        slow, fast = self.render_both(queryset, CommentsListSerializer,
+                                      CommentsListProjectionSerializer)
+        self.assertEqual(fast, slow)
+
+    @unittest.skipUnless(os.environ.get('SOFTDESK_TIMING_TESTS') == '1',
+                         'mesure de temps, à la demande : '
+                         'SOFTDESK_TIMING_TESTS=1')
+    def test_projection_is_faster(self):
+        # Micro-benchmark : meilleur temps sur plusieurs passes, requêtes
+        # comprises. Sensible à la charge de la machine, il ne fait pas
+        # partie de la suite par défaut.
+        queryset = Issue.objects.filter(project_id=self.project)
+
+        def best_time(serialize):
+            timings = []
+            for _ in range(5):
+                start = time.perf_counter()
+                serialize()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        slow = best_time(lambda: IssuesListSerializer(
+            queryset.all(), many=True).data)
+        fast = best_time(lambda: IssuesListProjectionSerializer(
+            IssuesListProjectionSerializer.project(queryset.all()),
+            many=True).data)
+        self.assertLess(fast * 3, slow)
+
+
+class ExportTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('projects-export', kwargs={'pk': self.project.pk})
+        second = Issue.objects.create(
+            title='Second, "guillemets"', description='Ligne\nsuivante',
+            tag=Issue.TACHE, priority=Issue.FAIBLE, status=Issue.EN_COURS,
+            project_id=self.project, author_user_id=self.other,
+            assigned=self.user)
+        Comment.objects.create(description='Réponse', issue_id=second,
+                               author_user_id=self.other)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_with_comments(self):
+        response = self.client.get(self.url + '?comments=true')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line)
+                 for line in self.read(response).splitlines()]
+        self.assertEqual([line['issue_id'] for line in lines],
+                         [self.issue.pk, self.issue.pk + 1])
+        self.assertEqual(lines[0]['comments'][0]['comment_id'],
+                         self.comment.pk)
+        self.assertEqual(lines[1]['comments'][0]['description'], 'Réponse')
+
+    def test_csv_without_comments(self):
+        response = self.client.get(self.url + '?output=csv')
+        rows = list(csv.reader(io.StringIO(self.read(response))))
+        self.assertEqual(rows[0][0], 'record')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[2][3], 'Second, "guillemets"')
+        self.assertEqual(rows[2][4], 'Ligne\nsuivante')
+
+    def test_csv_with_comments(self):
+        response = self.client.get(self.url + '?output=csv&comments=1')
+        records = [row[0] for row in
+                   csv.reader(io.StringIO(self.read(response)))]
+        self.assertEqual(records, ['record', 'issue', 'comment', 'issue',
+                                   'comment'])
+
+    async def test_asgi_export_is_read_in_the_view_thread(self):
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        response = await AsyncClient().get(
+            self.url, {'comments': 'true'}, authorization=f'Bearer {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'],
+                         f'attachment; filename="project-{self.project.pk}'
+                         f'.ndjson"')
+        # Lu dans la boucle d'événements, comme le fait ASGIHandler : une
+        # requête à la base lèverait SynchronousOnlyOperation.
+        content = self.read(response)
+        self.assertEqual(int(response['Content-Length']),
+                         len(content.encode()))
+        self.assertEqual(content, await sync_to_async(
+            lambda: self.read(self.client.get(self.url + '?comments=true'))
+        )())
+
+    def test_export_requires_membership(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        self.assertEqual(client.get(self.url).status_code, 404)
+
+    def test_invalid_output(self):
+        response = self.client.get(self.url + '?output=xml')
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('search')
+        self.private = self.create_project(self.other, 'Projet privé')
+        Issue.objects.create(
+            title='Fuite mémoire', description='Serveur privé',
+            tag=Issue.BUG, priority=Issue.ELEVEE, status=Issue.A_FAIRE,
+            project_id=self.private, author_user_id=self.other,
+            assigned=self.other)
+
+    def search(self, text, **params):
+        response = self.client.get(self.url, {'q': text, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_finds_issues_and_comments_of_own_projects(self):
+        self.issue.title = 'Fuite mémoire au démarrage'
+        self.issue.save()
+        Comment.objects.create(description='La fuite vient du cache',
+                               author_user_id=self.user, issue_id=self.issue)
+        results = self.search('fuite')['results']
+        self.assertEqual({(r['type'], r['project_id']) for r in results},
+                         {('issue', self.project.pk),
+                          ('comment', self.project.pk)})
+        # Le titre pèse plus que le corps du texte.
+        self.assertEqual(results[0]['type'], 'issue')
+
+    def test_index_follows_updates_and_deletes(self):
+        self.assertEqual(self.search('commentaire')['results'][0]['id'],
+                         self.comment.pk)
+        self.comment.description = 'Texte remplacé'
+        self.comment.save()
+        self.assertEqual(self.search('commentaire')['results'], [])
+        self.assertEqual(len(self.search('remplace')['results']), 1)
+        self.issue.delete()
+        self.assertEqual(self.search('remplace')['results'], [])
+
+    def test_prefix_accents_and_pagination(self):
+        Issue.objects.bulk_create([Issue(
+            title=f'Problème réseau {index}', description='Description',
+            tag=Issue.BUG, priority=Issue.FAIBLE, status=Issue.A_FAIRE,
+            project_id=self.project, author_user_id=self.user,
+            assigned=self.user) for index in range(3)])
+        data = self.search('reseau', limit=2)
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNotNone(data['next'])
+        self.assertEqual(len(self.client.get(data['next']).data['results']),
+                         1)
+        self.assertEqual(len(self.search('rés')['results']), 3)
+
+    def test_hidden_issue_leaves_the_index(self):
+        self.assertEqual(len(self.search('commentaire')['results']), 1)
+        deletion.delete_issue(self.issue, self.user)
+        self.assertEqual(self.search('commentaire')['results'], [])
+        self.assertEqual(self.search('probleme')['results'], [])
+
+    def test_many_projects_are_filtered_after_match(self):
+        projects = [self.project] + [
+            self.create_project(self.user, f'Projet {index}')
+            for index in range(3)]
+        issues = Issue.objects.bulk_create([Issue(
+            title='Réseau' if index % 2 else 'Autre',
+            description='Réseau lent', tag=Issue.BUG,
+            priority=Issue.FAIBLE, status=Issue.A_FAIRE,
+            project_id=project, author_user_id=self.user,
+            assigned=self.user)
+            for index, project in enumerate(projects)])
+        # Projets dans la requête MATCH, puis filtrés après MATCH : même
+        # classement, titre d'abord, puis les plus récents
+        for scope_projects in (100, 1):
+            with self.settings(SEARCH_SCOPE_PROJECTS=scope_projects):
+                results = self.search('reseau')['results']
+                self.assertEqual([r['id'] for r in results],
+                                 [issues[3].pk, issues[1].pk, issues[2].pk,
+                                  issues[0].pk])
+                data = self.search('reseau', limit=2, offset=1)
+                self.assertEqual([r['id'] for r in data['results']],
+                                 [issues[1].pk, issues[2].pk])
+
+    def test_whole_match_set_is_ranked(self):
+        # Une correspondance ancienne et pertinente passe devant de
+        # nombreuses correspondances récentes
+        Issue.objects.bulk_create([Issue(
+            title=f'Autre {index}', description='Lenteur du réseau interne',
+            tag=Issue.BUG, priority=Issue.FAIBLE, status=Issue.A_FAIRE,
+            project_id=self.project, author_user_id=self.user,
+            assigned=self.user) for index in range(250)])
+        self.issue.title = 'Réseau'
+        self.issue.save()
+        data = self.search('reseau', limit=20, offset=240)
+        self.assertEqual(len(data['results']), 11)
+        self.assertIsNone(data['next'])
+        self.assertEqual(self.search('reseau')['results'][0]['id'],
+                         self.issue.pk)
+
+    def test_query_syntax_is_neutralised(self):
+        self.assertEqual(self.search('"OR NEAR(*')['results'], [])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_database_backend(self):
+        with self.settings(SEARCH_BACKEND='api.search.DatabaseSearchBackend'):
+            search.get_backend.cache_clear()
+            self.addCleanup(search.get_backend.cache_clear)
+            results = self.search('Commentaire')['results']
+        self.assertEqual([(r['type'], r['id']) for r in results],
+                         [('comment', self.comment.pk)])
+
+
+class IssueFilterTests(QueryPlanAssertions, ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('project-issues-list',
+                           kwargs={'project_id': self.project.pk})
+        Issue.objects.bulk_create([
+            Issue(title=f'Probléme {index}', description='Description',
+                  tag=tag, priority=priority, status=status,
+                  project_id=self.project, author_user_id=self.user,
+                  assigned=self.user)
+            for index, (tag, priority, status) in enumerate([
+                (Issue.TACHE, Issue.FAIBLE, Issue.EN_COURS),
+                (Issue.TACHE, Issue.MOYENNE, Issue.TERMINE),
+                (Issue.AMELIORATION, Issue.FAIBLE, Issue.EN_COURS),
+            ])])
+
+    def titles(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [issue['title'] for issue in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.titles(status='EC'),
+                         ['Probléme 0', 'Probléme 2'])
+        self.assertEqual(self.titles(status='EC,TR', tag='TA'),
+                         ['Probléme 0', 'Probléme 1'])
+        self.assertEqual(self.titles(assigned=self.other.pk), ['Probléme'])
+        self.assertEqual(self.titles(priority='MO'), ['Probléme 1'])
+
+    def test_created_time_range(self):
+        Issue.objects.filter(title='Probléme').update(
+            created_time=datetime(2023, 1, 15, 12, tzinfo=dt_timezone.utc))
+        self.assertEqual(self.titles(created_before='2023-01-15'),
+                         ['Probléme'])
+        self.assertEqual(len(self.titles(created_after='2023-01-16')), 3)
+        self.assertEqual(
+            self.titles(created_after='2023-01-15T14:00:00+01:00'),
+            self.titles(created_after='2023-01-16'))
+
+    def test_invalid_values_are_rejected(self):
+        for params in ({'status': 'XX'}, {'assigned': 'abc'},
+                       {'created_after': 'hier'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.data)
+
+    def test_facets_use_a_single_aggregate_query(self):
+        response = self.client.get(self.url, {'facets': 'true'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'facets': 'true',
+                                                  'tag': 'TA', 'limit': 5})
+        facets = response.data['facets']
+        self.assertEqual(
+            {facet['value']: facet['count'] for facet in facets['status']},
+            {'AF': 0, 'EC': 1, 'TR': 1})
+        self.assertEqual(facets['tag'][2],
+                         {'value': 'TA', 'label': 'Tâche', 'count': 2})
+        # Version du projet, COUNT et page de la pagination, agrégat.
+        self.assertEqual(len(queries.captured_queries), 4)
+
+    def test_filters_use_indexes(self):
+        for params in ('status=EC', 'priority=FA', 'tag=TA',
+                       f'assigned={self.user.pk}'):
+            with self.subTest(params=params):
+                caching.get_cache().clear()
+                self.assertQueriesUseIndexes(f'{self.url}?{params}')
+
+
+class ProjectStatisticsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('projects-statistics',
+                           kwargs={'pk': self.project.pk})
+        self.issues_url = reverse('project-issues-list',
+                                  kwargs={'project_id': self.project.pk})
+
+    def counts(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        counts = {'issues': data['issues'], 'comments': data['comments']}
+        for field in Issue.COUNTED_FIELDS:
+            counts.update({f'{field}_{facet["value"]}': facet['count']
+                           for facet in data[field] if facet['count']})
+        return counts
+
+    def assertCountersMatchTables(self):
+        self.assertEqual(
+            ProjectStatistics.objects.get(pk=self.project.pk).counters(),
+            ProjectStatistics.compute(self.project.pk))
+
+    def test_endpoint_reads_the_counter_row(self):
+        self.counts()
+        with self.assertNumQueries(1):
+            # Le rôle de l'utilisateur est en cache : seule la ligne de
+            # compteurs est lue.
+            self.counts()
+        self.assertEqual(self.counts(), {
+            'issues': 1, 'comments': 1, 'status_AF': 1, 'priority_EL': 1,
+            'tag_BG': 1})
+
+    def test_counters_follow_writes(self):
+        response = self.client.post(self.issues_url, {
+            'title': 'Nouveau', 'description': 'Description', 'tag': 'TA',
+            'priority': 'FA', 'status': 'EC', 'assigned': self.user.pk})
+        self.assertEqual(response.status_code, 201, response.data)
+        issue_id = response.data['issue_id']
+        response = self.client.put(
+            reverse('project-issues-detail',
+                    kwargs={'project_id': self.project.pk, 'pk': issue_id}),
+            {'title': 'Nouveau', 'description': 'Description', 'tag': 'TA',
+             'priority': 'FA', 'status': 'TR', 'assigned': self.user.pk})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.client.post(
+            reverse('issue-comments-list',
+                    kwargs={'project_id': self.project.pk,
+                            'issue_id': issue_id}),
+            {'description': 'Commentaire'})
+        self.assertEqual(self.counts(), {
+            'issues': 2, 'comments': 2, 'status_AF': 1, 'status_TR': 1,
+            'priority_EL': 1, 'priority_FA': 1, 'tag_BG': 1, 'tag_TA': 1})
+
+        self.client.delete(
+            reverse('project-issues-detail',
+                    kwargs={'project_id': self.project.pk, 'pk': issue_id}))
+        self.assertEqual(self.counts(), {
+            'issues': 1, 'comments': 1, 'status_AF': 1, 'priority_EL': 1,
+            'tag_BG': 1})
+        self.comment.delete()
+        self.assertCountersMatchTables()
+
+    def test_bulk_writes_apply_deltas(self):
+        url = reverse('project-issues-bulk',
+                      kwargs={'project_id': self.project.pk})
+        response = self.client.post(url, [
+            {'title': f'Lot {index}', 'description': 'Description',
+             'tag': 'AM', 'priority': 'MO', 'status': 'AF',
+             'assigned': self.user.pk} for index in range(5)], format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.client.patch(url, [
+            {'issue_id': issue['issue_id'], 'status': 'EC'}
+            for issue in response.data[:2]], format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.counts()['status_EC'], 2)
+        self.assertCountersMatchTables()
+
+    def test_stale_instances_keep_counters_exact(self):
+        # Deux requêtes chargent le même problème puis changent son statut
+        first = Issue.objects.get(pk=self.issue.pk)
+        second = Issue.objects.get(pk=self.issue.pk)
+        first.status = Issue.EN_COURS
+        first.save()
+        second.status = Issue.TERMINE
+        second.save()
+        self.assertCountersMatchTables()
+        self.assertEqual(self.counts()['status_TR'], 1)
+        deletion.delete_issue(first, self.user)
+        self.assertCountersMatchTables()
+
+    def test_bulk_patch_reads_counted_values_in_transaction(self):
+        url = reverse('project-issues-bulk',
+                      kwargs={'project_id': self.project.pk})
+        load = views.IssuesViewSet.get_bulk_instances
+
+        def stale(viewset, items):
+            # Statut modifié par une autre requête après le chargement
+            instances = load(viewset, items)
+            concurrent = Issue.objects.get(pk=self.issue.pk)
+            concurrent.status = Issue.EN_COURS
+            concurrent.save()
+            return instances
+
+        with unittest.mock.patch.object(views.IssuesViewSet,
+                                        'get_bulk_instances', stale):
+            response = self.client.patch(url, [
+                {'issue_id': self.issue.pk, 'status': Issue.TERMINE}],
+                format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertCountersMatchTables()
+        response = self.client.patch(url, [
+            {'issue_id': self.issue.pk, 'priority': Issue.FAIBLE}],
+            format='json')
+        # Les champs absents du lot gardent leur valeur en base
+        self.assertEqual(response.data[0]['status'], Issue.TERMINE)
+        self.assertCountersMatchTables()
+
+    def test_missing_row_is_rebuilt(self):
+        ProjectStatistics.objects.all().delete()
+        self.assertEqual(self.counts()['issues'], 1)
+        ProjectStatistics.objects.all().delete()
+        Issue.objects.create(
+            title='Autre', description='Description', tag=Issue.TACHE,
+            priority=Issue.FAIBLE, status=Issue.TERMINE,
+            project_id=self.project, author_user_id=self.user,
+            assigned=self.user)
+        self.assertCountersMatchTables()
+
+    def test_non_contributor_gets_404(self):
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_management_command_verifies_and_rebuilds(self):
+        ProjectStatistics.for_project(self.project.pk)
+        ProjectStatistics.objects.update(issues=7)
+        with self.assertRaises(CommandError):
+            call_command('project_statistics', stdout=io.StringIO())
+        output = io.StringIO()
+        call_command('project_statistics', self.project.pk, rebuild=True,
+                     stdout=output)
+        self.assertIn('issues 7 -> 1', output.getvalue())
+        call_command('project_statistics', stdout=io.StringIO())
+        self.assertCountersMatchTables()
+
+
+class AsyncReadViewsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.async_client = AsyncClient()
+
+    def async_get(self, url, data=None, user=None):
+        # Sous ASGI, AsyncClient transmet les arguments nommés comme en-têtes
+        token = AccessToken.for_user(user or self.user)
+        return self.async_client.get(url, data,
+                                     authorization=f'Bearer {token}')
+
+    def routes(self):
+        project, issue = self.project.pk, self.issue.pk
+        return [
+            ('projects-list', {}),
+            ('projects-detail', {'pk': project}),
+            ('project-issues-list', {'project_id': project}),
+            ('project-issues-detail', {'project_id': project, 'pk': issue}),
+            ('issue-comments-list', {'project_id': project,
+                                     'issue_id': issue}),
+            ('issue-comments-detail', {'project_id': project,
+                                       'issue_id': issue,
+                                       'pk': self.comment.pk}),
+        ]
+
+    async def test_responses_match_sync_views(self):
+        for name, kwargs in self.routes():
+            with self.subTest(name=name):
+                sync = await sync_to_async(self.client.get)(
+                    reverse(name, kwargs=kwargs), {'limit': 5})
+                response = await self.async_get(
+                    reverse(f'async-{name}', kwargs=kwargs), {'limit': 5})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content),
+                                 json.loads(sync.content))
+
+    async def test_query_parameters_match_sync_views(self):
+        # Champs partiels, ressources intégrées, facettes et curseur : la
+        # lecture est celle du ViewSet
+        issues = {'project_id': self.project.pk}
+        issue = {**issues, 'pk': self.issue.pk}
+        for name, kwargs, params in [
+                ('project-issues-list', issues,
+                 {'fields': 'issue_id,title', 'facets': 'true'}),
+                ('project-issues-list', issues, {'pagination': 'cursor'}),
+                ('project-issues-detail', issue,
+                 {'include': 'comments,users', 'fields': 'title'}),
+                ('projects-detail', {'pk': self.project.pk},
+                 {'include': 'contributors'})]:
+            with self.subTest(name=name, params=params):
+                sync = await sync_to_async(self.client.get)(
+                    reverse(name, kwargs=kwargs), params)
+                response = await self.async_get(
+                    reverse(f'async-{name}', kwargs=kwargs), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content),
+                                 json.loads(sync.content))
+        response = await self.async_get(reverse(
+            'async-project-issues-list', kwargs=issues), {'fields': 'xx'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', json.loads(response.content))
+
+    async def test_cursor_pages(self):
+        for index in range(2):
+            await Issue.objects.acreate(
+                title=f'Suivant {index}', description='Description',
+                tag=Issue.TACHE, priority=Issue.FAIBLE,
+                status=Issue.A_FAIRE, project_id=self.project,
+                author_user_id=self.user, assigned=self.user)
+        url = reverse('async-project-issues-list',
+                      kwargs={'project_id': self.project.pk})
+        data = {'pagination': 'cursor', 'limit': 2}
+        titles = []
+        while url:
+            page = json.loads((await self.async_get(url, data)).content)
+            titles += [issue['title'] for issue in page['results']]
+            url, data = page['next'], None
+        self.assertEqual(titles, ['Probléme', 'Suivant 0', 'Suivant 1'])
+
+    async def test_issue_filters_and_pagination(self):
+        url = reverse('async-project-issues-list',
+                      kwargs={'project_id': self.project.pk})
+        response = await self.async_get(url, {'status': 'TR'})
+        self.assertEqual(json.loads(response.content)['count'], 0)
+        response = await self.async_get(url, {'status': 'XX'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('status', json.loads(response.content))
+
+    async def test_access_checks(self):
+        url = reverse('async-project-issues-list',
+                      kwargs={'project_id': self.project.pk})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            url, authorization='Bearer invalide')
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_get(url, user=self.other)
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_get(reverse(
+            'async-projects-detail', kwargs={'pk': self.project.pk}),
+            user=self.other)
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.post(url, {})
+        self.assertEqual(response.status_code, 405)
+
+
+class AuthenticationCacheTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('projects-list')
+
+    def user_queries(self, **headers):
+        # Requêtes sur auth_user pour une lecture authentifiée
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries.captured_queries
+                if 'FROM "auth_user"' in query['sql']]
+
+    def basic(self, password='password'):
+        credentials = base64.b64encode(
+            f'{self.user.username}:{password}'.encode()).decode()
+        return {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def bearer(self):
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': self.user.username, 'password': 'password'})
+        return {'HTTP_AUTHORIZATION': f'Bearer {response.data["access"]}'}
+
+    def test_basic_credentials_are_verified_once(self):
+        self.assertEqual(len(self.user_queries(**self.basic())), 1)
+        self.assertEqual(self.user_queries(**self.basic()), [])
+        # Seul un HMAC des identifiants est conservé
+        self.assertNotIn('password', repr(authentication._credentials._data))
+        response = self.client.get(self.url, **self.basic('autre'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_revokes_cached_credentials(self):
+        self.user_queries(**self.basic())
+        self.user.set_password('nouveau-mot-de-passe')
+        self.user.save()
+        response = self.client.get(self.url, **self.basic())
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get(
+            self.url, **self.basic('nouveau-mot-de-passe')).status_code, 200)
+
+    def test_jwt_user_is_built_from_claims(self):
+        headers = self.bearer()
+        self.user_queries(**headers)
+        self.assertEqual(self.user_queries(**headers), [])
+        response = self.client.post(reverse('projects-list'), {
+            'title': 'Projet JWT', 'description': 'Description',
+            'type': Project.BACK_END}, **headers)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['author_name'], 'Jean Luc')
+
+    def test_jwt_is_revoked_by_account_changes(self):
+        headers = self.bearer()
+        self.user_queries(**headers)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url, **headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_stamps_are_kept_in_the_shared_cache(self):
+        headers = self.bearer()
+        self.user_queries(**headers)
+        key = authentication.STAMP_KEY.format(self.user.pk)
+        shared = caches[settings.AUTH_STAMP_CACHE]
+        self.assertEqual(shared.get(key), authentication.user_stamp(self.user))
+        # L'enregistrement de l'utilisateur efface l'empreinte pour tous les
+        # processus
+        self.user.set_password('nouveau-mot-de-passe')
+        self.user.save()
+        self.assertIsNone(shared.get(key))
+        self.assertEqual(self.client.get(self.url, **headers).status_code,
+                         401)
+
+    def test_refresh_is_revoked_by_password_change(self):
+        url = reverse('token_refresh')
+        refresh = self.client.post(reverse('token_obtain_pair'), {
+            'username': self.user.username, 'password': 'password'}
+        ).data['refresh']
+        response = self.client.post(url, {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        refresh = response.data['refresh']
+        self.user.set_password('nouveau-mot-de-passe')
+        self.user.save()
+        response = self.client.post(url, {'refresh': refresh})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'].code, 'token_revoked')
+
+    def test_tokens_without_claims_still_load_the_user(self):
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(len(self.user_queries(
+            HTTP_AUTHORIZATION=f'Bearer {token}')), 1)
+
+
+class SignupTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.url = reverse('signup')
+        self.payload = {'email': 'jean-paul@gmail.com',
+                        'password': 'mot-de-passe',
+                        'password_confirmation': 'mot-de-passe',
+                        'first_name': 'Jean', 'last_name': 'Paul'}
+
+    def test_signup_hashes_in_the_pool(self):
+        response = self.client.post(self.url, self.payload)
+        self.assertEqual(response.status_code, 201, response.data)
+        user = User.objects.get(pk=response.data['user_id'])
+        self.assertTrue(user.check_password('mot-de-passe'))
+        response = self.client.post(self.url, self.payload)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+
+    def test_signup_normalizes_email_and_username(self):
+        response = self.client.post(self.url, {
+            **self.payload, 'email': 'Jean-Paul@GMAIL.com'})
+        self.assertEqual(response.status_code, 201, response.data)
+        user = User.objects.get(pk=response.data['user_id'])
+        self.assertEqual((user.email, user.username),
+                         ('Jean-Paul@gmail.com', 'Jean-Paul@gmail.com'))
+        response = self.client.post(self.url, {
+            **self.payload, 'email': 'Jean-Paul@Gmail.COM'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data)
+
+    def test_concurrent_duplicate_is_rejected(self):
+        serializer = UserSerializer(data=self.payload)
+        self.assertTrue(serializer.is_valid())
+        User.objects.create(username=self.payload['email'],
+                            email=self.payload['email'])
+        with self.assertRaises(serializers.ValidationError):
+            serializer.save(password_hash='!')
+
+    def test_full_pool_returns_429(self):
+        release = threading.Event()
+        default, hashing.pool = hashing.pool, hashing.HashingPool(
+            workers=1, queue_size=0)
+        try:
+            hashing.pool.submit(release.wait)
+            response = self.client.post(self.url, self.payload)
+        finally:
+            release.set()
+            hashing.pool = default
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertFalse(User.objects.filter(
+            email=self.payload['email']).exists())
+
+    async def test_async_signup(self):
+        response = await AsyncClient().post(
+            reverse('async-signup'), self.payload,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        user = await User.objects.aget(pk=json.loads(
+            response.content)['user_id'])
+        self.assertTrue(user.check_password('mot-de-passe'))
+        response = await AsyncClient().post(
+            reverse('async-signup'), self.payload,
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class QueryBudgetTests(ApiTestCase):
+    """
+    Budgets de requêtes des lectures sur un jeu de données où chaque liste
+    contient plusieurs lignes : un N+1 dépasse le budget ou produit des
+    requêtes dupliquées.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        users = [User.objects.create_user(
+            username=f'user{index}@gmail.com', first_name='Prénom',
+            last_name=f'Nom {index}') for index in range(5)]
+        for user in users:
+            Contributor.objects.create(user_id=user, project_id=cls.project,
+                                       role=Contributor.CONTRIBUTOR)
+        for index, user in enumerate(users):
+            issue = Issue.objects.create(
+                title=f'Probléme {index}', description='Description',
+                tag=Issue.TACHE, priority=Issue.FAIBLE,
+                status=Issue.EN_COURS, project_id=cls.project,
+                author_user_id=user, assigned=users[-index - 1])
+            for author in users:
+                cls.last_comment = Comment.objects.create(
+                    description='Commentaire', author_user_id=author,
+                    issue_id=issue)
+            cls.last_issue = issue
+        for index in range(5):
+            project = cls.create_project(users[index], f'Projet {index}')
+            Contributor.objects.create(user_id=cls.user, project_id=project,
+                                       role=Contributor.CONTRIBUTOR)
+
+    def get(self, name, **kwargs):
+        response = self.client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    @query_budget(3)
+    def test_projects_list(self):
+        self.get('projects-list')
+
+    @query_budget(4)
+    def test_contributors_list(self):
+        # Rôle, version du projet, COUNT et page avec les utilisateurs
+        self.get('project-contributors-list', project_id=self.project.pk)
+
+    @query_budget(4)
+    def test_issues_list(self):
+        self.get('project-issues-list', project_id=self.project.pk)
+
+    @query_budget(3)
+    def test_issue_detail(self):
+        self.get('project-issues-detail', project_id=self.project.pk,
+                 pk=self.last_issue.pk)
+
+    @query_budget(4)
+    def test_comments_list(self):
+        self.get('issue-comments-list', project_id=self.project.pk,
+                 issue_id=self.last_issue.pk)
+
+    @query_budget(3)
+    def test_comment_detail(self):
+        self.get('issue-comments-detail', project_id=self.project.pk,
+                 issue_id=self.last_issue.pk, pk=self.last_comment.pk)
+
+    def test_duplicated_queries_are_detected(self):
+        profile = profiling.QueryProfile()
+        with profile.capture():
+            for comment in Comment.objects.all()[:3]:
+                str(comment)
+        self.assertEqual(profile.count, 4)
+        self.assertEqual(profile.duplicates, 2)
+
+    @override_settings(QUERY_PROFILING=True)
+    def test_middleware_reports_queries(self):
+        profiling.clear()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('projects-list'))
+        self.assertEqual(response['X-Query-Count'], '3')
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+        self.assertGreaterEqual(float(response['X-Query-Time']), 0)
+        self.assertEqual(profiling.recent()[0]['path'],
+                         reverse('projects-list'))
+
+
+class BenchmarkTests(TestCase):
+
+    def test_seed_and_run(self):
+        from SoftDesk.urls import router
+        user = benchmark.seed(users=5, projects=3, contributors=2, issues=2,
+                              comments=2)
+        self.assertEqual(Project.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 12)
+        self.assertEqual(ProjectStatistics.objects.get(
+            project_id=Project.objects.first()).comments, 4)
+        self.assertEqual(benchmark.seed_once(), user)
+
+        results = benchmark.run(router, user, requests=2)
+        self.assertIn('GET projects-list', results)
+        self.assertIn('POST issue-comments-list', results)
+        for key, result in results.items():
+            expected = 201 if key.startswith('POST') else 200
+            self.assertEqual(result['status'], expected, key)
+            self.assertGreater(result['queries_per_request'], 0)
+
+        changes = benchmark.compare(results, results)
+        self.assertEqual(changes['GET projects-list']['p50_change'], 0)
+
+
+class SQLiteProfileTests(TestCase):
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_concurrent_reads_and_writes(self):
+        # Charge mixte concurrente : le profil de production passe la base
+        # en WAL et aucune écriture n'échoue sur un verrou.
+        with tempfile.TemporaryDirectory() as directory:
+            path = f'{directory}/concurrency.sqlite3'
+            legacy = benchmark.concurrency(path, profile='legacy', threads=4,
+                                           duration=0.5, issues=20)
+            production = benchmark.concurrency(
+                path, profile='production', threads=4, duration=0.5,
+                issues=20)
+        self.assertEqual(legacy['journal_mode'], 'delete')
+        self.assertEqual(production['journal_mode'], 'wal')
+        self.assertEqual(production['errors'], 0)
+        self.assertGreater(production['writes'], 0)
+        self.assertGreater(production['reads'], 0)
+
+
+class ExportSnapshotTests(TestCase):
+    """
+    Export lu dans un fichier SQLite en WAL, avec le profil de production
+    (transaction_mode IMMEDIATE), pendant qu'un autre thread écrit.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Même procédé que ReplicaRoutingTests : copie du schéma, alias
+        # déclaré après TestCase.setUpClass
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'snapshot.sqlite3')
+        connection.ensure_connection()
+        copy = sqlite3.connect(path)
+        connection.connection.backup(copy)
+        copy.close()
+        super().setUpClass()
+        settings_dict = connections.settings['default']
+        connections.settings['snapshot'] = {
+            **settings_dict, 'NAME': path, 'OPTIONS': {
+                **settings_dict['OPTIONS'], 'pragmas': {
+                    **settings_dict['OPTIONS']['pragmas'],
+                    'busy_timeout': 200}}}
+        user = User.objects.using('snapshot').create(username='export')
+        project = Project(title='Projet', description='Description',
+                          type=Project.BACK_END, author_user_id=user)
+        Project.objects.using('snapshot').bulk_create([project])
+        cls.project_id = Project.objects.using('snapshot').get().pk
+        Issue.objects.using('snapshot').bulk_create([Issue(
+            title=f'Problème {index}', description='Description',
+            tag=Issue.BUG, priority=Issue.ELEVEE, status=Issue.A_FAIRE,
+            project_id_id=cls.project_id, author_user_id=user,
+            assigned=user) for index in range(3)])
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['snapshot'].close()
+        del connections['snapshot']
+        del connections.settings['snapshot']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_writes_while_export_streams(self):
+        chunks = export.export_project(self.project_id, using='snapshot')
+        # Premier bloc envoyé : la transaction de l'export est ouverte
+        first = next(chunks)
+        errors = []
+
+        def write():
+            try:
+                Issue.objects.using('snapshot').filter(
+                    project_id=self.project_id).update(title='Modifié')
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections['snapshot'].close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        body = (first + b''.join(chunks)).decode()
+        self.assertEqual(errors, [])
+        self.assertEqual(body.count('Problème'), 3)
+        self.assertNotIn('Modifié', body)
+        self.assertEqual(Issue.objects.using('snapshot').filter(
+            title='Modifié').count(), 3)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(ApiTestCase):
+    """
+    Le réplica est un second fichier SQLite, copie du schéma de la base de
+    test, qui contient un projet absent de la base principale.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Copie faite hors de la transaction de TestCase ; l'alias est
+        # déclaré ensuite pour ne pas être soumis à TestCase.databases.
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, 'replica.sqlite3')
+        connection.ensure_connection()
+        replica = sqlite3.connect(path)
+        connection.connection.backup(replica)
+        replica.close()
+        super().setUpClass()
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': path}
+        User.objects.using('replica').bulk_create([User(
+            pk=cls.user.pk, username=cls.user.username)])
+        cls.replica_project = Project(
+            pk=cls.project.pk + 100, title='Projet réplique',
+            description='Description', type=Project.BACK_END,
+            author_user_id_id=cls.user.pk)
+        Project.objects.using('replica').bulk_create([cls.replica_project])
+        Contributor.objects.using('replica').bulk_create([Contributor(
+            user_id_id=cls.user.pk, project_id=cls.replica_project,
+            role=Contributor.CREATOR)])
+        # Données en place : le réplica est ensuite ouvert en lecture seule,
+        # comme dans les réglages
+        connections['replica'].close()
+        del connections['replica']
+        connections.settings['replica'] = {
+            **connections.settings['default'], 'NAME': path,
+            'OPTIONS': settings.REPLICA_OPTIONS}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        routing._sticky_cache().clear()
+
+    def titles(self):
+        response = self.client.get(reverse('projects-list'))
+        self.assertEqual(response.status_code, 200)
+        return [project['title'] for project in response.data['results']]
+
+    def test_safe_requests_read_replica(self):
+        self.assertEqual(self.titles(), ['Projet réplique'])
+        response = self.client.get(reverse(
+            'projects-detail', kwargs={'pk': self.replica_project.pk}))
+        self.assertEqual(response.status_code, 200)
+        # Le flux de l'export, lu après la vue, reste sur le réplica
+        response = self.client.get(reverse(
+            'projects-export', kwargs={'pk': self.replica_project.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_user_reads_own_writes_from_primary(self):
+        response = self.client.post(reverse('projects-list'), {
+            'title': 'Nouveau', 'description': 'Description',
+            'type': Project.BACK_END})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Project.objects.using('replica').filter(
+            title='Nouveau').exists())
+        self.assertEqual(self.titles(), ['Projet', 'Nouveau'])
+        # Les autres utilisateurs continuent de lire le réplica
+        self.assertFalse(routing.is_sticky(self.other.pk))
+
+    def test_roles_are_read_from_primary(self):
+        # Le réplica, en retard, compte encore l'utilisateur parmi les
+        # contributeurs d'un projet dont la base principale l'a retiré.
+        response = self.client.get(reverse(
+            'project-issues-list',
+            kwargs={'project_id': self.replica_project.pk}))
+        self.assertEqual(response.status_code, 403)
+        # Le refus, non le rôle lu dans le réplica, est partagé par le cache
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertIsNone(membership.get_role(request,
+                                              self.replica_project.pk))
+
+    def test_process_local_sticky_cache_is_reported(self):
+        self.assertEqual([warning.id for warning in
+                          routing.check_sticky_cache()], ['api.W001'])
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                CACHES={**settings.CACHES, 'api': {
+                    'BACKEND': 'django.core.cache.backends.filebased.'
+                               'FileBasedCache',
+                    'LOCATION': directory}}):
+            self.assertEqual(routing.check_sticky_cache(), [])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(routing.check_sticky_cache(), [])
+
+    def test_other_views_read_primary(self):
+        response = self.client.get(reverse(
+            'project-contributors-list',
+            kwargs={'project_id': self.project.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_replica_is_read_only(self):
+        # Pendant une écriture de la réplication, une transaction du
+        # réplica lit sans attendre le verrou d'écriture
+        writer = sqlite3.connect(connections.settings['replica']['NAME'])
+        writer.execute('BEGIN IMMEDIATE')
+        try:
+            with transaction.atomic(using='replica'):
+                self.assertEqual(
+                    Project.objects.using('replica').count(), 1)
+        finally:
+            writer.rollback()
+            writer.close()
+        with self.assertRaisesMessage(OperationalError, 'readonly'):
+            Project.objects.using('replica').update(title='Modifié')
+
+    def test_router(self):
+        router = routing.ReplicaRouter()
+        self.assertEqual(router.db_for_write(Project), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'api'))
+        self.assertIsNone(router.allow_migrate('default', 'api'))
+        token = routing._read_alias.set('replica')
+        try:
+            self.assertEqual(router.db_for_read(Project), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Project), 'default')
+        finally:
+            routing._read_alias.reset(token)
+        self.assertEqual(router.db_for_read(Project), 'default')
+
+
+@override_settings(DELETION_BATCH_SIZE=2, DELETION_BATCH_PAUSE=0)
+class DeletionTests(ApiTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for index in range(4):
+            Comment.objects.create(description=f'Commentaire {index}',
+                                   author_user_id=cls.user,
+                                   issue_id=cls.issue)
+
+    def delete(self, name, **kwargs):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.delete(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 202)
+        # Le worker est notifié une fois la transaction validée
+        self.assertIn(deletion.worker.notify, callbacks)
+        return DeletionJob.objects.get(pk=response.data['id']), response
+
+    def test_project_is_hidden_then_purged_in_batches(self):
+        job, response = self.delete('projects-detail', pk=self.project.pk)
+        self.assertEqual(response['Location'], 'http://testserver' + reverse(
+            'deletion-job', kwargs={'pk': job.pk}))
+        self.assertEqual(job.status, DeletionJob.PENDING)
+        self.assertEqual(self.client.get(
+            reverse('projects-list')).data['count'], 0)
+        self.assertEqual(self.client.get(reverse(
+            'projects-detail', kwargs={'pk': self.project.pk})).status_code,
+            404)
+        self.assertEqual(self.client.get(reverse(
+            'project-issues-list', kwargs={'project_id': self.project.pk})
+        ).status_code, 403)
+        self.assertTrue(Issue.objects.filter(pk=self.issue.pk).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(deletion.run_pending(), 1)
+        # Commentaires par lots de DELETION_BATCH_SIZE
+        batches = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith(
+                       'DELETE FROM "api_comment" WHERE "api_comment"."id" IN')]
+        self.assertEqual(len(batches), 3)
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Contributor.objects.exists())
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        # 5 commentaires, le problème, le contributeur, les 7 entrées du
+        # journal de synchronisation, le projet et ses compteurs
+        self.assertEqual(job.deleted, 16)
+
+        response = self.client.get(reverse('deletion-job',
+                                           kwargs={'pk': job.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], DeletionJob.DONE)
+        other = APIClient()
+        other.force_authenticate(self.other)
+        self.assertEqual(other.get(reverse(
+            'deletion-job', kwargs={'pk': job.pk})).status_code, 404)
+
+    def test_issue_is_hidden_and_uncounted(self):
+        job, _ = self.delete('project-issues-detail',
+                             project_id=self.project.pk, pk=self.issue.pk)
+        self.assertEqual(job.target, DeletionJob.ISSUE)
+        self.assertEqual(self.client.get(reverse(
+            'project-issues-detail', kwargs={'project_id': self.project.pk,
+                                             'pk': self.issue.pk})
+        ).status_code, 404)
+        comments_url = reverse('issue-comments-list', kwargs={
+            'project_id': self.project.pk, 'issue_id': self.issue.pk})
+        self.assertEqual(self.client.get(comments_url).data['count'], 0)
+        self.assertEqual(self.client.post(
+            comments_url, {'description': 'Commentaire'}).status_code, 404)
+        statistics = ProjectStatistics.objects.get(project_id=self.project)
+        self.assertEqual((statistics.issues, statistics.comments), (0, 0))
+
+        deletion.run_pending()
+        self.assertFalse(Issue.objects.filter(pk=self.issue.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertTrue(Project.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(ProjectStatistics.compute(self.project.pk),
+                         ProjectStatistics.objects.get(
+                             project_id=self.project).counters())
+
+    def test_interrupted_job_is_resumed(self):
+        job, _ = self.delete('projects-detail', pk=self.project.pk)
+        # Arrêt du processus après un premier lot
+        Comment.objects.filter(pk__in=Comment.objects.values('pk')[:2]) \
+            .delete()
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.RUNNING, deleted=2,
+            heartbeat_time=datetime.now(dt_timezone.utc) - timedelta(seconds=61))
+
+        call_command('resume_deletions', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertEqual(job.deleted, 16)
+        self.assertFalse(Issue.objects.exists())
+
+    def test_job_is_claimed_once(self):
+        job, _ = self.delete('projects-detail', pk=self.project.pk)
+        self.assertTrue(deletion.claim(job))
+        # Réservée par ce processus : un autre worker la laisse
+        self.assertFalse(deletion.claim(job))
+        self.assertFalse(deletion.run(job))
+        self.assertEqual(deletion.run_pending(), 0)
+        self.assertTrue(Issue.objects.exists())
+        # Bail expiré : le processus qui l'exécutait s'est arrêté
+        with override_settings(DELETION_LEASE=0):
+            self.assertEqual(deletion.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertFalse(Issue.objects.exists())
+
+    @override_settings(DELETION_RETRY_DELAY=60, DELETION_ATTEMPTS=2)
+    def test_failed_job_is_retried_with_backoff(self):
+        job, _ = self.delete('projects-detail', pk=self.project.pk)
+        with self.assertLogs('api.deletion', 'ERROR'), \
+                unittest.mock.patch.object(
+                    deletion, 'purge', side_effect=OSError('disque plein')):
+            self.assertEqual(deletion.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error),
+                         (DeletionJob.FAILED, 1, 'disque plein'))
+        self.assertGreater(job.retry_time, datetime.now(dt_timezone.utc)
+                           + timedelta(seconds=50))
+        self.assertAlmostEqual(deletion.next_run(), 60, delta=5)
+        # Pas de nouvelle tentative avant le délai
+        self.assertEqual(deletion.run_pending(), 0)
+
+        DeletionJob.objects.filter(pk=job.pk).update(
+            retry_time=datetime.now(dt_timezone.utc))
+        with self.assertLogs('api.deletion', 'ERROR'), \
+                unittest.mock.patch.object(
+                    deletion, 'purge', side_effect=OSError('disque plein')):
+            self.assertEqual(deletion.run_pending(), 1)
+        job.refresh_from_db()
+        # Abandonnée après DELETION_ATTEMPTS échecs
+        self.assertEqual((job.status, job.attempts, job.retry_time),
+                         (DeletionJob.FAILED, 2, None))
+        self.assertIsNone(deletion.next_run())
+        self.assertEqual(deletion.run_pending(), 0)
+
+        output = io.StringIO()
+        call_command('resume_deletions', '--retry-failed', stdout=output)
+        self.assertIn('1 suppression(s) traitée(s)', output.getvalue())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (DeletionJob.DONE, ''))
+        self.assertFalse(Issue.objects.exists())
+
+    def test_worker_starts_at_first_server_request(self):
+        worker = deletion.DeletionWorker()
+        with unittest.mock.patch.object(deletion, 'worker', worker), \
+                unittest.mock.patch.object(worker, 'notify') as notify:
+            # Ni le client de test ni l'import des modules ne le lancent
+            self.client.get(reverse('projects-list'))
+            notify.assert_not_called()
+            request_started.send(sender=WSGIHandler, environ={})
+            request_started.send(sender=ASGIHandler, scope={})
+            notify.assert_called_once()
+            # Processus issu d'un fork : l'état du parent est abandonné
+            worker._thread = threading.Thread(target=None)
+            with unittest.mock.patch.object(deletion.os, 'getpid',
+                                            return_value=os.getpid() + 1):
+                request_started.send(sender=WSGIHandler, environ={})
+                self.assertIsNone(worker._thread)
+            self.assertEqual(notify.call_count, 2)
+
+
+class SyncTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('projects-sync', kwargs={'pk': self.project.pk})
+        self.token = self.client.get(self.url).data['token']
+
+    def sync(self, token=None):
+        return self.client.get(self.url, {'token': token or self.token})
+
+    def test_no_change_costs_one_query(self):
+        self.sync()
+        with self.assertNumQueries(1):
+            # Rôle en cache : seul l'index du journal est lu
+            response = self.sync()
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response.content, b'')
+        self.assertIn('X-Sync-Token', response)
+
+    def test_changes_and_tombstones(self):
+        issue = Issue.objects.create(
+            title='Nouveau', description='Description', tag=Issue.TACHE,
+            priority=Issue.FAIBLE, status=Issue.A_FAIRE,
+            project_id=self.project, author_user_id=self.user,
+            assigned=self.user)
+        self.issue.title = 'Modifié'
+        self.issue.save()
+        self.issue.save()
+        comment_id = self.comment.pk
+        self.comment.delete()
+        contributor = Contributor.objects.create(
+            user_id=self.other, project_id=self.project,
+            role=Contributor.CONTRIBUTOR)
+
+        response = self.sync()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['issue_id'] for row in response.data['issues']],
+                         [issue.pk, self.issue.pk])
+        self.assertEqual(response.data['issues'][1]['title'], 'Modifié')
+        self.assertEqual(response.data['comments'], [])
+        self.assertEqual(
+            [row['contributor_id'] for row in response.data['contributors']],
+            [contributor.pk])
+        self.assertEqual(response.data['deleted'], {
+            'issues': [], 'comments': [comment_id], 'contributors': []})
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(self.sync(response.data['token']).status_code, 204)
+
+        # Problème supprimé : pierre tombale, ses commentaires partent avec
+        token = response.data['token']
+        deletion.delete_issue(issue, self.user)
+        response = self.sync(token)
+        self.assertEqual(response.data['issues'], [])
+        self.assertEqual(response.data['deleted']['issues'], [issue.pk])
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_follow_the_journal(self):
+        for index in range(3):
+            Comment.objects.create(description=f'Commentaire {index}',
+                                   author_user_id=self.user,
+                                   issue_id=self.issue)
+        response = self.sync()
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(len(response.data['comments']), 2)
+        response = self.sync(response.data['token'])
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(len(response.data['comments']), 1)
+
+    def test_bulk_writes_are_journaled(self):
+        team = User.objects.bulk_create(
+            [User(username=f'membre{index}@gmail.com') for index in range(3)])
+        self.client.post(
+            reverse('project-contributors-bulk',
+                    kwargs={'project_id': self.project.pk}),
+            {'user_ids': [user.pk for user in team]}, format='json')
+        response = self.sync()
+        self.assertEqual(len(response.data['contributors']), 3)
+
+        self.client.delete(
+            reverse('project-contributors-bulk',
+                    kwargs={'project_id': self.project.pk}),
+            {'user_ids': [team[0].pk]}, format='json')
+        response = self.sync(response.data['token'])
+        self.assertEqual(len(response.data['deleted']['contributors']), 1)
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(self.sync('invalide').status_code, 400)
+        other = self.create_project(self.user, title='Autre')
+        self.assertEqual(self.sync(sync.encode_token(other.pk, 0))
+                         .status_code, 400)
+        expired = sync.encode_token(
+            self.project.pk, 0, time.time() - sync.get_max_age() - 1)
+        self.assertEqual(self.sync(expired).status_code, 410)
+
+    def test_non_member_gets_404(self):
+        client = APIClient()
+        client.force_authenticate(self.other)
+        self.assertEqual(client.get(self.url).status_code, 404)
+
+    def test_prune_changes(self):
+        ChangeLog.objects.update(created_time=datetime.now(dt_timezone.utc)
+                                 - timedelta(seconds=sync.get_max_age() + 1))
+        self.issue.save()
+        call_command('prune_changes', stdout=io.StringIO())
+        self.assertEqual(ChangeLog.objects.count(), 1)
+
+
+class EventStreamTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.application = EventStreamRouter(ASGIHandler())
+        self.path = f'/api/projects/{self.project.pk}/events/'
+
+    async def open(self, user=None, headers=(), path=None):
+        # Flux ouvert sur l'application ASGI ; la déconnexion du client est
+        # simulée en positionnant `disconnected`.
+        token = AccessToken.for_user(user or self.user)
+        messages, disconnected = [], asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path or self.path, 'query_string': b'', 'root_path': '',
+            'headers': [(b'authorization', f'Bearer {token}'.encode()),
+                        *headers],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80)}
+        task = asyncio.ensure_future(self.application(scope, receive, send))
+        return task, messages, disconnected
+
+    async def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail('Condition non atteinte')
+
+    @staticmethod
+    def parse(messages):
+        # (id, nom, données) des événements reçus
+        body = b''.join(message.get('body', b'') for message in messages
+                        if message['type'] == 'http.response.body')
+        parsed = []
+        for block in body.decode().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines()
+                          if ': ' in line and not line.startswith(':'))
+            if 'event' in fields:
+                parsed.append((int(fields['id']), fields['event'],
+                               json.loads(fields['data'])))
+        return parsed
+
+    def write(self, function):
+        with self.captureOnCommitCallbacks(execute=True):
+            return function()
+
+    async def test_access_follows_project_membership(self):
+        task, messages, _ = await self.open(user=self.other)
+        await task
+        self.assertEqual(messages[0]['status'], 403)
+
+        task, messages, _ = await self.open(
+            path=f'/api/projects/{self.project.pk + 100}/events/')
+        await task
+        self.assertEqual(messages[0]['status'], 403)
+
+    @override_settings(EVENTS_KEEPALIVE=0.05)
+    async def test_stream_closes_when_contributor_is_removed(self):
+        contributor = await Contributor.objects.acreate(
+            user_id=self.other, project_id=self.project,
+            role=Contributor.CONTRIBUTOR)
+        task, messages, _ = await self.open(user=self.other)
+        await self.wait_for(lambda: any(
+            message.get('body', b'').startswith(b': keepalive')
+            for message in messages))
+
+        await sync_to_async(contributor.delete)()
+        membership.invalidate(self.other.pk, self.project.pk)
+        await asyncio.wait_for(task, 1)
+        self.assertEqual(messages[-1], {'type': 'http.response.body'})
+
+    async def test_one_write_reaches_every_subscriber(self):
+        streams = [await self.open() for _ in range(3)]
+        await self.wait_for(lambda: len(events.broker._subscriptions.get(
+            self.project.pk, ())) == 3)
+
+        def create_comment():
+            with CaptureQueriesContext(connection) as queries:
+                comment = self.write(lambda: Comment.objects.create(
+                    description='En direct', author_user_id=self.user,
+                    issue_id=self.issue))
+            # Les requêtes sont lues sur la connexion de ce thread
+            return comment, queries.captured_queries
+
+        comment, queries = await sync_to_async(create_comment)()
+        # Le commentaire est relu une seule fois pour les trois flux
+        self.assertEqual(len([
+            query for query in queries
+            if query['sql'].startswith('SELECT') and
+            'FROM "api_comment"' in query['sql']]), 1)
+
+        for task, messages, disconnected in streams:
+            await self.wait_for(lambda: self.parse(messages))
+            disconnected.set()
+            await task
+            self.assertEqual(messages[0]['status'], 200)
+            [(_, name, data)] = self.parse(messages)
+            self.assertEqual(name, 'comment.created')
+            self.assertEqual(data['comment_id'], comment.pk)
+        self.assertFalse(events.broker.has_subscribers(self.project.pk))
+
+    async def test_last_event_id_replays_missed_events(self):
+        last_id = await ChangeLog.objects.filter(
+            project_id=self.project).alatest('id')
+        comment_id = self.comment.pk
+
+        def changes():
+            self.issue.title = 'Modifié'
+            self.issue.save()
+            self.comment.delete()
+
+        await sync_to_async(self.write)(changes)
+        task, messages, disconnected = await self.open(
+            headers=[(b'last-event-id', str(last_id.pk).encode())])
+        await self.wait_for(lambda: len(self.parse(messages)) == 2)
+        disconnected.set()
+        await task
+        self.assertEqual([name for _, name, _ in self.parse(messages)],
+                         ['issue.updated', 'comment.deleted'])
+        self.assertEqual(self.parse(messages)[0][2]['title'], 'Modifié')
+        self.assertEqual(self.parse(messages)[1][2],
+                         {'comment_id': comment_id})
+
+    @override_settings(EVENTS_REPLAY_LIMIT=1)
+    async def test_too_many_missed_events_send_reset(self):
+        await sync_to_async(self.write)(lambda: [
+            self.issue.save() for _ in range(2)])
+        task, messages, disconnected = await self.open(
+            headers=[(b'last-event-id', b'0')])
+        await self.wait_for(lambda: self.parse(messages))
+        disconnected.set()
+        await task
+        [(position, name, _)] = self.parse(messages)
+        self.assertEqual(name, 'reset')
+        self.assertEqual(position, await sync_to_async(
+            events.last_event_id)(self.project.pk))
+
+
+class IncludeTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('project-issues-detail', kwargs={
+            'project_id': self.project.pk, 'pk': self.issue.pk})
+
+    def add_comments(self, count):
+        Comment.objects.bulk_create([
+            Comment(description=f'Commentaire {index}',
+                    author_user_id=self.other, issue_id=self.issue)
+            for index in range(count)])
+
+    def get(self, url, include):
+        membership.clear()
+        caching.get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'include': include})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response, len(queries)
+
+    def test_issue_detail_embeds_related_resources(self):
+        Contributor.objects.create(user_id=self.other, project_id=self.project,
+                                   role=Contributor.CONTRIBUTOR)
+        response, _ = self.get(self.url, 'comments,contributors,users')
+        data = response.data
+        self.assertEqual(data['issue_id'], self.issue.pk)
+        self.assertEqual(data['comments']['next'], None)
+        self.assertEqual([row['comment_id'] for row in
+                          data['comments']['results']], [self.comment.pk])
+        self.assertEqual([row['user_id'] for row in data['contributors']],
+                         [self.user.pk, self.other.pk])
+        self.assertEqual(data['author'], {
+            'user_id': self.user.pk, 'first_name': 'Jean',
+            'last_name': 'Luc', 'user_name': 'Jean Luc'})
+        self.assertEqual(data['assigned']['user_name'], 'Jean Marc')
+        self.assertNotIn('comments', self.client.get(self.url).data)
+
+    @override_settings(INCLUDE_COMMENTS_LIMIT=5)
+    def test_query_count_does_not_depend_on_related_rows(self):
+        include = 'comments,contributors,users'
+        _, few = self.get(self.url, include)
+        self.add_comments(30)
+        Contributor.objects.bulk_create([
+            Contributor(user_id=user, project_id=self.project,
+                        role=Contributor.CONTRIBUTOR)
+            for user in User.objects.bulk_create([
+                User(username=f'membre{index}@gmail.com')
+                for index in range(10)])])
+        response, many = self.get(self.url, include)
+        # Rôle, version du projet, problème joint à son projet et à ses
+        # utilisateurs, contributeurs préchargés, commentaires
+        self.assertEqual((few, many), (5, 5))
+        self.assertEqual(len(response.data['comments']['results']), 5)
+        self.assertEqual(len(response.data['contributors']), 11)
+
+    @override_settings(INCLUDE_COMMENTS_LIMIT=5)
+    def test_embedded_comments_continue_with_cursor(self):
+        self.add_comments(7)
+        response, _ = self.get(self.url, 'comments')
+        embedded = [row['comment_id']
+                    for row in response.data['comments']['results']]
+        response = self.client.get(response.data['comments']['next'])
+        self.assertEqual(response.status_code, 200)
+        following = [row['comment_id'] for row in response.data['results']]
+        self.assertEqual(len(following), 3)
+        self.assertEqual(embedded + following, list(
+            Comment.objects.order_by('created_time', 'id').values_list(
+                'pk', flat=True)))
+
+    def test_project_detail_embeds_contributors_and_author(self):
+        response, _ = self.get(
+            reverse('projects-detail', kwargs={'pk': self.project.pk}),
+            'contributors,users')
+        self.assertEqual(response.data['contributors'][0]['role'],
+                         'Créator')
+        self.assertEqual(response.data['author']['user_id'], self.user.pk)
+
+    def test_unknown_include_is_rejected(self):
+        response = self.client.get(self.url, {'include': 'comments,votes'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('include', response.data)
+
+
+class SparseFieldsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.detail_url = reverse('project-issues-detail', kwargs={
+            'project_id': self.project.pk, 'pk': self.issue.pk})
+        self.list_url = reverse('project-issues-list',
+                                kwargs={'project_id': self.project.pk})
+
+    def get(self, url, params):
+        membership.clear()
+        caching.get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        sql = [query['sql'] for query in queries.captured_queries
+               if '"api_issue"' in query['sql']]
+        return response.data, sql
+
+    def test_issue_detail_reads_only_requested_columns(self):
+        data, sql = self.get(self.detail_url,
+                             {'fields': 'issue_id,title,status'})
+        self.assertEqual(data, {'issue_id': self.issue.pk,
+                                'title': self.issue.title,
+                                'status': self.issue.status})
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn('JOIN', sql[0])
+        self.assertNotIn('"description"', sql[0])
+
+    def test_issue_list_reads_only_requested_columns(self):
+        data, sql = self.get(self.list_url,
+                             {'fields': 'issue_id,title,status'})
+        self.assertEqual(data['results'], [{
+            'issue_id': self.issue.pk, 'title': self.issue.title,
+            'status': self.issue.get_status_display()}])
+        self.assertNotIn('JOIN', sql[-1])
+
+    def test_requested_names_keep_their_join(self):
+        data, sql = self.get(self.detail_url,
+                             {'fields': 'title,author_name'})
+        self.assertEqual(data, {'title': self.issue.title,
+                                'author_name': 'Jean Luc'})
+        self.assertEqual(len(sql), 1)
+        self.assertEqual(sql[0].count('JOIN'), 1)
+
+    def test_full_representation_without_fields(self):
+        full = self.client.get(self.detail_url).data
+        data, _ = self.get(self.detail_url,
+                           {'fields': ','.join(full)})
+        self.assertEqual(data, full)
+
+    def test_fields_and_includes_combine(self):
+        data, sql = self.get(self.detail_url,
+                             {'fields': 'issue_id', 'include': 'users'})
+        self.assertEqual(set(data), {'issue_id', 'author', 'assigned'})
+        self.assertEqual(data['assigned']['user_name'], 'Jean Marc')
+        self.assertEqual(len(sql), 1)
+
+    def test_other_viewsets(self):
+        urls = {
+            reverse('projects-list'): 'project_id,title',
+            reverse('projects-detail', kwargs={'pk': self.project.pk}):
+                'project_id,title',
+            reverse('project-contributors-list',
+                    kwargs={'project_id': self.project.pk}): 'user_id,role',
+            reverse('issue-comments-list', kwargs={
+                'project_id': self.project.pk, 'issue_id': self.issue.pk}):
+                'comment_id,author_name',
+        }
+        for url, fields in urls.items():
+            with self.subTest(url=url):
+                data, _ = self.get(url, {'fields': fields})
+                rows = data['results'] if 'results' in data else data
+                if isinstance(rows, dict):
+                    rows = [rows]
+                self.assertEqual(set(rows[0]), set(fields.split(',')))
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.detail_url,
+                                   {'fields': 'title,votes'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
@@ -1,3 +1,7 @@
+import threading
+import time
+from collections import OrderedDict
+
 from rest_framework import serializers
 from django.utils import timezone
 
@@ -19,12 +23,15 @@ def display_id(obj):
 # Cette fonction permet de renvoyer un message d'erreur personnalisé
 # lorsque l'utilisateur renseigne incorrectement un choicefield.
 
-def choice_fields_validator(data, choice_fields):
+def choice_fields_validator(data, choice_fields, partial=False):
     errors = {}
 
     # Verification de la valeure envoyée, retourne un message perssonalisé
-    # en cas d'erreure
+    # en cas d'erreure. Lors d'une mise à jour partielle, seuls les champs
+    # présents sont vérifiés.
     for field, choices in choice_fields.items():
+        if partial and field not in data:
+            continue
         tag_value = data.get(field, '')
         if tag_value not in dict(choices):
             errors[field] = [
@@ -34,3 +41,50 @@ def choice_fields_validator(data, choice_fields):
     # Lancement de l'exception s'il y a des erreurs
     if errors:
         raise serializers.ValidationError(errors)
+
+
+# Cache borné en mémoire : les entrées les moins récemment utilisées sont
+# évincées au-delà de max_entries et chaque entrée expire après timeout
+# secondes. Partagé entre les threads d'un même processus.
+class BoundedCache:
+    def __init__(self, max_entries=1000, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return default
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_many(self, predicate):
+        # Supprime toutes les entrées dont la clé vérifie predicate
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
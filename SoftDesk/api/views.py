@@ -1,36 +1,85 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework.decorators import action
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.exceptions import NotFound, PermissionDenied, \
+    Throttled
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics, serializers
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, \
+    IsAdminUser
 from rest_framework.permissions import BasePermission
 
 
-from api.models import Project, Contributor, Issue, Comment
+from api import caching, deletion, export, hashing, membership, profiling, \
+    routing, search, sync
+from api.caching import ResponseCacheMixin
+from api.conditional import ConditionalGetMixin
+from api.fieldsets import SparseFieldsetMixin
+from api.filters import FacetsMixin, IssueFilterBackend
+from api.includes import IncludeMixin
+from api.models import Project, Contributor, Issue, Comment, \
+    ChangeLog, DeletionJob, ProjectStatistics
+from api.pagination import CreatedTimeCursorPagination, \
+    CursorPaginationMixin
+from api.routing import ReplicaReadMixin
 from api.serializers import (
     ProjectsListSerializer,
     ProjectsDetailSerializer,
     ContributorsSerializer,
+    ContributorsBulkSerializer,
     IssuesListSerializer,
     IssuesDetailSerializer,
+    IssuesBulkSerializer,
     CommentsListSerializer,
     CommentsDetailSerializer,
+    IssuesListProjectionSerializer,
+    CommentsListProjectionSerializer,
+    ProjectStatisticsSerializer,
+    DeletionJobSerializer,
+    UserProfileSerializer,
     UserSerializer
 )
 
+class ProjectionListMixin:
+    # L'action list lit un QuerySet.values() réduit aux colonnes utiles et le
+    # sérialise avec projection_serializer_class, sans instancier de modèles.
+    projection_serializer_class = None
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == 'list':
+            return self.projection_serializer_class.project(
+                queryset, self.get_sparse_fields())
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return self.projection_serializer_class
+        return super().get_serializer_class()
+
+
 class IsProjectOwnerOrContributor(BasePermission):
 
         def has_permission(self, request, view):
 
-            user_id = request.user
-            project_id = view.kwargs.get('project_id')
-            contributor = Contributor.objects.filter(user_id=user_id,
-                                                      project_id=project_id)
-            if contributor.exists():
-                if request.method in ['GET', 'HEAD', 'OPTIONS']:
-                    return True
-                return contributor.get().role == 'CR'
-            return False
+            role = membership.get_role(request, view.kwargs.get('project_id'))
+            if role is None:
+                return False
+            if request.method in ['GET', 'HEAD', 'OPTIONS']:
+                return True
+            return role == Contributor.CREATOR
 
 
 class IsOwnerOrReadOnly(BasePermission):
@@ -45,20 +94,17 @@ class IsOwnerOrReadOnly(BasePermission):
             return True
 
         # Write permissions are only allowed to the owner of the object.
-        return obj.author_user_id == request.user
+        # La comparaison porte sur la clé étrangère pour ne pas charger
+        # l'auteur depuis la base.
+        return obj.author_user_id_id == request.user.pk
 
 
 class IsProjectContributor(BasePermission):
 
     def has_permission(self, request, view):
 
-        user_id = request.user
-        project_id = view.kwargs.get('project_id')
-        contributor = Contributor.objects.filter(user_id=user_id,
-                                       project_id=project_id)
-        if contributor.exists():
-            return True
-        return False
+        role = membership.get_role(request, view.kwargs.get('project_id'))
+        return role is not None
 
 
 class UserCreate(APIView):
@@ -68,28 +114,132 @@ class UserCreate(APIView):
     def post(self, request):
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
+            try:
+                password_hash = hashing.make_password(
+                    serializer.validated_data['password'])
+            except hashing.PoolFull as exc:
+                raise Throttled(wait=exc.retry_after,
+                                detail=hashing.POOL_FULL_MESSAGE)
+            user = serializer.save(password_hash=password_hash)
             return Response({'user_id': user.id},
                             status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class ProjectsViewSet(ModelViewSet):
+class ResponseCacheStatsView(APIView):
+    # Compteurs de succès / échecs du cache de réponses (api.caching)
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(caching.get_stats())
+
+
+class QueryProfileView(APIView):
+    # Journal glissant de api.profiling : requêtes SQL des dernières
+    # requêtes HTTP (DEBUG ou QUERY_PROFILING uniquement).
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'enabled': profiling.is_enabled(),
+                         'requests': profiling.recent()})
+
+
+def deletion_accepted(request, job):
+    # 202 : la suppression se poursuit en arrière-plan ; Location indique
+    # où suivre son avancement.
+    return Response(DeletionJobSerializer(job).data,
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': reverse(
+                        'deletion-job', kwargs={'pk': job.pk},
+                        request=request)})
+
+
+class DeletionJobView(generics.RetrieveAPIView):
+    # Avancement d'une suppression demandée par l'utilisateur
+    serializer_class = DeletionJobSerializer
+
+    def get_queryset(self):
+        return DeletionJob.objects.filter(requested_by=self.request.user)
+
+    def get_object(self):
+        job = super().get_object()
+        deletion.resume(job)
+        return job
+
+
+class SearchView(APIView):
+    # Recherche plein texte (?q=) dans les problèmes et commentaires des
+    # projets de l'utilisateur, résultats classés par pertinence.
+    permission_classes = [IsAuthenticated]
+    pagination_class = LimitOffsetPagination
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            raise serializers.ValidationError(
+                {'q': ['Ce paramètre est obligatoire.']})
+        paginator = self.pagination_class()
+        limit = paginator.get_limit(request)
+        offset = paginator.get_offset(request)
+        # Un résultat de plus que demandé indique l'existence d'une page
+        # suivante, sans compter l'ensemble des correspondances.
+        results = search.search(request.user, text, limit + 1, offset)
+        url = request.build_absolute_uri()
+        next_url = None
+        if len(results) > limit:
+            next_url = replace_query_param(url, paginator.offset_query_param,
+                                           offset + limit)
+        previous_url = None
+        if offset > 0:
+            previous_url = replace_query_param(
+                url, paginator.offset_query_param, max(offset - limit, 0))
+        return Response({'next': next_url, 'previous': previous_url,
+                         'results': results[:limit]})
+
+
+class ProjectsViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                      ResponseCacheMixin, IncludeMixin, SparseFieldsetMixin,
+                      ModelViewSet):
 
     serializer_class = ProjectsListSerializer
     detail_serializer_class = ProjectsDetailSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
+    include_options = ('contributors', 'users')
+    include_select_related = {'users': ('author_user_id',)}
+    include_prefetch_related = {
+        'contributors': (Prefetch(
+            'projects_contributors', to_attr='included_contributors',
+            queryset=Contributor.objects.select_related(
+                'user_id').order_by('id')),),
+    }
 
     def get_queryset(self):
         user = self.request.user
-        contributors = Contributor.objects.filter(user_id=user)
-        # Création d'une liste de projets correspondant aux objets Contributors
-        projects = [contributor.project_id for contributor in contributors]
-        # Utilisation de cette liste pour récupérer les projets correspondants
+        # Sous-requête sur les contributions de l'utilisateur : la liste des
+        # projets est résolue en une seule requête SQL, quel que soit le
+        # nombre de projets auxquels il participe.
+        memberships = Contributor.objects.filter(
+            user_id=user).values('project_id')
+        # L'auteur est chargé par jointure pour éviter une requête par ligne
+        # dans get_author_name.
         queryset = Project.objects.filter(
-            id__in=[project.id for project in projects])
+            id__in=memberships, deleted_time__isnull=True).select_related(
+            'author_user_id').order_by('id')
         return queryset
 
+    def get_version_marker(self):
+        # Liste : empreinte des versions de tous les projets de
+        # l'utilisateur, qui change aussi lorsqu'il rejoint ou quitte un
+        # projet. Détail : version du projet demandé.
+        projects = self.get_queryset().select_related(None).order_by('id')
+        if 'pk' in self.kwargs:
+            return projects.filter(pk=self.kwargs['pk']).values_list(
+                'version', 'updated_time').first()
+        rows = list(projects.values_list('id', 'version', 'updated_time'))
+        version = ','.join(f'{pk}.{version}' for pk, version, _ in rows)
+        updated_time = max((row[2] for row in rows), default=None)
+        return version, updated_time
+
     def get_serializer_class(self):
         if self.action in ['retrieve', 'create', 'update']:
             # Utiliser le serializer de détail pour la création,
@@ -105,22 +255,111 @@ class ProjectsViewSet(ModelViewSet):
         # Création d'un objet Contributors pour l'utilisateur courant
         contributor = Contributor(user_id=self.request.user, project_id=project, role=Contributor.CREATOR)
         contributor.save()
+        membership.invalidate(self.request.user.pk, project.pk)
 
         return Response(serializer.data)
 
-
-class ContributorsViewSet(ModelViewSet):
+    def include_contributors(self, project, data):
+        data['contributors'] = ContributorsSerializer(
+            project.included_contributors, many=True).data
+
+    def include_users(self, project, data):
+        # L'auteur est joint à la requête du projet
+        data['author'] = UserProfileSerializer(project.author_user_id).data
+
+    def destroy(self, request, *args, **kwargs):
+        # Le projet est masqué immédiatement ; ses problèmes, commentaires
+        # et contributeurs sont supprimés par lots en arrière-plan.
+        job = deletion.delete_project(self.get_object(), request.user)
+        return deletion_accepted(request, job)
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        # Export complet des problèmes du projet (?output=ndjson|csv), avec
+        # leurs commentaires si ?comments=true. Sous WSGI, la réponse est
+        # produite au fil de la lecture, sans charger le projet entier en
+        # mémoire.
+        output = request.query_params.get('output', 'ndjson')
+        if output not in export.CONTENT_TYPES:
+            raise serializers.ValidationError(
+                {'output': ['Valeur non valide. Choisissez parmi les options '
+                            'suivantes : ' + ', '.join(export.CONTENT_TYPES)]})
+        with_comments = request.query_params.get('comments') in (
+            'true', '1', 'yes')
+        project = self.get_object()
+        if isinstance(request._request, ASGIRequest):
+            # Sous ASGI, l'export est lu ici, dans le thread de la vue, puis
+            # envoyé depuis un fichier temporaire (voir spool_project).
+            response = FileResponse(
+                export.spool_project(project.pk, output, with_comments,
+                                     using=routing.read_database()),
+                content_type=export.CONTENT_TYPES[output])
+        else:
+            # Le flux est lu après la fin de la vue : la base de lecture de
+            # la requête lui est transmise explicitement.
+            response = StreamingHttpResponse(
+                export.export_project(project.pk, output, with_comments,
+                                      using=routing.read_database()),
+                content_type=export.CONTENT_TYPES[output])
+        response['Content-Disposition'] = \
+            f'attachment; filename="project-{project.pk}.{output}"'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def statistics(self, request, pk=None):
+        # Compteurs tenus à jour à chaque écriture (ProjectStatistics) : une
+        # lecture par clé primaire au lieu d'agrégats sur Issue et Comment.
+        if membership.get_role(request, pk) is None:
+            raise NotFound()
+        statistics = ProjectStatistics.for_project(pk)
+        return Response(ProjectStatisticsSerializer(statistics).data)
+
+    @action(detail=True, methods=['get'])
+    def sync(self, request, pk=None):
+        # Synchronisation incrémentale : ?token= renvoyé par l'appel
+        # précédent ou en-tête X-Sync-Token. Sans jeton, renvoie seulement le
+        # jeton courant ; sans modification depuis le jeton, 204 sans corps
+        # après une seule requête sur l'index du journal.
+        if membership.get_role(request, pk) is None:
+            raise NotFound()
+        token = request.query_params.get('token')
+        if not token:
+            token = sync.current_token(pk)
+            return Response({'token': token},
+                            headers={'X-Sync-Token': token})
+        seq, issued = sync.decode_token(pk, token)
+        changes = sync.changes_since(pk, seq, issued,
+                                     context=self.get_serializer_context())
+        if changes is None:
+            # Jeton réémis pour repousser son expiration
+            return Response(status=status.HTTP_204_NO_CONTENT, headers={
+                'X-Sync-Token': sync.encode_token(pk, seq)})
+        return Response(changes, headers={'X-Sync-Token': changes['token']})
+
+
+class ContributorsViewSet(ConditionalGetMixin, SparseFieldsetMixin,
+                          ModelViewSet):
     serializer_class = ContributorsSerializer
     permission_classes = [IsAuthenticated, IsProjectOwnerOrContributor]
 
     def get_queryset(self):
         project_id = self.kwargs.get('project_id')
-        contributors = Contributor.objects.filter(project_id=project_id)
+        contributors = Contributor.objects.filter(
+            project_id=project_id).select_related('user_id').order_by('id')
         return contributors
 
     def perform_create(self, serializer):
-        serializer.save(project_id=Project.objects.get(pk=self.kwargs.get(
-            'project_id')), role=Contributor.CONTRIBUTOR)
+        try:
+            with transaction.atomic():
+                contributor = serializer.save(
+                    project_id=Project.objects.get(
+                        pk=self.kwargs.get('project_id')),
+                    role=Contributor.CONTRIBUTOR)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'user_id': [ContributorsSerializer.duplicate_message]})
+        membership.invalidate(contributor.user_id_id,
+                              contributor.project_id_id)
         return Response(serializer.data)
 
     def perform_destroy(self, instance):
@@ -129,51 +368,336 @@ class ContributorsViewSet(ModelViewSet):
                 "Impossible de supprimer le créateur du projet"
             )
         instance.delete()
+        membership.invalidate(instance.user_id_id, instance.project_id_id)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["project_id"] = self.kwargs.get('project_id')
         return context
 
-class IssuesViewSet(ModelViewSet):
+    @action(detail=False, methods=['post', 'delete'], url_path='bulk')
+    def bulk(self, request, project_id=None):
+        # Ajout (POST) ou retrait (DELETE) d'un lot de contributeurs à partir
+        # d'une liste user_ids, en une seule transaction.
+        serializer = ContributorsBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = list(dict.fromkeys(serializer.validated_data['user_ids']))
+        project_id = int(project_id)
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                result = self.bulk_add(project_id, user_ids)
+            else:
+                result = self.bulk_remove(project_id, user_ids)
+            Project.bump_version(pk=project_id)
+        for user_id in user_ids:
+            membership.invalidate(user_id, project_id)
+        return Response(result)
+
+    def bulk_add(self, project_id, user_ids):
+        users = set(User.objects.filter(pk__in=user_ids).values_list(
+            'pk', flat=True))
+        unknown = [user_id for user_id in user_ids if user_id not in users]
+        if unknown:
+            raise serializers.ValidationError(
+                {'user_ids': [f'Utilisateurs introuvables : {unknown}']})
+        members = set(Contributor.objects.filter(
+            project_id=project_id, user_id__in=user_ids).values_list(
+            'user_id', flat=True))
+        added = [user_id for user_id in user_ids if user_id not in members]
+        Contributor.objects.bulk_create(
+            [Contributor(user_id_id=user_id, project_id_id=project_id,
+                         role=Contributor.CONTRIBUTOR) for user_id in added],
+            ignore_conflicts=True)
+        if added:
+            # ignore_conflicts : SQLite ne renvoie pas les clés créées
+            ChangeLog.record(project_id, ChangeLog.CONTRIBUTOR,
+                             ChangeLog.CREATED, list(
+                Contributor.objects.filter(
+                    project_id=project_id, user_id__in=added).values_list(
+                    'pk', flat=True)))
+        return {'added': added,
+                'skipped': [user_id for user_id in user_ids
+                            if user_id in members]}
+
+    def bulk_remove(self, project_id, user_ids):
+        members = {user_id: (pk, role) for user_id, pk, role in
+                   Contributor.objects.filter(
+                       project_id=project_id,
+                       user_id__in=user_ids).values_list(
+                       'user_id', 'pk', 'role')}
+        if any(role == Contributor.CREATOR for _, role in members.values()):
+            raise serializers.ValidationError(
+                "Impossible de supprimer le créateur du projet"
+            )
+        Contributor.objects.filter(project_id=project_id,
+                                   user_id__in=list(members)).delete()
+        ChangeLog.record(project_id, ChangeLog.CONTRIBUTOR,
+                         ChangeLog.DELETED,
+                         [pk for pk, _ in members.values()])
+        return {'removed': [user_id for user_id in user_ids
+                            if user_id in members],
+                'skipped': [user_id for user_id in user_ids
+                            if user_id not in members]}
+
+class IssuesViewSet(ReplicaReadMixin, ConditionalGetMixin, ResponseCacheMixin,
+                    FacetsMixin, CursorPaginationMixin, ProjectionListMixin,
+                    IncludeMixin, SparseFieldsetMixin, ModelViewSet):
     serializer_class = IssuesListSerializer
     detail_serializer_class = IssuesDetailSerializer
+    projection_serializer_class = IssuesListProjectionSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly,
                           IsProjectContributor]
+    filter_backends = [IssueFilterBackend]
+    bulk_max_items = 1000
+    bulk_batch_size = 500
+    include_options = ('comments', 'contributors', 'users')
+    # Le projet est joint à la requête du problème : ses contributeurs sont
+    # ensuite préchargés en une seule requête.
+    include_select_related = {'contributors': ('project_id',),
+                              'users': ('author_user_id', 'assigned')}
+    include_prefetch_related = {
+        'contributors': (Prefetch(
+            'project_id__projects_contributors',
+            to_attr='included_contributors',
+            queryset=Contributor.objects.select_related(
+                'user_id').order_by('id')),),
+    }
 
     def get_queryset(self):
         project_id = self.kwargs.get('project_id')
-        issues = Issue.objects.filter(project_id=project_id)
+        # Auteur et personne assignée par jointure pour get_author_name et
+        # get_assigned_name (la liste, elle, passe par values()).
+        issues = Issue.objects.filter(
+            project_id=project_id, deleted_time__isnull=True).select_related(
+            'author_user_id', 'assigned').order_by('created_time', 'id')
         return issues
 
+    def destroy(self, request, *args, **kwargs):
+        # Problème masqué et retiré des compteurs immédiatement,
+        # commentaires supprimés par lots en arrière-plan.
+        job = deletion.delete_issue(self.get_object(), request.user)
+        return deletion_accepted(request, job)
+
     def perform_create(self, serializer):
         serializer.save(project_id=
                         Project.objects.get(pk=self.kwargs.get('project_id')),
                         author_user_id=self.request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def include_comments(self, issue, data):
+        # Premiers commentaires du problème, dans l'ordre de la liste, et
+        # lien vers la suite (pagination par curseur). Prefetch n'accepte
+        # pas de QuerySet découpé avant Django 4.2 : les commentaires sont
+        # lus par une requête bornée.
+        limit = getattr(settings, 'INCLUDE_COMMENTS_LIMIT', 20)
+        comments = list(Comment.objects.filter(issue_id=issue).select_related(
+            'author_user_id').order_by('created_time', 'id')[:limit + 1])
+        next_url = None
+        if len(comments) > limit:
+            paginator = CreatedTimeCursorPagination()
+            paginator.base_url = replace_query_param(reverse(
+                'issue-comments-list', request=self.request, kwargs={
+                    'project_id': self.kwargs['project_id'],
+                    'issue_id': issue.pk}),
+                paginator.page_size_query_param, limit)
+            next_url = paginator.encode_cursor(False, comments[limit - 1])
+        data['comments'] = {
+            'next': next_url,
+            'results': CommentsListSerializer(comments[:limit],
+                                              many=True).data}
+
+    def include_contributors(self, issue, data):
+        data['contributors'] = ContributorsSerializer(
+            issue.project_id.included_contributors, many=True).data
+
+    def include_users(self, issue, data):
+        # Auteur et personne assignée, joints à la requête du problème
+        data['author'] = UserProfileSerializer(issue.author_user_id).data
+        data['assigned'] = UserProfileSerializer(issue.assigned).data
+
     def get_serializer_class(self):
         if self.action in ['retrieve', 'create', 'update']:
             # Utiliser le serializer de détail pour la création
             return self.detail_serializer_class
         return super().get_serializer_class()
 
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request, project_id=None):
+        # Création (POST) ou mise à jour partielle (PATCH, éléments
+        # identifiés par issue_id) d'un lot de problèmes. Le lot est validé
+        # en entier puis écrit en une seule transaction ; en cas d'erreur,
+        # rien n'est écrit et les erreurs sont renvoyées élément par élément.
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise serializers.ValidationError(
+                {'non_field_errors': ['Une liste de problèmes est attendue.']})
+        if len(items) > self.bulk_max_items:
+            raise serializers.ValidationError(
+                {'non_field_errors': [
+                    f'Un lot ne peut pas dépasser {self.bulk_max_items} '
+                    f'problèmes.']})
+
+        if request.method == 'POST':
+            instances = [None] * len(items)
+        else:
+            instances = self.get_bulk_instances(items)
+        errors = [{} for _ in items]
+        validated = []
+        context = self.get_serializer_context()
+        # Un seul serializer est construit pour tout le lot : la création de
+        # ses champs coûte bien plus cher que la validation d'un élément.
+        serializer = IssuesBulkSerializer(
+            partial=request.method == 'PATCH', context=context)
+        for index, (item, instance) in enumerate(zip(items, instances)):
+            if not isinstance(item, dict):
+                errors[index] = {'non_field_errors': [
+                    serializer.error_messages['invalid'].format(
+                        datatype=type(item).__name__)]}
+                validated.append(None)
+                continue
+            if isinstance(instance, dict):
+                # Erreur déjà détectée lors de la recherche du problème
+                errors[index] = instance
+                validated.append(None)
+                continue
+            serializer.instance = instance
+            try:
+                validated.append(serializer.run_validation(item))
+            except serializers.ValidationError as exc:
+                errors[index] = serializers.as_serializer_error(exc)
+                validated.append(None)
+
+        users = self.get_assigned_users(validated, errors)
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if request.method == 'POST':
+                previous = {}
+                issues = self.bulk_create_issues(validated, users)
+                response_status = status.HTTP_201_CREATED
+            else:
+                # Valeurs comptabilisées relues dans la transaction : les
+                # instances ont été chargées avant (get_bulk_instances)
+                previous = Issue.stored_counted_values(
+                    [issue.pk for issue in instances])
+                issues = self.bulk_update_issues(instances, validated, users,
+                                                 previous)
+                response_status = status.HTTP_200_OK
+            ProjectStatistics.apply(
+                self.kwargs.get('project_id'),
+                self.get_statistics_deltas(issues, previous))
+            ChangeLog.record(int(self.kwargs.get('project_id')),
+                             ChangeLog.ISSUE,
+                             ChangeLog.CREATED if request.method == 'POST'
+                             else ChangeLog.UPDATED,
+                             [issue.pk for issue in issues])
+            Project.bump_version(pk=self.kwargs.get('project_id'))
+        serializer = IssuesDetailSerializer(issues, many=True,
+                                            context=context)
+        return Response(serializer.data, status=response_status)
+
+    def get_bulk_instances(self, items):
+        # Charge en une requête tous les problèmes visés par le lot. Les
+        # éléments invalides sont remplacés par leur dictionnaire d'erreurs.
+        # True et False sont des int pour isinstance : ils sont écartés
+        ids = [item.get('issue_id') if isinstance(item, dict) else None
+               for item in items]
+        ids = [pk if isinstance(pk, int) and not isinstance(pk, bool)
+               else None for pk in ids]
+        issues = self.get_queryset().select_related(
+            'author_user_id', 'assigned').in_bulk(
+            [pk for pk in ids if pk is not None])
+        instances, seen = [], set()
+        for pk in ids:
+            issue = issues.get(pk) if pk is not None else None
+            if issue is None:
+                instances.append({'issue_id': ['Problème introuvable.']})
+            elif pk in seen:
+                instances.append({'issue_id': ['Problème présent plusieurs '
+                                               'fois dans le lot.']})
+            elif issue.author_user_id_id != self.request.user.pk:
+                instances.append({'non_field_errors': [
+                    PermissionDenied.default_detail]})
+            else:
+                instances.append(issue)
+            seen.add(pk)
+        return instances
+
+    def get_statistics_deltas(self, issues, previous):
+        # bulk_create et bulk_update ne passent pas par Issue.save() : les
+        # variations des compteurs sont cumulées pour tout le lot.
+        # `previous` : valeurs en base avant l'écriture, par problème.
+        deltas = Counter()
+        for issue in issues:
+            deltas.update(ProjectStatistics.issue_deltas(
+                previous.get(issue.pk), issue.counted_values()))
+        return deltas
+
+    def get_assigned_users(self, validated, errors):
+        ids = {data['assigned'] for data in validated
+               if data is not None and 'assigned' in data}
+        users = User.objects.in_bulk(ids)
+        for index, data in enumerate(validated):
+            if data is None or 'assigned' not in data:
+                continue
+            if data['assigned'] not in users:
+                errors[index]['assigned'] = [
+                    f'Invalid pk "{data["assigned"]}" - object does not '
+                    f'exist.']
+        return users
+
+    def bulk_create_issues(self, validated, users):
+        project_id = int(self.kwargs.get('project_id'))
+        issues = []
+        for data in validated:
+            data = dict(data)
+            issues.append(Issue(project_id_id=project_id,
+                                author_user_id=self.request.user,
+                                assigned=users[data.pop('assigned')],
+                                **data))
+        return Issue.objects.bulk_create(issues,
+                                         batch_size=self.bulk_batch_size)
+
+    def bulk_update_issues(self, issues, validated, users, previous):
+        fields = set()
+        for issue, data in zip(issues, validated):
+            # bulk_update n'écrit que les champs du lot : les autres champs
+            # comptabilisés gardent leur valeur en base
+            for field, value in previous.get(issue.pk, {}).items():
+                setattr(issue, field, value)
+            for field, value in data.items():
+                if field == 'assigned':
+                    value = users[value]
+                setattr(issue, field, value)
+                fields.add(field)
+        if fields:
+            Issue.objects.bulk_update(issues, sorted(fields),
+                                      batch_size=self.bulk_batch_size)
+        return issues
 
-class CommentsViewSet(ModelViewSet):
+
+class CommentsViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                      ResponseCacheMixin, CursorPaginationMixin,
+                      ProjectionListMixin, SparseFieldsetMixin, ModelViewSet):
     serializer_class = CommentsListSerializer
     detail_serializer_class = CommentsDetailSerializer
+    projection_serializer_class = CommentsListProjectionSerializer
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly,
                           IsProjectContributor]
 
     def get_queryset(self):
         issue_id = self.kwargs.get('issue_id')
-        comments = Comment.objects.filter(issue_id=issue_id)
+        comments = Comment.objects.filter(
+            issue_id=issue_id, issue_id__deleted_time__isnull=True
+        ).select_related('author_user_id').order_by('created_time', 'id')
         return comments
 
     def perform_create(self, serializer):
-        serializer.save(issue_id=
-                        Issue.objects.get(pk=self.kwargs.get('issue_id')),
-                        author_user_id=self.request.user)
+        issue = get_object_or_404(Issue, pk=self.kwargs.get('issue_id'),
+                                  deleted_time__isnull=True)
+        serializer.save(issue_id=issue, author_user_id=self.request.user)
         return Response(serializer.data)
 
     def get_serializer_class(self):